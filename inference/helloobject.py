@@ -54,7 +54,10 @@ import numpy as np
 import cv2
 import colorsys
 
-from src.basic.test_efficientnasnet_m import print_properties
+from src.basic.classify import print_properties
+from src.common.backend import fcos_postprocess
+from src.common.motion import MotionGate
+from src.common.nv12 import resize_bgr2nv12
 
 # load model files to return Model class
 models = dnn.load('/app/pydev_demo/models/fcos_512x512_nv12.bin')
@@ -90,17 +93,35 @@ cap.set(cv2.CAP_PROP_FPS, 30)  # framew per second
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-# OpenCV uses BGR format, convert correspondingly to NV12 format
-nv12_data = bgr2nv12_opencv(resized_data)
-"""
-Model Inference
-    Call the forward interface of the Model class for inference. 
-    The model will output 15 sets of data representing the detected object bounding boxes.
-"""
-outputs = models[0].forward(nv12_data)
-"""
-Post-processing
-    The post-processing function postprocess will process 
-    the object category, bounding box, and confidence information output by the model.
-"""
-prediction_bbox = postprocess(outputs, input_shape, origin_img_shape=(1080, 1920))
\ No newline at end of file
+input_shape = (512, 512)
+# libpostprocess when available, the NumPy decoder otherwise; boxes in camera frame pixels
+postprocess = fcos_postprocess(models[0], 512, 512, 480, 640, score_threshold=0.5, nms_threshold=0.6,
+                               nms_top_k=500)
+# the webcam is fixed: frames of a static scene skip forward() and keep the last detections
+gate = MotionGate(*input_shape)
+prediction_bbox = None
+try:
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        # OpenCV uses BGR format, convert correspondingly to NV12 format
+        nv12_data = resize_bgr2nv12(frame, *input_shape)
+        if not gate.check(nv12_data):
+            continue
+        """
+        Model Inference
+            Call the forward interface of the Model class for inference. 
+            The model will output 15 sets of data representing the detected object bounding boxes.
+        """
+        outputs = models[0].forward(nv12_data)
+        """
+        Post-processing
+            The post-processing function postprocess will process 
+            the object category, bounding box, and confidence information output by the model.
+        """
+        prediction_bbox = postprocess.detect(outputs)
+        print(f"frame {gate.frames}: {len(prediction_bbox)} objects, {gate.change:.1%} of the scene changed")
+finally:
+    cap.release()
+    print(f"motion gate: {gate.passed} of {gate.frames} frames detected, {gate.skipped_ratio():.0%} skipped")
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+classify.py
+Classify all images in a folder with one or more models
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Every model is loaded once and its properties printed once. Models sharing an
+input size share one pass of decoding, resizing and NV12 conversion: each
+group of prefetched images is forwarded through all of them before the next
+group is decoded. The summary compares the models' throughput and, given a
+CSV of expected labels (file name, class id), their top-1 accuracy.
+
+$ PYTHONPATH=. python3 src/basic/classify.py images --models resnet18 vargconvnet efficientnet_lite4
+$ PYTHONPATH=. python3 src/basic/classify.py images --models /tmp/my_resnet18_224x224_nv12.bin --labels labels.csv
+
+Adapted from DF Robot RDK X3 documentation
+"""
+
+import argparse
+import collections
+import csv
+import os
+
+from src.common.backend import BACKENDS, classification_postprocess, load_models
+from src.common.batching import MicroBatcher
+from src.common.metrics import Metrics
+from src.common.nv12_cache import NV12Cache
+from src.common.prefetch import PrefetchLoader
+from src.common.registry import CLASSIFICATION_MODELS, classification_spec
+from src.common.scan import Checkpoint, parse_shard, scan_images, shard
+from src.common.shard import ShardReader, is_shard
+
+
+def print_properties(pro):
+    print("tensor type:", pro.tensor_type)
+    print("data type:", pro.dtype)
+    print("layout:", pro.layout)
+    print("shape:", pro.shape)
+
+
+def get_hw(pro):
+    if pro.layout == "NCHW":
+        return pro.shape[2], pro.shape[3]
+    else:
+        return pro.shape[1], pro.shape[2]
+
+
+def read_labels(csv_path):
+    """
+    :param csv_path: CSV of image file name and expected class id per line
+    :return: dict of file name -> class id
+    """
+    with open(csv_path, newline="") as f:
+        return {os.path.basename(row[0]): int(row[1]) for row in csv.reader(f) if len(row) >= 2 and row[1].isdigit()}
+
+
+class ClassificationRun:
+    """
+    One loaded model with its post-processing and its results so far
+    """
+
+    def __init__(self, spec, backend="auto", batch_size=1):
+        """
+        :param spec: ModelSpec
+        :param backend: inference backend, see load_models()
+        :param batch_size: images per forward group
+        """
+        self.spec = spec
+        self.model = load_models(spec.model_file, backend)[0]
+        self.height, self.width = get_hw(self.model.inputs[0].properties)
+        if (self.height, self.width) != (spec.height, spec.width):
+            print(f"{spec.name}: model input is {self.height}x{self.width}, registry says {spec.height}x{spec.width}")
+        self.postprocess = classification_postprocess(self.model, self.height, self.width,
+                                                      score_threshold=spec.score_threshold, nms_top_k=spec.nms_top_k)
+        self.batcher = MicroBatcher(self.model, batch_size)
+        self.count = 0
+        self.correct = 0
+        self.labelled = 0
+
+    def print_properties(self):
+        print("=" * 10, self.spec.name, "inputs[0] properties", "=" * 10)
+        print_properties(self.model.inputs[0].properties)
+        print("inputs[0] name is:", self.model.inputs[0].name)
+        print("=" * 10, self.spec.name, "outputs[0] properties", "=" * 10)
+        print_properties(self.model.outputs[0].properties)
+        print("outputs[0] name is:", self.model.outputs[0].name)
+
+    def run(self, batch, metrics, labels=None, verbose=True):
+        """
+        Classify a group of prefetched images
+
+        :param batch: list of PrefetchedImage
+        :param metrics: Metrics receiving <model>.forward and <model>.postprocess spans
+        :param labels: optional dict of file name -> expected class id
+        :param verbose: print the results of every image
+        """
+        step = self.batcher.batch_size
+        for start in range(0, len(batch), step):
+            group = batch[start:start + step]
+            with metrics.span(f"{self.spec.name}.forward"):
+                outputs_list = self.batcher.forward([item.nv12 for item in group])
+            with metrics.span(f"{self.spec.name}.postprocess"):
+                results = self.postprocess.classify_batch(outputs_list, [item.shape for item in group])
+            for item, data in zip(group, results):
+                self.count += 1
+                expected = labels.get(os.path.basename(item.path)) if labels else None
+                if expected is not None:
+                    self.labelled += 1
+                    self.correct += int(len(data) > 0 and data[0]["label"] == expected)
+                if verbose:
+                    print(f"{self.spec.name}: {item.path}")
+                    for result in data:
+                        print(f"cls id: {result['label']}, Confidence: {result['prob']}, "
+                              f"class_name: {result['class_name']}")
+
+
+def classify_folder(folder_path, runs, workers=3, queue_depth=8, batch_size=1, metrics=None, labels=None,
+                    verbose=True, cache=None, recursive=True, shard_of=None, checkpoint=None, restart=False):
+    """
+    Run every model over the images of a folder, decoding once per input size
+
+    :param folder_path: folder of images, or a shard packed by pack_images.py
+    :param runs: list of ClassificationRun
+    :param workers: decode threads
+    :param queue_depth: images decoded ahead
+    :param batch_size: images prefetched per group
+    :param metrics: Metrics, a new one when None
+    :param labels: optional dict of file name -> expected class id
+    :param verbose: print the results of every image
+    :param cache: optional NV12Cache of pre-processed inputs
+    :param recursive: include the images of sub-folders
+    :param shard_of: (index, count) to process only every count-th image, e.g. one of several processes
+    :param checkpoint: progress file prefix, one file per input size; a rerun resumes after the finished images
+    :param restart: start over even when the checkpoint says the images were done
+    :return: the Metrics
+    """
+    metrics = metrics or Metrics()
+    groups = collections.OrderedDict()
+    for run in runs:
+        groups.setdefault((run.height, run.width), []).append(run)
+    packed = ShardReader(folder_path) if is_shard(folder_path) else None
+    for (h, w), group in groups.items():
+        progress = None
+        if packed is not None:
+            if (packed.height, packed.width) != (h, w):
+                print(f"{folder_path} is packed at {packed.height}x{packed.width}, "
+                      f"skipping {', '.join(run.spec.name for run in group)} ({h}x{w})")
+                continue
+            loader = packed
+        else:
+            paths = scan_images(folder_path, recursive=recursive)
+            if shard_of is not None:
+                paths = shard(paths, *shard_of)
+            if checkpoint:
+                suffix = f".{h}x{w}" if shard_of is None else f".{h}x{w}.{shard_of[0]}of{shard_of[1]}"
+                progress = Checkpoint(checkpoint + suffix, restart=restart)
+                paths = progress.resume(paths)
+            loader = PrefetchLoader(paths, h, w, workers=workers, queue_depth=queue_depth, metrics=metrics,
+                                    cache=cache)
+        for batch in loader.batches(max([batch_size] + [run.batcher.batch_size for run in group])):
+            for run in group:
+                run.run(batch, metrics, labels, verbose)
+            if progress is not None:
+                for item in batch:
+                    progress.mark(item.path)
+        if progress is not None:
+            progress.save(complete=True)
+        print(f"{h}x{w}: {loader.count} images decoded once for {', '.join(run.spec.name for run in group)} "
+              f"in {loader.elapsed:.2f} s, {loader.wait_time:.2f} s waiting on decode")
+    return metrics
+
+
+def report(runs, metrics):
+    """
+    :param runs: list of ClassificationRun after classify_folder()
+    :param metrics: Metrics filled by classify_folder()
+    :return: table of throughput and accuracy per model
+    """
+    summary = metrics.summary()
+    lines = [f"{'model':<20} {'images':>7} {'forward ms':>11} {'post ms':>8} {'images/s':>9} {'top-1':>7}"]
+    for run in runs:
+        name = run.spec.name
+        if not run.count:
+            lines.append(f"{name:<20} {0:>7}")
+            continue
+        forward = summary[f"{name}.forward"]
+        post = summary[f"{name}.postprocess"]
+        forward_ms = forward["mean_ms"] * forward["count"] / run.count
+        post_ms = post["mean_ms"] * post["count"] / run.count
+        accuracy = f"{run.correct / run.labelled:>7.1%}" if run.labelled else f"{'-':>7}"
+        lines.append(f"{name:<20} {run.count:>7} {forward_ms:>11.2f} {post_ms:>8.2f} "
+                     f"{1000.0 / (forward_ms + post_ms):>9.1f} {accuracy}")
+    return "\n".join(lines)
+
+
+def add_run_arguments(parser):
+    parser.add_argument("--workers", type=int, default=3, help="Threads decoding images ahead of the BPU")
+    parser.add_argument("--queue-depth", type=int, default=8, help="Maximum number of images decoded ahead")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="hobot for the BPU, standin for the NumPy stand-in used off-board")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Images per forward group, fixed by the model when it is compiled with batch > 1")
+    parser.add_argument("--labels", type=str, default=None, help="CSV of file name and expected class id")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Keep pre-processed NV12 inputs here, reruns then skip decoding")
+    parser.add_argument("--cache-size-mb", type=int, default=1024, help="Size bound of the NV12 cache")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false",
+                        help="Only classify the images directly in the folder")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="index/count: classify only every count-th image, e.g. 0/4 .. 3/4 in four processes")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="Progress file prefix; an interrupted run started again resumes where it stopped")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the checkpoint and classify every image again")
+    parser.add_argument("--metrics-csv", type=str, default=None, help="Write per-stage latencies to this CSV")
+
+
+def main(folder_path, specs, args):
+    """
+    :param folder_path: folder of images
+    :param specs: list of ModelSpec
+    :param args: parsed options of add_run_arguments()
+    """
+    for spec in specs:
+        if not os.path.exists(spec.model_file) and args.backend != "standin":  # the stand-in only needs the name
+            print(f"Model file {spec.model_file} not found")
+            exit(-1)
+    runs = [ClassificationRun(spec, args.backend, args.batch_size) for spec in specs]
+    for run in runs:
+        run.print_properties()
+    labels = read_labels(args.labels) if args.labels else None
+    cache = NV12Cache(args.cache_dir, args.cache_size_mb << 20) if args.cache_dir else None
+    metrics = classify_folder(folder_path, runs, args.workers, args.queue_depth, args.batch_size, labels=labels,
+                              verbose=not args.quiet, cache=cache, recursive=args.recursive, shard_of=args.shard,
+                              checkpoint=args.checkpoint, restart=args.restart)
+    if cache is not None:
+        entries, size = cache.size()
+        print(f"NV12 cache: {cache.hits} hits, {cache.misses} misses, {entries} entries, {size / 2 ** 20:.1f} MB")
+    print(report(runs, metrics))
+    print(metrics.report())
+    if args.metrics_csv:
+        metrics.write_csv(args.metrics_csv)
+
+
+def single_model_main(name, description):
+    """
+    Command line of the former per-model scripts: folder_path model_file [options]
+
+    :param name: registry name of the model
+    :param description: argparse description
+    """
+    spec = CLASSIFICATION_MODELS[name]
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("folder_path", type=str, help="Path to the folder of images to be classified")
+    parser.add_argument("model_file", type=str, nargs="?", default=spec.model_file,
+                        help=f"Path to the model file, i.e. {spec.description}")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    main(args.folder_path, [spec._replace(model_file=args.model_file)], args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Classify a folder of images with one or more models")
+    parser.add_argument("folder_path", type=str,
+                        help="Path to the folder of images to be classified, or a shard from pack_images.py")
+    parser.add_argument("--models", nargs="+", default=["resnet18"],
+                        help=f"Registry names ({', '.join(CLASSIFICATION_MODELS)}) or .bin model files")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    try:
+        specs = [classification_spec(model) for model in args.models]
+    except KeyError as e:
+        parser.error(e.args[0])
+    main(args.folder_path, specs, args)
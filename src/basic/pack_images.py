@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pack_images.py
+Pack a folder of images into an NV12 shard at a model's input resolution
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The shard (see src/common/shard.py) is then given to classify.py in place of
+the folder, for every model with that input size:
+
+$ PYTHONPATH=. python3 src/basic/pack_images.py images /data/images_224 --model resnet18
+$ PYTHONPATH=. python3 src/basic/classify.py /data/images_224 --models resnet18 vargconvnet
+"""
+
+import argparse
+
+from src.common.registry import CLASSIFICATION_MODELS
+from src.common.scan import scan_images
+from src.common.shard import pack_images, shard_paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack a folder of images into an NV12 shard")
+    parser.add_argument("folder_path", type=str, help="Path to the folder of images")
+    parser.add_argument("shard", type=str, help="Shard name, <shard>.nv12 and <shard>.json are written")
+    parser.add_argument("--model", choices=list(CLASSIFICATION_MODELS), default="resnet18",
+                        help="Registry model whose input size is used")
+    parser.add_argument("--size", type=str, default=None, help="HEIGHTxWIDTH instead of the model's input size")
+    parser.add_argument("--workers", type=int, default=3, help="Decode threads")
+    args = parser.parse_args()
+
+    if args.size:
+        height, width = (int(v) for v in args.size.lower().split("x"))
+    else:
+        spec = CLASSIFICATION_MODELS[args.model]
+        height, width = spec.height, spec.width
+    loader = pack_images(scan_images(args.folder_path), args.shard, height, width, workers=args.workers)
+    print(f"{loader.count} images packed at {height}x{width} into {' and '.join(shard_paths(args.shard))} "
+          f"in {loader.elapsed:.2f} s, {loader.skipped} skipped")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_batch_size.py
+Classification throughput for a range of --batch-size values
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Random NV12 inputs are forwarded in groups through MicroBatcher and
+post-processed with classify_batch(), so image decoding does not blur the
+comparison. A batch 1 model runs each group as back-to-back forward calls and
+only the post-processing is shared; a model compiled with batch N ignores the
+sweep and is measured at N.
+
+$ PYTHONPATH=. python3 src/benchmark/bench_batch_size.py resnet18_224x224_nv12.bin --backend standin --forward-ms 8
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.common.backend import BACKENDS, classification_postprocess, load_models
+from src.common.batching import MicroBatcher
+from src.common.nv12 import nv12_size
+
+
+def images_per_second(model, postprocess, images, batch_size, repeat):
+    """
+    :param model: loaded classification model
+    :param postprocess: object with classify_batch()
+    :param images: flat NV12 inputs cycled through
+    :param batch_size: requested group size
+    :param repeat: passes over images
+    :return: (group size used, images per second, mean milliseconds of post-processing per image)
+    """
+    batcher = MicroBatcher(model, batch_size)
+    shapes = [(1080, 1920, 3)] * batcher.batch_size
+    groups = [images[i:i + batcher.batch_size] for i in range(0, len(images), batcher.batch_size)]
+    postprocess_time = 0.0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for group in groups:
+            outputs_list = batcher.forward(group)
+            t_post = time.perf_counter()
+            postprocess.classify_batch(outputs_list, shapes[:len(group)])
+            postprocess_time += time.perf_counter() - t_post
+    count = repeat * len(images)
+    return batcher.batch_size, count / (time.perf_counter() - t0), postprocess_time * 1000.0 / count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark classification throughput per batch size")
+    parser.add_argument("model_file", type=str, help="Classification model file")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inference backend")
+    parser.add_argument("--forward-ms", type=float, default=0.0, help="Simulated forward latency of the stand-in")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Group sizes compared")
+    parser.add_argument("--images", type=int, default=64, help="Distinct inputs per pass")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the inputs")
+    args = parser.parse_args()
+
+    model = load_models(args.model_file, args.backend, forward_ms=args.forward_ms)[0]
+    properties = model.inputs[0].properties
+    h, w = properties.shape[2:4] if properties.layout == "NCHW" else properties.shape[1:3]
+    postprocess = classification_postprocess(model, h, w, score_threshold=0.3, nms_top_k=5)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, nv12_size(h, w), dtype=np.uint8) for _ in range(args.images)]
+
+    images_per_second(model, postprocess, images[:8], 1, 1)    # warm up
+    print(f"{'batch':>6} {'images/s':>10} {'post ms/image':>14}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        used, rate, post_ms = images_per_second(model, postprocess, images, batch_size, args.repeat)
+        baseline = baseline or rate
+        print(f"{used:>6} {rate:>10.1f} {post_ms:>14.3f}   {rate / baseline:.2f}x")
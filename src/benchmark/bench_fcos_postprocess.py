@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_fcos_postprocess.py
+Compare the NumPy FCOS decoder with the libpostprocess ctypes path
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+On the board both paths run on the real model outputs; off-board only the
+NumPy decoder runs, on the stand-in FCOS outputs. The ctypes path includes
+the JSON parsing of its result string since that is part of its cost.
+
+$ PYTHONPATH=. python3 src/benchmark/bench_fcos_postprocess.py /app/pydev_demo/models/fcos_512x512_nv12.bin
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.common.backend import BACKENDS, load_models
+from src.common.fcos import FcosDecoder
+from src.common.nv12 import nv12_size
+from src.common.postprocess import FcosPostProcessContext, have_libpostprocess
+
+
+def milliseconds_per_frame(detect, outputs_list, repeat):
+    """
+    :param detect: post-processor callable
+    :param outputs_list: forward results cycled through
+    :param repeat: number of passes over outputs_list
+    :return: mean milliseconds per call
+    """
+    for outputs in outputs_list:
+        detect(outputs)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for outputs in outputs_list:
+            detect(outputs)
+    return (time.perf_counter() - t0) * 1000.0 / (repeat * len(outputs_list))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark FCOS post-processing")
+    parser.add_argument("model_file", type=str, nargs="?", help="FCOS model file",
+                        default="/app/pydev_demo/models/fcos_512x512_nv12.bin")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inference backend")
+    parser.add_argument("--frames", type=int, default=8, help="Distinct frames forwarded")
+    parser.add_argument("--repeat", type=int, default=50, help="Passes over the frames")
+    parser.add_argument("--score-threshold", type=float, default=0.5, help="Detection score threshold")
+    args = parser.parse_args()
+
+    model = load_models(args.model_file, args.backend)[0]
+    h, w = model.inputs[0].properties.shape[2:]
+    rng = np.random.default_rng(0)
+    # forward outputs are reused by the runtime, keep a private copy of every frame
+    outputs_list = []
+    for _ in range(args.frames):
+        outputs = model.forward(rng.integers(0, 256, nv12_size(h, w), dtype=np.uint8))
+        outputs_list.append([SimpleNamespace(buffer=o.buffer.copy()) for o in outputs])
+
+    settings = dict(score_threshold=args.score_threshold, nms_threshold=0.6, nms_top_k=500)
+    decoder = FcosDecoder(model, h, w, 1080, 1920, **settings)
+    numpy_ms = milliseconds_per_frame(decoder.detect, outputs_list, args.repeat)
+    print(f"numpy decoder: {numpy_ms:.3f} ms/frame, {len(decoder.detect(outputs_list[0]))} detections on frame 0")
+
+    if have_libpostprocess():
+        context = FcosPostProcessContext(model, h, w, 1080, 1920, **settings)
+        ctypes_ms = milliseconds_per_frame(context.detect, outputs_list, args.repeat)
+        print(f"libpostprocess + json: {ctypes_ms:.3f} ms/frame, "
+              f"{len(context.detect(outputs_list[0]))} detections on frame 0")
+        print(f"numpy speedup: {ctypes_ms / numpy_ms:.2f}x")
+    else:
+        print("libpostprocess not available, ctypes path skipped")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_models.py
+A/B benchmark of the classification and detection models used in this repository
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+For every model: load time, latency of the first (warm-up) forward calls,
+the steady-state forward latency distribution, the cost of the NV12
+pre-processing and of the post-processing, and the peak resident memory.
+Each model is measured in a fresh process so its load time and peak RSS are
+its own. The image corpus is a folder, or a fixed set of generated images
+when none is given, so consecutive runs see the same inputs.
+
+mobilenet_unet is measured like the others, its post-processing being the
+per-pixel argmax of src/segmentation/test_mobilenet_unet.py; its 1024x2048
+input makes it by far the slowest to pre-process.
+
+Every model is measured --repeats times and the report holds the median of
+each figure, so one noisy run does not decide the comparison. The report is
+written as JSON (with the run settings) and CSV (one row per model).
+--compare reads a previous JSON report and exits with status 1 when a
+latency grew by more than --tolerance and by more than --min-delta-ms: a
+change of a few microseconds is timer noise however large in percent. The
+load time and forward latency of the stand-in backend are a file name
+lookup and a sleep, and are not compared. E.g. in CI:
+
+$ PYTHONPATH=. python3 src/benchmark/bench_models.py --backend standin --json base.json
+$ PYTHONPATH=. python3 src/benchmark/bench_models.py --backend standin --json new.json --compare base.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from src.common.backend import BACKENDS, classification_postprocess, fcos_postprocess, load_models
+from src.common.nv12 import resize_bgr2nv12
+from src.common.registry import CLASSIFICATION_MODELS, MODELS_DIR
+
+DETECTION_MODELS = {"fcos": f"{MODELS_DIR}/fcos_512x512_nv12.bin"}
+
+SEGMENTATION_MODELS = {"mobilenet_unet": f"{MODELS_DIR}/mobilenet_unet_1024x2048_nv12.bin"}
+
+MODELS = list(CLASSIFICATION_MODELS) + list(DETECTION_MODELS) + list(SEGMENTATION_MODELS)
+
+# latencies compared by --compare, lower is better
+COMPARED = ["load_ms", "forward_p50_ms", "forward_p95_ms", "preprocess_p50_ms", "postprocess_p50_ms"]
+
+# simulated by the stand-in backend, not worth comparing
+STANDIN_SKIPPED = ["load_ms", "forward_p50_ms", "forward_p95_ms"]
+
+
+def load_corpus(folder, count, seed=0):
+    """
+    :param folder: folder of images, None for generated ones
+    :param count: maximum number of images
+    :param seed: seed of the generated images
+    :return: list of BGR images
+    """
+    if folder is None:
+        rng = np.random.default_rng(seed)
+        images = []
+        for _ in range(count):
+            # smooth gradients and a few blobs rather than noise, closer to a photo to resize
+            image = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (640, 480),
+                               interpolation=cv2.INTER_CUBIC)
+            images.append(image)
+        return images
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        image = cv2.imread(os.path.join(folder, filename))
+        if image is not None:
+            images.append(image)
+        if len(images) >= count:
+            break
+    return images
+
+
+def distribution(milliseconds):
+    """
+    :param milliseconds: list of latencies
+    :return: dict of mean, min, p50, p95, p99 and max
+    """
+    values = np.array(milliseconds, dtype=np.float64)
+    p50, p95, p99 = np.quantile(values, [0.5, 0.95, 0.99])
+    return dict(mean=float(values.mean()), min=float(values.min()), p50=float(p50), p95=float(p95),
+                p99=float(p99), max=float(values.max()))
+
+
+def bench_model(name, model_file, backend, folder, corpus_size, warmup, iterations, forward_ms):
+    """
+    Measure one model, runs in its own process
+
+    :return: flat dict of results
+    """
+    corpus = load_corpus(folder, corpus_size)
+    t0 = time.perf_counter()
+    model = load_models(model_file, backend, forward_ms=forward_ms)[0]
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    properties = model.inputs[0].properties
+    h, w = properties.shape[2:4] if properties.layout == "NCHW" else properties.shape[1:3]
+
+    preprocess_ms, inputs = [], []
+    for image in corpus:
+        t0 = time.perf_counter()
+        inputs.append(resize_bgr2nv12(image, h, w))
+        preprocess_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    warmup_ms = []
+    for i in range(warmup):
+        t0 = time.perf_counter()
+        model.forward(inputs[i % len(inputs)])
+        warmup_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    forward_ms_list = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        model.forward(inputs[i % len(inputs)])
+        forward_ms_list.append((time.perf_counter() - t0) * 1000.0)
+
+    postprocessors = {}
+    postprocess_ms = []
+    for image, nv12 in zip(corpus, inputs):
+        outputs = model.forward(nv12)
+        ori_h, ori_w = image.shape[:2]
+        if name in SEGMENTATION_MODELS:
+            t0 = time.perf_counter()
+            np.argmax(outputs[0].buffer, axis=-1)
+        elif name in DETECTION_MODELS:
+            if (ori_h, ori_w) not in postprocessors:
+                postprocessors[ori_h, ori_w] = fcos_postprocess(model, h, w, ori_h, ori_w, score_threshold=0.5,
+                                                                nms_threshold=0.6, nms_top_k=500)
+            t0 = time.perf_counter()
+            postprocessors[ori_h, ori_w].detect(outputs)
+        else:
+            if not postprocessors:
+                spec = CLASSIFICATION_MODELS[name]
+                postprocessors[None] = classification_postprocess(model, h, w, score_threshold=spec.score_threshold,
+                                                                  nms_top_k=spec.nms_top_k)
+            t0 = time.perf_counter()
+            postprocessors[None].classify(outputs, ori_h, ori_w)
+        postprocess_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    result = dict(model=name, model_file=model_file, backend=type(model).__name__, input=f"{h}x{w}",
+                  images=len(corpus), load_ms=load_ms, first_forward_ms=warmup_ms[0] if warmup_ms else None,
+                  warmup_mean_ms=float(np.mean(warmup_ms)) if warmup_ms else None)
+    for prefix, values in [("forward", forward_ms_list), ("preprocess", preprocess_ms),
+                           ("postprocess", postprocess_ms)]:
+        for key, value in distribution(values).items():
+            result[f"{prefix}_{key}_ms"] = value
+    result["forward_per_second"] = 1000.0 / result["forward_mean_ms"]
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0    # KiB on Linux
+    return result
+
+
+def median_result(runs):
+    """
+    :param runs: result dicts of repeated measurements of one model
+    :return: result dict with the median of every float figure
+    """
+    result = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, float):
+            result[key] = float(np.median([run[key] for run in runs]))
+    result["repeats"] = len(runs)
+    return result
+
+
+def compare(results, baseline_path, tolerance, min_delta_ms=0.5):
+    """
+    :param results: list of result dicts of this run
+    :param baseline_path: JSON report of a previous run
+    :param tolerance: allowed relative increase, 0.2 is 20 %
+    :param min_delta_ms: increases up to this many milliseconds are never regressions
+    :return: list of regression descriptions
+    """
+    with open(baseline_path) as f:
+        baseline = {result["model"]: result for result in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["model"])
+        if previous is None:
+            continue
+        standin = "StandInModel" in (result.get("backend"), previous.get("backend"))
+        for key in COMPARED:
+            old, new = previous.get(key), result.get(key)
+            if not old or new is None or (standin and key in STANDIN_SKIPPED):
+                continue
+            change = new / old - 1.0
+            flag = "REGRESSION" if change > tolerance and new - old > min_delta_ms else ""
+            print(f"{result['model']:<20} {key:<22} {old:>10.3f} -> {new:>10.3f} {change:>+8.1%} {flag}")
+            if flag:
+                regressions.append(f"{result['model']} {key} {change:+.1%}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark classification and detection models")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS, help="Models measured")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto", help="Inference backend")
+    parser.add_argument("--forward-ms", type=float, default=0.0, help="Simulated forward latency of the stand-in")
+    parser.add_argument("--images", type=str, default=None, help="Folder of the image corpus, generated if omitted")
+    parser.add_argument("--corpus-size", type=int, default=32, help="Images used from the corpus")
+    parser.add_argument("--warmup", type=int, default=5, help="Forward calls before the measurement")
+    parser.add_argument("--iterations", type=int, default=200, help="Forward calls measured")
+    parser.add_argument("--json", type=str, default="bench_models.json", help="JSON report written")
+    parser.add_argument("--csv", type=str, default="bench_models.csv", help="CSV report written")
+    parser.add_argument("--compare", type=str, default=None, help="JSON report of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative latency increase")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="Latency increases up to this are never regressions")
+    parser.add_argument("--repeats", type=int, default=5, help="Measurements per model, the median is reported")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Measure all models in this process; peak RSS is then cumulative")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.models:
+        model_file = CLASSIFICATION_MODELS[name].model_file if name in CLASSIFICATION_MODELS \
+            else {**DETECTION_MODELS, **SEGMENTATION_MODELS}[name]
+        if args.backend != "standin" and not os.path.exists(model_file):
+            print(f"{name}: model file {model_file} not found, skipped")
+            continue
+        job = (name, model_file, args.backend, args.images, args.corpus_size, args.warmup, args.iterations,
+               args.forward_ms)
+        runs = []
+        for _ in range(max(1, args.repeats)):
+            if args.in_process:
+                runs.append(bench_model(*job))
+            else:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    runs.append(executor.submit(bench_model, *job).result())
+        result = median_result(runs)
+        results.append(result)
+        print(f"{name:<20} load {result['load_ms']:8.1f} ms  forward p50 {result['forward_p50_ms']:7.3f} "
+              f"p95 {result['forward_p95_ms']:7.3f} ms  pre {result['preprocess_mean_ms']:6.3f} ms  "
+              f"post {result['postprocess_mean_ms']:6.3f} ms  rss {result['peak_rss_mb']:6.1f} MB")
+
+    report = dict(created=time.strftime("%Y-%m-%dT%H:%M:%S"), host=platform.node(), machine=platform.machine(),
+                  python=platform.python_version(), settings=vars(args), results=results)
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    if results:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    print(f"report written to {args.json} and {args.csv}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("regressions: " + ", ".join(regressions))
+            sys.exit(1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_nv12.py
+Micro-benchmark of the shared BGR to NV12 converter against the original per-script version
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The sizes are the model input geometries used in this repository:
+224x224 (ResNet18, VargConvNet), 300x300 (EfficientNet), 512x512 (FCOS)
+and 1024x2048 (MobileNet UNet). With --threads 4 every converter runs on
+all four A53 cores of the X3, which is how a prefetching loader uses it.
+
+$ PYTHONPATH=. python3 src/benchmark/bench_nv12.py --threads 4
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+from src.common.nv12 import NV12BufferPool, bgr2nv12_opencv, resize_bgr2nv12
+
+SIZES = [(224, 224), (300, 300), (512, 512), (1024, 2048)]
+
+
+def bgr2nv12_legacy(image):
+    """The converter as it was copy-pasted into every script before src/common/nv12.py"""
+    height, width = image.shape[0], image.shape[1]
+    area = height * width
+    yuv420p = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).reshape((area * 3 // 2,))
+    y = yuv420p[:area]
+    uv_planar = yuv420p[area:].reshape((2, area // 4))
+    uv_packed = uv_planar.transpose((1, 0)).reshape((area // 2,))
+
+    nv12 = np.zeros_like(yuv420p)
+    nv12[:height * width] = y
+    nv12[height * width:] = uv_packed
+    return nv12
+
+
+def frames_per_second(convert, frames, threads, seconds):
+    """
+    Run convert over the frames repeatedly for about the given time
+
+    :param convert: callable taking one frame
+    :param frames: list of input frames
+    :param threads: number of worker threads, 1 runs inline
+    :param seconds: minimum measuring time
+    :return: converted frames per second
+    """
+    def worker(deadline):
+        count = 0
+        while time.perf_counter() < deadline:
+            for frame in frames:
+                convert(frame)
+            count += len(frames)
+        return count
+
+    for frame in frames:    # warm up scratch buffers and OpenCV internals
+        convert(frame)
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+    if threads == 1:
+        count = worker(deadline)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            count = sum(executor.map(worker, [deadline] * threads))
+    return count / (time.perf_counter() - t0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark BGR to NV12 conversion")
+    parser.add_argument("--threads", type=int, default=1, help="Worker threads, 4 uses every X3 core")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Measuring time per case")
+    parser.add_argument("--source", type=str, default="1080x1920",
+                        help="HxW of the camera frame for the fused resize case")
+    args = parser.parse_args()
+    src_h, src_w = (int(v) for v in args.source.split("x"))
+
+    rng = np.random.default_rng(0)
+    source = [rng.integers(0, 256, (src_h, src_w, 3), dtype=np.uint8) for _ in range(2)]
+    pool = NV12BufferPool()
+
+    print(f"threads: {args.threads}, fused resize source: {src_h}x{src_w}")
+    print(f"{'size':>10} {'legacy':>10} {'shared':>10} {'speedup':>8} {'resize+legacy':>14} {'fused':>10} {'speedup':>8}")
+    for h, w in SIZES:
+        frames = [cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA) for img in source]
+        assert np.array_equal(bgr2nv12_legacy(frames[0]), bgr2nv12_opencv(frames[0]))
+
+        def shared(frame):
+            nv12 = pool.acquire(h, w)
+            bgr2nv12_opencv(frame, out=nv12)
+            pool.release(nv12)
+
+        def resize_legacy(frame):
+            bgr2nv12_legacy(cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA))
+
+        def fused(frame):
+            nv12 = pool.acquire(h, w)
+            resize_bgr2nv12(frame, h, w, out=nv12)
+            pool.release(nv12)
+
+        legacy_fps = frames_per_second(bgr2nv12_legacy, frames, args.threads, args.seconds)
+        shared_fps = frames_per_second(shared, frames, args.threads, args.seconds)
+        resize_fps = frames_per_second(resize_legacy, source, args.threads, args.seconds)
+        fused_fps = frames_per_second(fused, source, args.threads, args.seconds)
+        print(f"{h:>4}x{w:<5} {legacy_fps:>10.1f} {shared_fps:>10.1f} {shared_fps / legacy_fps:>7.2f}x"
+              f" {resize_fps:>14.1f} {fused_fps:>10.1f} {fused_fps / resize_fps:>7.2f}x")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+backend.py
+Pluggable inference backend: hobot_dnn on the board, a NumPy stand-in everywhere else
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The stand-in mimics the parts of hobot_dnn.pyeasy_dnn the scripts use:
+Model.inputs/outputs with TensorProperties (tensor_type, dtype, layout, shape,
+scale_data) and Model.forward(nv12) returning tensors with .buffer and
+.properties. Output shapes, layouts and quantization follow the models in
+/app/pydev_demo/models, the geometry is taken from the file name
+(e.g. resnet18_224x224_nv12.bin), so the model file does not need to exist.
+Outputs are pseudo-random but deterministic per input, and forward_ms can
+simulate the BPU latency to build throughput benchmarks on an x86 box.
+
+$ PYTHONPATH=. python3 src/basic/test_resnet18_batch.py images resnet18_224x224_nv12.bin --backend standin
+"""
+
+import os
+import re
+import time
+
+import numpy as np
+
+from src.common.fcos import FCOS_STRIDES, FcosDecoder
+from src.common.nv12 import nv12_size
+from src.common.postprocess import ClassificationPostProcessContext, FcosPostProcessContext, \
+    NumpyClassificationPostProcess, have_libpostprocess
+
+BACKENDS = ["auto", "hobot", "standin"]
+
+STANDIN_VARIANTS = 8    # distinct output sets cycled through by forward()
+
+
+class StandInTensorProperties:
+    """Same attributes as pyeasy_dnn.TensorProperties"""
+
+    def __init__(self, shape, dtype="float32", layout="NCHW", tensor_type="float32", scale_data=None):
+        self.shape = tuple(shape)
+        self.alignment_shape = tuple(shape)
+        self.dtype = dtype
+        self.layout = layout
+        self.tensor_type = tensor_type
+        self.scale_data = np.zeros(0, dtype=np.float32) if scale_data is None else scale_data
+        self.quanti_type = "SCALE" if len(self.scale_data) else "NONE"
+
+
+class StandInTensor:
+    """Same attributes as pyeasy_dnn.pyDNNTensor"""
+
+    def __init__(self, name, properties, buffer=None):
+        self.name = name
+        self.properties = properties
+        self.buffer = buffer
+
+
+class StandInModel:
+    """
+    CPU stand-in for a pyeasy_dnn.Model compiled for NV12 input
+    """
+
+    def __init__(self, model_file, forward_ms=0.0, seed=0):
+        """
+        :param model_file: model path, only its file name is used to pick shapes
+        :param forward_ms: simulated BPU latency per forward call
+        :param seed: seed of the generated outputs
+        """
+        self.name = os.path.splitext(os.path.basename(model_file))[0]
+        self.forward_ms = forward_ms
+        height, width = standin_input_hw(self.name)
+        self.inputs = [StandInTensor("data", StandInTensorProperties(
+            (1, 3, height, width), dtype="uint8", layout="NCHW", tensor_type="NV12_SEPARATE"))]
+        rng = np.random.default_rng(seed)
+        if self.name.startswith("fcos"):
+            self.outputs, self._variants = _fcos_outputs(height, width, rng)
+        elif self.name.startswith("mobilenet_unet"):
+            self.outputs, self._variants = _segmentation_outputs(height, width, rng)
+        else:
+            self.outputs, self._variants = _classification_outputs(rng)
+
+    def forward(self, data):
+        """
+        :param data: flat NV12 input of the model input size
+        :return: list of output tensors, buffers are shared between calls like on the BPU
+        """
+        h, w = self.inputs[0].properties.shape[2:]
+        if data.size != nv12_size(h, w):
+            raise ValueError(f"{self.name} expects {nv12_size(h, w)} bytes of NV12, got {data.size}")
+        if self.forward_ms:
+            time.sleep(self.forward_ms / 1000.0)
+        variant = self._variants[int(data[::4099].sum()) % len(self._variants)]
+        return [StandInTensor(output.name, output.properties, buffer)
+                for output, buffer in zip(self.outputs, variant)]
+
+
+def standin_input_hw(name):
+    """
+    :param name: model file name such as fcos_512x512_nv12
+    :return: (height, width) of the model input, 224x224 when the name has no geometry
+    """
+    match = re.search(r"(\d+)x(\d+)", name)
+    if match is None:
+        return 224, 224
+    return int(match.group(1)), int(match.group(2))
+
+
+def _classification_outputs(rng, classes=1000):
+    properties = StandInTensorProperties((1, classes, 1, 1))
+    variants = []
+    for _ in range(STANDIN_VARIANTS):
+        logits = rng.standard_normal(classes).astype(np.float32)
+        logits[rng.integers(classes)] += 8.0    # one clear winner per variant
+        variants.append([logits.reshape(properties.shape)])
+    return [StandInTensor("output", properties)], variants
+
+
+def _segmentation_outputs(height, width, rng, classes=19):
+    properties = StandInTensorProperties((1, height // 4, width // 4, classes), layout="NHWC")
+    variants = [[rng.standard_normal(properties.shape).astype(np.float32)] for _ in range(2)]
+    return [StandInTensor("output", properties)], variants
+
+
+def _fcos_outputs(height, width, rng, classes=80, objects=5):
+    """
+    15 quantized NHWC outputs ordered cls[0..4], bbox[0..4], centerness[0..4]
+
+    Class and centerness logits are mostly strongly negative with a few confident
+    cells per variant; bbox holds left/top/right/bottom distances in input pixels.
+    """
+    outputs = []
+    kinds = [("cls", classes), ("bbox", 4), ("centerness", 1)]
+    for kind, channels in kinds:
+        for stride in FCOS_STRIDES:
+            shape = (1, height // stride, width // stride, channels)
+            scale = np.full(channels, 1.0 / 64 if kind != "bbox" else 1.0 / 16, dtype=np.float32)
+            outputs.append(StandInTensor(f"{kind}_stride{stride}", StandInTensorProperties(
+                shape, dtype="int32", layout="NHWC", tensor_type="int32", scale_data=scale)))
+
+    variants = []
+    for _ in range(STANDIN_VARIANTS):
+        buffers = []
+        for output in outputs:
+            shape = output.properties.shape
+            if output.name.startswith("bbox"):
+                stride = height // shape[1]
+                values = rng.uniform(0.5, 3.0, shape) * stride
+            else:
+                values = rng.normal(-6.0, 1.0, shape)
+            buffers.append(values)
+        for _ in range(objects):
+            level = rng.integers(len(FCOS_STRIDES))
+            cls, centerness = buffers[level], buffers[level + 10]
+            y, x = rng.integers(cls.shape[1]), rng.integers(cls.shape[2])
+            cls[0, y, x, rng.integers(classes)] = 3.0
+            centerness[0, y, x, 0] = 2.0
+        variants.append([np.round(values / output.properties.scale_data).astype(np.int32)
+                         for output, values in zip(outputs, buffers)])
+    return outputs, variants
+
+
+def snapshot_outputs(outputs):
+    """
+    Copy the buffers of a forward call so they survive the next forward
+
+    hobot_dnn reuses its output memory, so outputs handed to another thread
+    (e.g. a post-processing pipeline stage) must be copied first.
+
+    :param outputs: list returned by Model.forward
+    :return: list of tensors with private buffers and the same properties
+    """
+    return [StandInTensor(output.name, output.properties, output.buffer.copy()) for output in outputs]
+
+
+def load_models(model_file, backend="auto", forward_ms=0.0):
+    """
+    Drop-in replacement for pyeasy_dnn.load
+
+    :param model_file: path of the compiled .bin model
+    :param backend: "hobot" for the BPU, "standin" for the NumPy stand-in,
+                    "auto" for hobot_dnn when it can be imported
+    :param forward_ms: simulated forward latency of the stand-in
+    :return: list of models
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend in ("auto", "hobot"):
+        try:
+            from hobot_dnn import pyeasy_dnn
+        except ImportError:
+            if backend == "hobot":
+                raise
+            print("hobot_dnn not available, using the NumPy stand-in backend")
+        else:
+            return pyeasy_dnn.load(model_file)
+    return [StandInModel(model_file, forward_ms=forward_ms)]
+
+
+def classification_postprocess(model, height, width, **kwargs):
+    """
+    libpostprocess context when the library is present, NumPy otherwise
+
+    :param model: loaded classification model
+    :param height: model input height
+    :param width: model input width
+    :param kwargs: thresholds forwarded to the context
+    :return: object with run(outputs, ori_height, ori_width) -> result string
+    """
+    if not isinstance(model, StandInModel) and have_libpostprocess():
+        return ClassificationPostProcessContext(model, height, width, **kwargs)
+    return NumpyClassificationPostProcess(model, height, width, **kwargs)
+
+
+def fcos_postprocess(model, height, width, ori_height, ori_width, postprocess="auto", **kwargs):
+    """
+    FCOS post-processor: libpostprocess through ctypes or the NumPy decoder
+
+    :param model: loaded FCOS model
+    :param height: model input height
+    :param width: model input width
+    :param ori_height: height of the image the boxes are reported in
+    :param ori_width: width of the image the boxes are reported in
+    :param postprocess: "ctypes", "numpy" or "auto" (ctypes when the library loads)
+    :param kwargs: thresholds forwarded to the post-processor
+    :return: object with detect(outputs) returning an iterable of detections
+    """
+    if postprocess == "ctypes" or (postprocess == "auto" and not isinstance(model, StandInModel)
+                                   and have_libpostprocess()):
+        return FcosPostProcessContext(model, height, width, ori_height, ori_width, **kwargs)
+    return FcosDecoder(model, height, width, ori_height, ori_width, **kwargs)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+batching.py
+Forward a group of NV12 images at once and hand back per-image outputs
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+A model compiled with batch N (input shape (N, 3, H, W)) takes N NV12 images
+packed one after the other and answers with N rows per output: the images
+are copied into one preallocated input buffer, a short last group is padded
+with its final image, and the outputs are sliced back into per-image views.
+A batch 1 model gets the group as back-to-back forward calls, its outputs
+copied since the runtime reuses them; a group of one is not copied, its
+outputs are read before the next forward() anyway. Either way post-processing then sees
+the whole group and can do its softmax and top-k in one NumPy pass.
+"""
+
+import numpy as np
+
+from src.common.backend import StandInTensor, snapshot_outputs
+from src.common.nv12 import nv12_size
+
+
+def compiled_batch(model):
+    """
+    :param model: loaded model
+    :return: batch size the model was compiled for, the first input dimension
+    """
+    return int(model.inputs[0].properties.shape[0])
+
+
+class MicroBatcher:
+    """
+    Groups of up to batch_size images per forward() call
+    """
+
+    def __init__(self, model, batch_size=1):
+        """
+        :param model: loaded NV12 model
+        :param batch_size: images per group, forced to the compiled batch of a batch > 1 model
+        """
+        self.model = model
+        self.compiled = compiled_batch(model)
+        if self.compiled > 1 and batch_size != self.compiled:
+            print(f"{getattr(model, 'name', 'model')} is compiled for batch {self.compiled}, "
+                  f"using --batch-size {self.compiled}")
+            batch_size = self.compiled
+        self.batch_size = max(1, batch_size)
+        properties = model.inputs[0].properties
+        h, w = (properties.shape[2:4] if properties.layout == "NCHW" else properties.shape[1:3])
+        self.image_bytes = nv12_size(h, w)
+        self.packed = np.empty(self.compiled * self.image_bytes, dtype=np.uint8) if self.compiled > 1 else None
+
+    def forward(self, images):
+        """
+        :param images: list of up to batch_size flat NV12 arrays
+        :return: one list of output tensors per image, valid until the next forward()
+        """
+        if self.packed is None:
+            if len(images) == 1:
+                return [self.model.forward(images[0])]
+            return [snapshot_outputs(self.model.forward(image)) for image in images]
+
+        slots = self.packed.reshape(self.compiled, self.image_bytes)
+        for i in range(self.compiled):
+            slots[i] = images[min(i, len(images) - 1)]
+        outputs = self.model.forward(self.packed)
+        return [[StandInTensor(output.name, output.properties, output.buffer[i:i + 1]) for output in outputs]
+                for i in range(len(images))]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+broadcast.py
+One producer, many asyncio subscribers, latest item only
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Every frame is captured, inferred and serialized once, then handed to all
+connected clients. Each subscriber holds a single slot: a client still busy
+sending the previous frame finds only the newest one when it comes back, the
+frames in between are counted as dropped instead of being queued. A slow
+browser tab therefore never delays the others nor the camera.
+
+Subscriber.serve() sends with at most max_in_flight frames outstanding and
+keeps a moving average of how long a send takes. The hub turns the fastest
+client's send time into a frame interval and pace() lets the capture thread
+sleep accordingly: on a congested link the camera and BPU slow down to what
+can be delivered, so the frames in flight stay fresh instead of being
+computed only to be dropped. For teleoperation the latency of the frame on
+screen matters more than seeing every frame.
+"""
+
+import asyncio
+import time
+
+_END = object()     # published once the producer has no more items
+
+
+class Subscriber:
+    """
+    Latest-only mailbox and send policy of one client
+    """
+
+    def __init__(self, max_in_flight=1):
+        """
+        :param max_in_flight: sends allowed to be outstanding at once in serve()
+        """
+        self._item = None
+        self._ready = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self.delivered = 0
+        self.dropped = 0
+        self.send_time = 0.0    # moving average, seconds
+        self.error = None
+
+    def publish(self, item):
+        """
+        Replace the pending item, counting it as dropped if it was never taken
+
+        :param item: new item
+        """
+        if self._item is not None and self._item is not _END:
+            self.dropped += 1
+        if self._item is not _END:
+            self._item = item
+        self._ready.set()
+
+    async def get(self):
+        """
+        Wait for the newest item
+
+        :return: item, or None once the producer has ended
+        """
+        await self._ready.wait()
+        item = self._item
+        if item is _END:
+            return None
+        self._item = None
+        self._ready.clear()
+        return item
+
+    def close(self):
+        """Make get() return None from now on"""
+        self._item = _END
+        self._ready.set()
+
+    async def _send(self, send, item):
+        t0 = time.perf_counter()
+        try:
+            await send(item)
+            elapsed = time.perf_counter() - t0
+            self.send_time = elapsed if self.delivered == 0 else 0.8 * self.send_time + 0.2 * elapsed
+            self.delivered += 1
+        except Exception as e:
+            self.error = e
+            self.close()
+        finally:
+            self._slots.release()
+
+    async def serve(self, send):
+        """
+        Send every item taken from the slot until the producer ends or a send fails
+
+        :param send: coroutine function sending one item, e.g. websocket.send
+        :raises: the exception of the first failed send
+        """
+        sending = set()
+        try:
+            while True:
+                await self._slots.acquire()
+                item = await self.get()
+                if item is None:
+                    self._slots.release()
+                    break
+                task = asyncio.ensure_future(self._send(send, item))
+                sending.add(task)
+                task.add_done_callback(sending.discard)
+            if sending:
+                await asyncio.wait(sending)
+        finally:
+            for task in sending:
+                task.cancel()
+        if self.error is not None:
+            raise self.error
+
+
+class BroadcastHub:
+    """
+    Pulls items from a blocking producer and publishes each to every subscriber
+    """
+
+    def __init__(self, produce, min_interval=0.0, max_interval=1.0, max_in_flight=1):
+        """
+        :param produce: blocking callable returning the next item, None at the end of the stream
+        :param min_interval: shortest frame interval pace() allows, seconds
+        :param max_interval: longest frame interval pace() imposes, seconds
+        :param max_in_flight: outstanding sends allowed per subscriber
+        """
+        self.produce = produce
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_in_flight = max_in_flight
+        self.subscribers = set()
+        self.produced = 0
+        self.ended = False
+        self.interval = min_interval
+        self._has_subscribers = None
+        self._last_paced = None
+
+    def _event(self):
+        # created lazily so the hub can be built before the event loop runs
+        if self._has_subscribers is None:
+            self._has_subscribers = asyncio.Event()
+        return self._has_subscribers
+
+    def subscribe(self):
+        """
+        :return: new Subscriber receiving every item published from now on
+        """
+        subscriber = Subscriber(self.max_in_flight)
+        if self.ended:
+            subscriber.close()
+        self.subscribers.add(subscriber)
+        self._event().set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        :param subscriber: Subscriber returned by subscribe()
+        """
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self._event().clear()
+        self._update_interval()
+
+    def _update_interval(self):
+        # paced to the fastest client: slower ones skip frames, nobody waits for them
+        intervals = [s.send_time / s.max_in_flight for s in self.subscribers if s.delivered]
+        interval = min(intervals) if intervals else self.min_interval
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+
+    def pace(self):
+        """
+        Sleep so that consecutive calls are at least the current frame interval apart
+
+        Called by the producing thread before it captures a frame.
+        """
+        now = time.monotonic()
+        if self._last_paced is not None and now - self._last_paced < self.interval:
+            time.sleep(self.interval - (now - self._last_paced))
+        self._last_paced = time.monotonic()
+
+    async def run(self):
+        """
+        Produce and publish until the producer ends; nothing is produced while nobody listens
+
+        :raises: the exception of produce(), after the subscribers have been ended
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self._event().wait()
+                item = await loop.run_in_executor(None, self.produce)
+                if item is None:
+                    break
+                self.produced += 1
+                for subscriber in list(self.subscribers):
+                    subscriber.publish(item)
+                self._update_interval()
+        finally:
+            # also when produce() raised: no client keeps waiting for a frame that never comes
+            self.ended = True
+            for subscriber in list(self.subscribers):
+                subscriber.publish(_END)
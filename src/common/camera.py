@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+camera.py
+Grab the model input and the display image of one sensor frame together
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The camera is opened with two scaler outputs, e.g.
+    cam.open_cam(0, -1, fps, [512, 1920], [512, 1080])
+so the IPU produces the model input next to the display image and the CPU
+does no scaling at all. libsrcampy hands out one output per get_img() call,
+and FrameGrabber makes the two calls back to back; they are usually, but not
+always, the same sensor frame, since the camera may deliver a new one in
+between.
+
+With derive_input=True, for a camera opened with one output or when the
+boxes must belong to exactly the displayed frame, get_img() is called once
+for the display image and the model input is scaled from it with
+resize_nv12() (about 1 ms for 1080p to 512x512 on a desktop CPU, a few on
+the X3) into a buffer of an NV12BufferPool. Hand the frame back with
+release() once the model input has been forwarded, so the next grab reuses
+the buffer instead of allocating one per frame.
+
+Either way both images are stamped with one frame id and capture time that
+travel with the frame through the rest of the pipeline. The display image
+stays the bytes object the encoder takes; a model input from the camera is
+wrapped with np.frombuffer, a view on the bytes returned by get_img().
+"""
+
+import collections
+import time
+
+import numpy as np
+
+from src.common.nv12 import NV12BufferPool, nv12_size, resize_nv12
+
+Frame = collections.namedtuple("Frame", ["frame_id", "timestamp", "nv12", "display"])
+
+
+class FrameGrabber:
+    """
+    Model input and display image of one sensor frame per grab()
+    """
+
+    def __init__(self, cam, input_size=(512, 512), display_size=(1920, 1080), module=2, derive_input=False,
+                 buffers=8):
+        """
+        :param cam: opened hobot_vio libsrcampy Camera
+        :param input_size: (width, height) of the model input
+        :param display_size: (width, height) of the displayed output
+        :param module: get_img() module, 2 is the IPU scaler
+        :param derive_input: scale the model input from the display image instead of a second get_img() call
+        :param buffers: model input buffers kept for reuse with derive_input, at least the frames in flight
+        """
+        self.cam = cam
+        self.input_size = input_size
+        self.display_size = display_size
+        self.module = module
+        self.derive_input = derive_input
+        self.input_bytes = nv12_size(input_size[1], input_size[0])
+        self.display_bytes = nv12_size(display_size[1], display_size[0])
+        self.pool = NV12BufferPool(max_free=buffers)
+        self.frame_id = 0
+
+    def grab(self):
+        """
+        :return: Frame with the NV12 model input as a uint8 view and the display image as bytes,
+                 None when the camera returned no image
+        """
+        timestamp = time.time()
+        if self.derive_input:
+            display = self.cam.get_img(self.module, *self.display_size)
+            if display is None:
+                return None
+            if len(display) != self.display_bytes:
+                raise RuntimeError(f"camera returned {len(display)} bytes, expected NV12 {self.display_size}")
+            nv12 = resize_nv12(display, self.display_size[1], self.display_size[0],
+                               self.input_size[1], self.input_size[0],
+                               out=self.pool.acquire(self.input_size[1], self.input_size[0]))
+        else:
+            nv12 = self.cam.get_img(self.module, *self.input_size)
+            display = self.cam.get_img(self.module, *self.display_size)
+            if nv12 is None or display is None:
+                return None
+            if len(nv12) != self.input_bytes or len(display) != self.display_bytes:
+                raise RuntimeError(f"camera returned {len(nv12)} and {len(display)} bytes, expected NV12 "
+                                   f"{self.input_size} and {self.display_size}")
+            nv12 = np.frombuffer(nv12, dtype=np.uint8)
+        self.frame_id += 1
+        return Frame(self.frame_id, timestamp, nv12, display)
+
+    def release(self, nv12):
+        """
+        Hand back the model input of a grabbed frame once it is no longer needed
+
+        :param nv12: Frame.nv12, must not be used by the caller afterwards
+        """
+        if self.derive_input:
+            self.pool.release(nv12)
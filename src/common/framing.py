@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+framing.py
+Build the web display FrameMessage without copying the JPEG
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+A 1080p JPEG is a few hundred kB. Assigning it to FrameMessage.img_.buf_ and
+calling SerializeToString() copies it twice per frame for nothing, since
+protobuf stores a bytes field verbatim after its tag and length. Here only
+the small part of the message (targets, timestamp, image size and type) goes
+through protobuf; the img_ field header is written by hand from the field
+numbers in the x3_pb2 descriptors and the JPEG follows untouched:
+
+    [ FrameMessage without img_ | img_ tag, length | width, height, type | buf_ tag, length ] [ JPEG ]
+
+The two chunks are sent as one fragmented WebSocket message, which the
+browser receives as a single ordinary FrameMessage.
+"""
+
+import numpy as np
+
+_WIRE_LENGTH_DELIMITED = 2
+
+
+def varint(value):
+    """
+    :param value: non-negative integer
+    :return: protobuf base 128 varint encoding
+    """
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def length_delimited_header(field_number, length):
+    """
+    :param field_number: protobuf field number
+    :param length: length of the payload that follows
+    :return: tag and length bytes of a bytes, string or embedded message field
+    """
+    return varint(field_number << 3 | _WIRE_LENGTH_DELIMITED) + varint(length)
+
+
+class FrameSerializer:
+    """
+    Reusable FrameMessage builder for one image size and class list
+    """
+
+    def __init__(self, x3_pb2, classes, width=1920, height=1080, image_type="JPEG"):
+        """
+        :param x3_pb2: generated protobuf module of the web display
+        :param classes: class names indexed by detection id
+        :param width: width of the displayed image, boxes are clamped to it
+        :param height: height of the displayed image, boxes are clamped to it
+        :param image_type: value of img_.type_
+        """
+        self.names = [str(name) for name in classes]
+        self.frame = x3_pb2.FrameMessage()
+        # min y is 2 not 0, leaving room for the label drawn above the box
+        self.lower = np.array([0, 2, 0, 0], dtype=np.float32)
+        self.upper = np.array([width, height, width, height], dtype=np.float32)
+
+        image = self.frame.img_
+        image.width_ = width
+        image.height_ = height
+        image.type_ = image_type
+        self.image_header = image.SerializePartialToString()
+        self.img_field = self.frame.DESCRIPTOR.fields_by_name["img_"].number
+        self.buf_field = image.DESCRIPTOR.fields_by_name["buf_"].number
+        self.frame.ClearField("img_")
+
+    def serialize(self, detections, jpeg, timestamp):
+        """
+        :param detections: structured array of DETECTION_DTYPE in display coordinates
+        :param jpeg: encoded image bytes, not copied
+        :param timestamp: smart_msg_.timestamp_
+        :return: tuple of bytes chunks whose concatenation is the serialized FrameMessage
+        """
+        smart_msg = self.frame.smart_msg_
+        del smart_msg.targets_[:]
+        smart_msg.timestamp_ = timestamp
+        if len(detections):
+            boxes = np.clip(detections["bbox"], self.lower, self.upper).astype(np.int32).tolist()
+            for (x1, y1, x2, y2), score, cid in zip(boxes, detections["score"].tolist(), detections["id"].tolist()):
+                name = self.names[cid]
+                box = smart_msg.targets_.add(type_=name).boxes_.add(type_=name, score_=score)
+                box.top_left_.x_ = x1
+                box.top_left_.y_ = y1
+                box.bottom_right_.x_ = x2
+                box.bottom_right_.y_ = y2
+
+        buf_header = length_delimited_header(self.buf_field, len(jpeg))
+        img_length = len(self.image_header) + len(buf_header) + len(jpeg)
+        head = b"".join([self.frame.SerializeToString(), length_delimited_header(self.img_field, img_length),
+                         self.image_header, buf_header])
+        return head, jpeg
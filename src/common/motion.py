@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+motion.py
+Frame differencing on the NV12 luma plane to skip inference on a static scene
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+A fixed-mount camera watching an empty yard sends the same picture for
+minutes, and every forward() on it returns the detections of the frame
+before. The first height x width bytes of an NV12 model input are the Y
+(luma) plane, a grey image for free. MotionGate shrinks it to a 64x64
+thumbnail (cv2.INTER_AREA, which also averages out sensor noise) and counts
+the pixels that differ by more than `pixel_delta` from the thumbnail of the
+last frame that was run through the model. Below `threshold`, as a fraction
+of the thumbnail, the caller reuses the previous detections.
+
+Comparing against the last inferred frame rather than the previous frame
+lets slow changes add up until they trigger. `refresh_seconds` forces a
+frame through regardless, so a stale result never lives longer than that.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+THUMBNAIL = (64, 64)
+
+
+class MotionGate:
+    """
+    check(nv12) -> True when the frame should go through the model
+    """
+
+    def __init__(self, height, width, threshold=0.005, pixel_delta=12, refresh_seconds=2.0):
+        """
+        :param height: height of the NV12 frames
+        :param width: width of the NV12 frames
+        :param threshold: fraction of thumbnail pixels that must change, 0 lets every frame through
+        :param pixel_delta: luma difference (0-255) from which a thumbnail pixel counts as changed
+        :param refresh_seconds: let a frame through at least this often, None for never
+        """
+        self.height = height
+        self.width = width
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.refresh_seconds = refresh_seconds
+        self.frames = 0
+        self.passed = 0
+        self.change = 0.0       # changed fraction of the last frame checked
+        self._reference = None
+        self._reference_time = 0.0
+        self._thumbnail = np.empty(THUMBNAIL[::-1], dtype=np.uint8)
+        self._diff = np.empty(THUMBNAIL[::-1], dtype=np.uint8)
+
+    def check(self, nv12):
+        """
+        :param nv12: flat NV12 frame of height x width, or its Y plane
+        :return: True when the frame changed enough or the refresh interval is over; it then becomes the reference
+        """
+        self.frames += 1
+        luma = np.frombuffer(nv12, dtype=np.uint8, count=self.height * self.width).reshape(self.height, self.width)
+        cv2.resize(luma, THUMBNAIL, dst=self._thumbnail, interpolation=cv2.INTER_AREA)
+        now = time.monotonic()
+        if self._reference is None or self.threshold <= 0:
+            run = True
+        else:
+            cv2.absdiff(self._thumbnail, self._reference, dst=self._diff)
+            self.change = np.count_nonzero(self._diff > self.pixel_delta) / self._diff.size
+            run = (self.change >= self.threshold
+                   or (self.refresh_seconds is not None and now - self._reference_time >= self.refresh_seconds))
+        if run:
+            if self._reference is None:
+                self._reference = np.empty_like(self._thumbnail)
+            self._reference, self._thumbnail = self._thumbnail, self._reference
+            self._reference_time = now
+            self.passed += 1
+        return run
+
+    def skipped_ratio(self):
+        """
+        :return: fraction of the checked frames that were skipped
+        """
+        return 1.0 - self.passed / self.frames if self.frames else 0.0
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+nv12.py
+Shared BGR to NV12 conversion for the hobot_dnn pipelines
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The BPU models take NV12 input: a full resolution Y plane followed by one
+half resolution plane of interleaved U/V samples. OpenCV only produces planar
+I420, so the U and V planes have to be interleaved after the colour conversion.
+
+The converter here writes I420 straight into the caller's NV12 buffer (the Y
+plane is then already in place), copies only the chroma quarter planes to a
+per-thread scratch buffer and interleaves them back with two strided stores.
+Buffers can be reused across frames through NV12BufferPool.
+"""
+
+import threading
+
+import numpy as np
+import cv2
+
+_local = threading.local()
+
+
+def nv12_size(height, width):
+    """
+    Number of bytes in an NV12 image
+
+    :param height: image height in pixels (even)
+    :param width: image width in pixels (even)
+    :return: size of the flat NV12 buffer
+    """
+    return height * width * 3 // 2
+
+
+def _scratch(name, shape):
+    """
+    Per-thread scratch buffer, reallocated only when a new shape is requested
+
+    :param name: scratch buffer family, e.g. "chroma" or "resize"
+    :param shape: required buffer shape
+    :return: uint8 array of the requested shape
+    """
+    buffers = getattr(_local, name, None)
+    if buffers is None:
+        buffers = {}
+        setattr(_local, name, buffers)
+    buf = buffers.get(shape)
+    if buf is None:
+        buf = np.empty(shape, dtype=np.uint8)
+        buffers[shape] = buf
+    return buf
+
+
+class NV12BufferPool:
+    """
+    Pool of reusable NV12 output buffers
+
+    Buffers are flat uint8 arrays, so they are pooled by byte size: any resolution
+    with the same pixel count can reuse the same buffer.
+    """
+
+    def __init__(self, max_free=8):
+        """
+        :param max_free: number of idle buffers kept per size, extra releases are dropped
+        """
+        self.max_free = max_free
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, height, width):
+        """
+        Get an NV12 buffer for the given resolution
+
+        :param height: image height in pixels
+        :param width: image width in pixels
+        :return: flat uint8 array of nv12_size(height, width) bytes, contents undefined
+        """
+        size = nv12_size(height, width)
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                return free.pop()
+        return np.empty(size, dtype=np.uint8)
+
+    def release(self, nv12):
+        """
+        Return a buffer obtained from acquire() to the pool
+
+        :param nv12: buffer to recycle, must not be used by the caller afterwards
+        """
+        with self._lock:
+            free = self._free.setdefault(nv12.size, [])
+            if len(free) < self.max_free:
+                free.append(nv12)
+
+
+def bgr2nv12_opencv(image, out=None):
+    """
+    Convert a BGR image to NV12
+
+    :param image: HxWx3 uint8 BGR image with even height and width
+    :param out: optional flat uint8 buffer of nv12_size(H, W) bytes to write into
+    :return: NV12 data as a flat uint8 array (out when given)
+    """
+    height, width = image.shape[0], image.shape[1]
+    area = height * width
+    quarter = area // 4
+    if out is None:
+        out = np.empty(nv12_size(height, width), dtype=np.uint8)
+    # planar I420 lands directly in the output, Y needs no further work
+    cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420, dst=out.reshape((height * 3 // 2, width)))
+    chroma = _scratch("chroma", (2 * quarter,))
+    chroma[:] = out[area:]
+    uv = out[area:].reshape((quarter, 2))
+    uv[:, 0] = chroma[:quarter]
+    uv[:, 1] = chroma[quarter:]
+    return out
+
+
+def resize_nv12(nv12, height, width, out_height, out_width, out=None, interpolation=cv2.INTER_LINEAR):
+    """
+    Resize an NV12 image without converting it, the Y and the interleaved UV plane each in one cv2.resize
+
+    :param nv12: flat NV12 buffer (bytes or uint8 array) of height x width
+    :param height: height of the input image
+    :param width: width of the input image
+    :param out_height: height of the output image (even)
+    :param out_width: width of the output image (even)
+    :param out: optional flat uint8 buffer of nv12_size(out_height, out_width) bytes
+    :param interpolation: OpenCV interpolation flag used for both planes; INTER_AREA is about ten times slower
+    :return: NV12 data as a flat uint8 array (out when given)
+    """
+    src = np.frombuffer(nv12, dtype=np.uint8, count=nv12_size(height, width))
+    if out is None:
+        out = np.empty(nv12_size(out_height, out_width), dtype=np.uint8)
+    area, out_area = height * width, out_height * out_width
+    cv2.resize(src[:area].reshape(height, width), (out_width, out_height),
+               dst=out[:out_area].reshape(out_height, out_width), interpolation=interpolation)
+    cv2.resize(src[area:].reshape(height // 2, width // 2, 2), (out_width // 2, out_height // 2),
+               dst=out[out_area:].reshape(out_height // 2, out_width // 2, 2), interpolation=interpolation)
+    return out
+
+
+def resize_bgr2nv12(image, height, width, out=None, interpolation=cv2.INTER_AREA):
+    """
+    Resize a BGR image to the model input size and convert it to NV12
+
+    The resized image is kept in a per-thread scratch buffer, so the only
+    per-call allocation left is the NV12 output when out is not given.
+
+    :param image: HxWx3 uint8 BGR image of any size
+    :param height: model input height
+    :param width: model input width
+    :param out: optional flat uint8 buffer of nv12_size(height, width) bytes
+    :param interpolation: OpenCV interpolation flag used for the resize
+    :return: NV12 data as a flat uint8 array (out when given)
+    """
+    if image.shape[0] != height or image.shape[1] != width:
+        resized = _scratch("resize", (height, width, 3))
+        image = cv2.resize(image, (width, height), dst=resized, interpolation=interpolation)
+    return bgr2nv12_opencv(image, out)
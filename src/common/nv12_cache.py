@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+nv12_cache.py
+On-disk cache of pre-processed NV12 model inputs
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Rerunning a model comparison over the same folder repeats cv2.imread, the
+resize and the NV12 conversion for every image. The cache stores each result
+as a .npy file named after a key of the source file (path, size and mtime,
+or optionally a SHA-1 of its content), the target height x width and the
+interpolation. A hit is opened with np.load(mmap_mode="r"): no decode, and the
+page cache supplies the bytes straight to forward().
+
+The original image shape, needed by the post-processing, is part of the file
+name. The cache is bounded in bytes; the least recently used entries are
+deleted first and the access order survives restarts through the files'
+modification times.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+class NV12Cache:
+    """
+    Directory of <key>-<height>x<width>x<channels>.npy NV12 inputs
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30, content_hash=False):
+        """
+        :param directory: cache directory, created when missing
+        :param max_bytes: total size kept, least recently used entries are evicted beyond it
+        :param content_hash: key on a SHA-1 of the file content instead of its size and mtime
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()   # key -> (file name, bytes), least recent first
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".npy") and "-" in entry.name:
+                stat = entry.stat()
+                found.append((stat.st_mtime_ns, entry.name.split("-")[0], entry.name, stat.st_size))
+        for _, key, name, size in sorted(found):
+            self._entries[key] = (name, size)
+            self._bytes += size
+        self._evict()   # max_bytes may be lower than in the previous run
+
+    def key(self, path, height, width, interpolation):
+        """
+        :param path: source image file
+        :param height: model input height
+        :param width: model input width
+        :param interpolation: OpenCV interpolation flag of the resize
+        :return: hex key of this pre-processing of this file
+        """
+        digest = hashlib.sha1()
+        if self.content_hash:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            stat = os.stat(path)
+            digest.update(f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        digest.update(f":{height}x{width}:{interpolation}".encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        :param key: value of key()
+        :return: (original image shape, read-only memory-mapped NV12 array), or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        name = entry[0]
+        path = os.path.join(self.directory, name)
+        try:
+            nv12 = np.load(path, mmap_mode="r")
+            os.utime(path)  # recency for the next process
+        except (OSError, ValueError):
+            # evicted by another process, or a torn file
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._bytes -= entry[1]
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        shape = tuple(int(v) for v in name[:-4].split("-")[1].split("x"))
+        return shape, nv12
+
+    def put(self, key, shape, nv12):
+        """
+        Store one NV12 input, evicting old entries beyond max_bytes
+
+        :param key: value of key()
+        :param shape: shape of the original image
+        :param nv12: flat uint8 NV12 array, copied to disk
+        """
+        name = f"{key}-{'x'.join(str(v) for v in shape)}.npy"
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, nv12)
+        os.replace(tmp, path)   # readers never see a partial file
+        size = os.path.getsize(path)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (name, size)
+            self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_name, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except FileNotFoundError:
+                pass
+
+    def size(self):
+        """
+        :return: (entries, bytes) currently cached
+        """
+        with self._lock:
+            return len(self._entries), self._bytes
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+Chain of worker threads connected by bounded queues
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+A source callable and every stage run on their own thread, so while the BPU
+works on frame N the CPU can post-process frame N-1 and JPEG-encode frame
+N-2: throughput is bounded by the slowest stage instead of the sum of all.
+Camera capture, hobot_dnn forward, OpenCV and the hardware encoder all
+release the GIL while they wait. Queues are bounded, so a slow stage
+back-pressures the ones before it instead of piling up frames.
+
+pause() stops the source, e.g. while nobody watches a live camera. Items
+already in the queues or inside a stage were captured before the pause;
+resume() starts a new generation, and items of an older one are dropped at
+the next hand-over, so the first item out after resume() is a fresh one.
+"""
+
+import queue
+import threading
+import time
+import traceback
+
+_END = object()     # end-of-stream marker travelling down the queues
+
+
+class Pipeline:
+    """
+    source -> stage 1 -> ... -> stage n -> get()
+
+    A stage returning None drops the item, e.g. a frame without detections
+    that does not need to be sent.
+    """
+
+    def __init__(self, source, stages, queue_size=2, name="pipeline"):
+        """
+        :param source: callable producing the next item, None ends the stream
+        :param stages: list of (name, callable) pairs applied in order to every item
+        :param queue_size: capacity of every queue between two threads
+        :param name: thread name prefix
+        """
+        self.name = name
+        self.source = source
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.stopping = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.generation = 0
+        self.error = None
+        self.counts = {stage_name: 0 for stage_name, _ in [("source", None)] + stages}
+        self.busy = dict.fromkeys(self.counts, 0.0)
+        self.threads = []
+
+    def start(self):
+        """Start the source and stage threads"""
+        self.threads = [threading.Thread(target=self._run_source, name=f"{self.name}-source", daemon=True)]
+        for i, (stage_name, work) in enumerate(self.stages):
+            self.threads.append(threading.Thread(target=self._run_stage, args=(i, stage_name, work),
+                                                 name=f"{self.name}-{stage_name}", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Ask every thread to finish and wait for them"""
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def pause(self):
+        """Stop the source after the item it is producing; the stages finish what they hold"""
+        self.running.clear()
+
+    def resume(self):
+        """Drop every item produced before and restart the source"""
+        self.generation += 1
+        self.running.set()
+
+    def _put(self, q, item):
+        while not self.stopping.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stopping.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, stage_name):
+        traceback.print_exc()
+        self.error = RuntimeError(f"{self.name} stage {stage_name} failed")
+        self.stopping.set()
+
+    def _run_source(self):
+        try:
+            while not self.stopping.is_set():
+                if not self.running.wait(0.1):
+                    continue
+                generation = self.generation
+                t0 = time.perf_counter()
+                item = self.source()
+                self.busy["source"] += time.perf_counter() - t0
+                if item is None:
+                    break
+                self.counts["source"] += 1
+                if not self._put(self.queues[0], (generation, item)):
+                    return
+        except Exception:
+            self._fail("source")
+        self._put(self.queues[0], _END)
+
+    def _run_stage(self, index, stage_name, work):
+        inbox, outbox = self.queues[index], self.queues[index + 1]
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _END:
+                    break
+                generation, item = item
+                if generation != self.generation:
+                    continue
+                t0 = time.perf_counter()
+                item = work(item)
+                self.busy[stage_name] += time.perf_counter() - t0
+                self.counts[stage_name] += 1
+                if item is not None and not self._put(outbox, (generation, item)):
+                    return
+        except Exception:
+            self._fail(stage_name)
+        self._put(outbox, _END)
+
+    def get(self, timeout=None):
+        """
+        Next item out of the last stage
+
+        :param timeout: seconds to wait, None waits until an item or the end of the stream
+        :return: item, or None once the stream has ended or the pipeline was stopped
+        :raises queue.Empty: when the timeout expires
+        :raises RuntimeError: when a stage failed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                item = self.queues[-1].get(timeout=0.1)
+                if item is _END:
+                    break
+                generation, item = item
+                if generation == self.generation:
+                    break
+            except queue.Empty:
+                if self.stopping.is_set():
+                    item = _END
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+        if item is _END:
+            self.queues[-1].put(_END)  # every later get() sees the end as well
+            if self.error is not None:
+                raise self.error
+            return None
+        return item
+
+    def stats(self):
+        """
+        :return: dict of stage name -> (items, mean seconds per item)
+        """
+        return {stage_name: (count, self.busy[stage_name] / count if count else 0.0)
+                for stage_name, count in self.counts.items()}
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+postprocess.py
+ctypes bindings for /usr/lib/libpostprocess.so and reusable post-processing contexts
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The hbDNNTensor_t descriptors handed to libpostprocess only change in one
+field between two forward calls of the same model: the virtual address of the
+output buffer. The contexts below fill in layout, quantization and shape once
+per model and rebind sysMem[0].virAddr per forward call.
+
+classify() and detect() return the structured arrays of src/common/results.py,
+built from the JSON list in the library result string. When the library
+is not available (e.g. off-board with the stand-in backend of
+src/common/backend.py) NumpyClassificationPostProcess builds the same
+structured array straight from the output tensors.
+
+Adapted from DF Robot RDK X3 documentation
+"""
+
+import ctypes
+import json
+
+import numpy as np
+
+from src.common.results import CLASSIFICATION_DTYPE, parse_classifications, parse_detections
+
+LIBPOSTPROCESS_PATH = '/usr/lib/libpostprocess.so'
+
+_libpostprocess = None
+
+
+class hbSysMem_t(ctypes.Structure):
+    _fields_ = [
+        ("phyAddr", ctypes.c_double),
+        ("virAddr", ctypes.c_void_p),
+        ("memSize", ctypes.c_int)
+    ]
+
+
+class hbDNNQuantiShift_yt(ctypes.Structure):
+    _fields_ = [
+        ("shiftLen", ctypes.c_int),
+        ("shiftData", ctypes.c_char_p)
+    ]
+
+
+class hbDNNQuantiScale_t(ctypes.Structure):
+    _fields_ = [
+        ("scaleLen", ctypes.c_int),
+        ("scaleData", ctypes.POINTER(ctypes.c_float)),
+        ("zeroPointLen", ctypes.c_int),
+        ("zeroPointData", ctypes.c_char_p)
+    ]
+
+
+class hbDNNTensorShape_t(ctypes.Structure):
+    _fields_ = [
+        ("dimensionSize", ctypes.c_int * 8),
+        ("numDimensions", ctypes.c_int)
+    ]
+
+
+class hbDNNTensorProperties_t(ctypes.Structure):
+    _fields_ = [
+        ("validShape", hbDNNTensorShape_t),
+        ("alignedShape", hbDNNTensorShape_t),
+        ("tensorLayout", ctypes.c_int),
+        ("tensorType", ctypes.c_int),
+        ("shift", hbDNNQuantiShift_yt),
+        ("scale", hbDNNQuantiScale_t),
+        ("quantiType", ctypes.c_int),
+        ("quantizeAxis", ctypes.c_int),
+        ("alignedByteSize", ctypes.c_int),
+        ("stride", ctypes.c_int * 8)
+    ]
+
+
+class hbDNNTensor_t(ctypes.Structure):
+    _fields_ = [
+        ("sysMem", hbSysMem_t * 4),
+        ("properties", hbDNNTensorProperties_t)
+    ]
+
+
+class ClassificationPostProcessInfo_t(ctypes.Structure):
+    _fields_ = [
+        ("height", ctypes.c_int),
+        ("width", ctypes.c_int),
+        ("ori_height", ctypes.c_int),
+        ("ori_width", ctypes.c_int),
+        ("score_threshold", ctypes.c_float),
+        ("nms_threshold", ctypes.c_float),
+        ("nms_top_k", ctypes.c_int),
+        ("is_pad_resize", ctypes.c_int)
+    ]
+
+
+class FcosPostProcessInfo_t(ctypes.Structure):
+    _fields_ = [
+        ("height", ctypes.c_int),
+        ("width", ctypes.c_int),
+        ("ori_height", ctypes.c_int),
+        ("ori_width", ctypes.c_int),
+        ("score_threshold", ctypes.c_float),
+        ("nms_threshold", ctypes.c_float),
+        ("nms_top_k", ctypes.c_int),
+        ("is_pad_resize", ctypes.c_int)
+    ]
+
+
+def get_TensorLayout(Layout):
+    """
+    CNN memory layout for tensors
+
+    :param Layout: N, samples (batch size); C, channels; H, height; W, width
+    :return: libpostprocess layout code
+    """
+    if Layout == "NCHW":
+        return int(2)
+    else:
+        return int(0)
+
+
+def load_libpostprocess(path=LIBPOSTPROCESS_PATH):
+    """
+    Load libpostprocess once per process and declare the result getters
+
+    :param path: location of the shared library on the board
+    :return: ctypes.CDLL handle
+    """
+    global _libpostprocess
+    if _libpostprocess is None:
+        lib = ctypes.CDLL(path)
+        lib.ClassificationPostProcess.argtypes = [ctypes.POINTER(ClassificationPostProcessInfo_t)]
+        lib.ClassificationPostProcess.restype = ctypes.c_char_p
+        lib.FcosPostProcess.argtypes = [ctypes.POINTER(FcosPostProcessInfo_t)]
+        lib.FcosPostProcess.restype = ctypes.c_char_p
+        _libpostprocess = lib
+    return _libpostprocess
+
+
+def have_libpostprocess(path=LIBPOSTPROCESS_PATH):
+    """
+    :param path: location of the shared library on the board
+    :return: True when libpostprocess can be loaded
+    """
+    try:
+        load_libpostprocess(path)
+    except OSError:
+        return False
+    return True
+
+
+class ClassificationPostProcessContext:
+    """
+    Output tensor descriptors and post-process info for one classification model
+
+    Build it once after dnn.load(); run() then only rebinds the output buffers.
+    """
+
+    def __init__(self, model, height, width, score_threshold=0.3, nms_threshold=0, nms_top_k=500,
+                 is_pad_resize=0):
+        """
+        :param model: hobot_dnn Model, its output properties describe the tensors
+        :param height: model input height
+        :param width: model input width
+        :param score_threshold: minimum probability reported
+        :param nms_threshold: unused by classification, kept for the shared info struct
+        :param nms_top_k: number of classes reported
+        :param is_pad_resize: 1 when the input was letterboxed instead of stretched
+        """
+        self.lib = load_libpostprocess()
+        self.info = ClassificationPostProcessInfo_t()
+        self.info.height = height
+        self.info.width = width
+        self.info.score_threshold = score_threshold
+        self.info.nms_threshold = nms_threshold
+        self.info.nms_top_k = nms_top_k
+        self.info.is_pad_resize = is_pad_resize
+        self.info_ptr = ctypes.pointer(self.info)
+
+        self.output_tensors = (hbDNNTensor_t * len(model.outputs))()
+        self._scale_data = []  # keeps the arrays behind scaleData alive
+        for i, output in enumerate(model.outputs):
+            properties = self.output_tensors[i].properties
+            properties.tensorLayout = get_TensorLayout(output.properties.layout)
+            if len(output.properties.scale_data) == 0:
+                properties.quantiType = 0
+            else:
+                properties.quantiType = 2
+                scale_data = output.properties.scale_data
+                self._scale_data.append(scale_data)
+                properties.scale.scaleData = scale_data.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+            shape = output.properties.shape
+            properties.validShape.numDimensions = len(shape)
+            for j in range(len(shape)):
+                properties.validShape.dimensionSize[j] = shape[j]
+            # one image at a time, also for models compiled with batch > 1
+            properties.validShape.dimensionSize[0] = 1
+
+    def bind(self, outputs):
+        """
+        Point the descriptors at the buffers of one forward call
+
+        :param outputs: list returned by Model.forward, must stay alive until run() returns
+        """
+        for i in range(len(self.output_tensors)):
+            self.output_tensors[i].sysMem[0].virAddr = outputs[i].buffer.ctypes.data
+
+    def run(self, outputs, ori_height, ori_width):
+        """
+        Post-process the outputs of one forward call
+
+        :param outputs: list returned by Model.forward
+        :param ori_height: height of the original image
+        :param ori_width: width of the original image
+        :return: libpostprocess result string
+        """
+        self.info.ori_height = ori_height
+        self.info.ori_width = ori_width
+        self.bind(outputs)
+        for i in range(len(self.output_tensors)):
+            self.lib.ClassificationDoProcess(self.output_tensors[i], self.info_ptr, i)
+        return self.lib.ClassificationPostProcess(self.info_ptr).decode('utf-8')
+
+    def classify(self, outputs, ori_height, ori_width):
+        """
+        :param outputs: list returned by Model.forward
+        :param ori_height: height of the original image
+        :param ori_width: width of the original image
+        :return: structured array of CLASSIFICATION_DTYPE, most probable class first
+        """
+        return parse_classifications(self.run(outputs, ori_height, ori_width))
+
+    def classify_batch(self, outputs_list, shapes):
+        """
+        :param outputs_list: one forward result (list of tensors) per image
+        :param shapes: original image shape per image, (height, width, ...)
+        :return: list of structured arrays of CLASSIFICATION_DTYPE
+        """
+        return [self.classify(outputs, *shape[0:2]) for outputs, shape in zip(outputs_list, shapes)]
+
+
+class FcosPostProcessContext:
+    """
+    Output tensor descriptors and post-process info for the FCOS detection model
+
+    The 15 outputs are cls, bbox and centerness tensors for the five strides,
+    handed to FcosdoProcess one stride at a time.
+    """
+
+    def __init__(self, model, height, width, ori_height, ori_width, score_threshold=0.5, nms_threshold=0.6,
+                 nms_top_k=500, is_pad_resize=0, strides=(8, 16, 32, 64, 128)):
+        """
+        :param model: hobot_dnn Model of the FCOS network
+        :param height: model input height
+        :param width: model input width
+        :param ori_height: height of the image the boxes are reported in
+        :param ori_width: width of the image the boxes are reported in
+        :param score_threshold: minimum detection score
+        :param nms_threshold: IoU threshold of the NMS
+        :param nms_top_k: maximum number of candidates entering the NMS
+        :param is_pad_resize: 1 when the input was letterboxed instead of stretched
+        :param strides: feature map strides, one cls/bbox/centerness triple each
+        """
+        self.lib = load_libpostprocess()
+        self.levels = len(strides)
+        self.info = FcosPostProcessInfo_t()
+        self.info.height = height
+        self.info.width = width
+        self.info.ori_height = ori_height
+        self.info.ori_width = ori_width
+        self.info.score_threshold = score_threshold
+        self.info.nms_threshold = nms_threshold
+        self.info.nms_top_k = nms_top_k
+        self.info.is_pad_resize = is_pad_resize
+        self.info_ptr = ctypes.pointer(self.info)
+
+        self.output_tensors = (hbDNNTensor_t * len(model.outputs))()
+        self._scale_data = []  # keeps the arrays behind scaleData alive
+        for i, output in enumerate(model.outputs):
+            properties = self.output_tensors[i].properties
+            properties.tensorLayout = get_TensorLayout(output.properties.layout)
+            shape = output.properties.shape
+            if len(output.properties.scale_data) == 0:
+                properties.quantiType = 0
+            else:
+                properties.quantiType = 2
+                scale_data = output.properties.scale_data.reshape(1, 1, 1, shape[3])
+                self._scale_data.append(scale_data)
+                properties.scale.scaleData = scale_data.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+            for j in range(len(shape)):
+                properties.validShape.dimensionSize[j] = shape[j]
+                properties.alignedShape.dimensionSize[j] = shape[j]
+
+    def bind(self, outputs):
+        """
+        Point the descriptors at the buffers of one forward call
+
+        :param outputs: list returned by Model.forward, must stay alive until run() returns
+        """
+        for i in range(len(self.output_tensors)):
+            self.output_tensors[i].sysMem[0].virAddr = outputs[i].buffer.ctypes.data
+
+    def run(self, outputs):
+        """
+        Post-process the outputs of one forward call
+
+        :param outputs: list returned by Model.forward
+        :return: libpostprocess result string
+        """
+        self.bind(outputs)
+        tensors = self.output_tensors
+        for i in range(self.levels):
+            self.lib.FcosdoProcess(tensors[i], tensors[i + self.levels], tensors[i + 2 * self.levels],
+                                   self.info, i)
+        return self.lib.FcosPostProcess(self.info_ptr).decode('utf-8')
+
+    def detect(self, outputs):
+        """
+        :param outputs: list returned by Model.forward
+        :return: structured array of DETECTION_DTYPE
+        """
+        return parse_detections(self.run(outputs))
+
+
+class NumpyClassificationPostProcess:
+    """
+    NumPy replacement for ClassificationPostProcessContext when libpostprocess is absent
+
+    Dequantizes the single output tensor, applies softmax and reports the nms_top_k
+    most probable classes above score_threshold.
+    """
+
+    def __init__(self, model, height, width, score_threshold=0.3, nms_threshold=0, nms_top_k=500,
+                 is_pad_resize=0, class_names=None):
+        """
+        :param model: Model whose first output holds the class scores
+        :param height: model input height, unused
+        :param width: model input width, unused
+        :param score_threshold: minimum probability reported
+        :param nms_threshold: unused, kept for signature compatibility
+        :param nms_top_k: number of classes reported
+        :param is_pad_resize: unused, kept for signature compatibility
+        :param class_names: optional list of names indexed by class id
+        """
+        self.score_threshold = score_threshold
+        self.nms_top_k = nms_top_k
+        self.class_names = class_names
+        scale_data = model.outputs[0].properties.scale_data
+        self.scale = scale_data.reshape(-1) if len(scale_data) else None
+
+    def scores(self, output):
+        """
+        :param output: first output tensor of a forward call
+        :return: softmax probabilities, one per class
+        """
+        return self.batch_scores([output])[0]
+
+    def batch_scores(self, outputs):
+        """
+        :param outputs: first output tensor of several forward calls
+        :return: (images, classes) softmax probabilities, computed in one pass
+        """
+        logits = np.stack([output.buffer.reshape(-1) for output in outputs]).astype(np.float32)
+        if self.scale is not None:
+            logits *= self.scale
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def _results(self, probs, top):
+        top = top[probs[top] >= self.score_threshold]
+        results = np.empty(len(top), dtype=CLASSIFICATION_DTYPE)
+        results["label"] = top
+        results["prob"] = probs[top]
+        results["class_name"] = [self.class_names[label] for label in top] if self.class_names is not None \
+            else top.astype(str)
+        return results
+
+    def classify(self, outputs, ori_height, ori_width):
+        """
+        Post-process the outputs of one forward call
+
+        :param outputs: list returned by Model.forward
+        :param ori_height: height of the original image, unused
+        :param ori_width: width of the original image, unused
+        :return: structured array of CLASSIFICATION_DTYPE, most probable class first
+        """
+        return self.classify_batch([outputs], [(ori_height, ori_width)])[0]
+
+    def classify_batch(self, outputs_list, shapes):
+        """
+        Post-process several forward calls with one softmax and one top-k over all of them
+
+        :param outputs_list: one forward result (list of tensors) per image
+        :param shapes: original image shape per image, unused
+        :return: list of structured arrays of CLASSIFICATION_DTYPE, most probable class first
+        """
+        probs = self.batch_scores([outputs[0] for outputs in outputs_list])
+        k = min(self.nms_top_k, probs.shape[1])
+        top = np.argpartition(probs, -k, axis=1)[:, -k:]
+        order = np.argsort(np.take_along_axis(probs, top, axis=1), axis=1)[:, ::-1]
+        top = np.take_along_axis(top, order, axis=1)
+        return [self._results(row_probs, row_top) for row_probs, row_top in zip(probs, top)]
+
+    def run(self, outputs, ori_height, ori_width):
+        """
+        :param outputs: list returned by Model.forward
+        :param ori_height: height of the original image, unused
+        :param ori_width: width of the original image, unused
+        :return: result string formatted like libpostprocess ClassificationPostProcess
+        """
+        results = [{"prob": float(r["prob"]), "label": int(r["label"]), "class_name": str(r["class_name"])}
+                   for r in self.classify(outputs, ori_height, ori_width)]
+        return '"classification_result": ' + json.dumps(results)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+prefetch.py
+Pipelined image loader that keeps the BPU fed while the CPU decodes the next images
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+cv2.imread, cv2.resize and cv2.cvtColor release the GIL, so a small thread
+pool decodes JPEGs on the remaining A53 cores while the main thread waits on
+Model.forward. At most queue_depth images are in flight (backpressure) and
+they are handed out in the order of the input paths.
+"""
+
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.common.nv12 import NV12BufferPool, resize_bgr2nv12
+
+PrefetchedImage = collections.namedtuple("PrefetchedImage", ["path", "shape", "nv12"])
+
+
+class PrefetchLoader:
+    """
+    Iterate over image files as NV12 model inputs, decoded ahead of time
+
+    Each yielded NV12 buffer is recycled once the next image is requested, so
+    forward it (or copy it) before advancing the iterator.
+    """
+
+    def __init__(self, paths, height, width, workers=3, queue_depth=8, interpolation=cv2.INTER_AREA,
+                 metrics=None, cache=None):
+        """
+        :param paths: iterable of image file paths, consumed lazily
+        :param height: model input height
+        :param width: model input width
+        :param workers: decode threads, 3 leaves one X3 core for the forward loop
+        :param queue_depth: maximum number of images decoded ahead of the consumer
+        :param interpolation: OpenCV interpolation flag used for the resize
+        :param metrics: optional Metrics receiving a "preprocess" span per image
+        :param cache: optional NV12Cache; hits skip decoding and yield read-only memory-mapped inputs
+        """
+        self.paths = paths
+        self.height = height
+        self.width = width
+        self.workers = workers
+        self.queue_depth = max(1, queue_depth)
+        self.interpolation = interpolation
+        self.metrics = metrics
+        self.cache = cache
+        self.pool = NV12BufferPool(max_free=self.queue_depth + 1)
+        self.count = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self.wait_time = 0.0    # time the consumer spent blocked on decoding
+
+    def load(self, path):
+        """
+        Decode, resize and convert one image, runs on a worker thread
+
+        :param path: image file path
+        :return: PrefetchedImage, nv12 is None when the file cannot be decoded
+        """
+        t0 = time.perf_counter_ns()
+        key = None
+        if self.cache is not None:
+            try:
+                key = self.cache.key(path, self.height, self.width, self.interpolation)
+            except OSError:
+                return PrefetchedImage(path, None, None)
+            hit = self.cache.get(key)
+            if hit is not None:
+                self._record(t0)
+                return PrefetchedImage(path, hit[0], hit[1])
+        image = cv2.imread(path)
+        if image is None:
+            return PrefetchedImage(path, None, None)
+        nv12 = self.pool.acquire(self.height, self.width)
+        resize_bgr2nv12(image, self.height, self.width, out=nv12, interpolation=self.interpolation)
+        if key is not None:
+            self.cache.put(key, image.shape, nv12)
+        self._record(t0)
+        return PrefetchedImage(path, image.shape, nv12)
+
+    def _record(self, t0):
+        if self.metrics is not None:
+            self.metrics.record("preprocess", time.perf_counter_ns() - t0)
+
+    def __iter__(self):
+        for batch in self.batches(1):
+            yield batch[0]
+
+    def batches(self, batch_size):
+        """
+        Iterate over groups of images, e.g. for MicroBatcher
+
+        :param batch_size: images per group, the last group may be shorter
+        :return: lists of PrefetchedImage, their buffers are recycled when the next group is requested
+        """
+        self.pool.max_free = max(self.pool.max_free, self.queue_depth + batch_size)
+        pending = collections.deque()
+        paths = iter(self.paths)
+        batch = []
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch") as executor:
+            try:
+                for path in paths:
+                    pending.append(executor.submit(self.load, path))
+                    if len(pending) >= self.queue_depth:
+                        break
+                while pending:
+                    t_wait = time.perf_counter()
+                    item = pending.popleft().result()
+                    self.wait_time += time.perf_counter() - t_wait
+                    path = next(paths, None)
+                    if path is not None:
+                        pending.append(executor.submit(self.load, path))
+                    if item.nv12 is None:
+                        print(f"Skipping {item.path}: unable to decode")
+                        self.skipped += 1
+                        continue
+                    batch.append(item)
+                    self.count += 1
+                    if len(batch) == batch_size:
+                        yield batch
+                        self._release(batch)
+                        batch = []
+                if batch:
+                    yield batch
+                    self._release(batch)
+            finally:
+                for future in pending:
+                    future.cancel()
+                self.elapsed = time.perf_counter() - t0
+
+    def _release(self, batch):
+        for item in batch:
+            if not isinstance(item.nv12, np.memmap):   # cache hits are not pool buffers
+                self.pool.release(item.nv12)
+
+    def images_per_second(self):
+        """
+        :return: sustained throughput of the last (or current) iteration
+        """
+        elapsed = self.elapsed or 1e-9
+        return self.count / elapsed
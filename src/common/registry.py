@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+registry.py
+Classification models of the RDK X3 demo image and their post-processing defaults
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Models are referred to by registry name (resnet18) or by the path of a .bin
+file. A path whose file name starts with a registry name (e.g. a recompiled
+resnet18_224x224_nv12.bin elsewhere) keeps that entry's thresholds; any other
+path gets its input size from the file name and generic defaults.
+"""
+
+import collections
+import os
+
+from src.common.backend import standin_input_hw
+
+MODELS_DIR = "/app/pydev_demo/models"
+
+ModelSpec = collections.namedtuple("ModelSpec", ["name", "model_file", "height", "width", "layout", "nms_top_k",
+                                                 "score_threshold", "description"])
+
+CLASSIFICATION_MODELS = collections.OrderedDict((spec.name, spec) for spec in [
+    ModelSpec("resnet18", f"{MODELS_DIR}/resnet18_224x224_nv12.bin", 224, 224, "NCHW", 500, 0.3,
+              "Residual Neural Network"),
+    ModelSpec("efficientnet_lite4", f"{MODELS_DIR}/efficientnet_lite4_300x300_nv12.bin", 300, 300, "NCHW", 500, 0.3,
+              "EfficientNet Lite 4"),
+    ModelSpec("efficientnasnet_m", f"{MODELS_DIR}/efficientnasnet_m_300x300_nv12.bin", 300, 300, "NCHW", 1, 0.3,
+              "EfficientNet-m"),
+    ModelSpec("vargconvnet", f"{MODELS_DIR}/vargconvnet_224x224_nv12.bin", 224, 224, "NCHW", 1, 0.3,
+              "VargoConvNet"),
+])
+
+
+def classification_spec(model):
+    """
+    :param model: registry name or path of a .bin model file
+    :return: ModelSpec
+    :raises KeyError: for a name that is neither registered nor a .bin path
+    """
+    if model in CLASSIFICATION_MODELS:
+        return CLASSIFICATION_MODELS[model]
+    if not model.endswith(".bin"):
+        raise KeyError(f"Unknown model {model}, expected a .bin file or one of {list(CLASSIFICATION_MODELS)}")
+    name = os.path.splitext(os.path.basename(model))[0]
+    for spec in CLASSIFICATION_MODELS.values():
+        if name.startswith(spec.name):
+            return spec._replace(model_file=model)
+    height, width = standin_input_hw(name)
+    return ModelSpec(name, model, height, width, "NCHW", 5, 0.3, name)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+results.py
+Structured-array result types for detection and classification, and the
+parsers of the libpostprocess result strings
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Results are NumPy structured arrays, one record per detection or class, so
+result["bbox"], result["score"] and result["id"] are whole-column arrays for
+vectorized use while `for r in results: r['score']` keeps working like the
+old list of dicts.
+
+libpostprocess returns a short prefix followed by a JSON list such as
+    [{"bbox": [x1, y1, x2, y2], "score": 0.9, "name": "person", "id": 0}, ...]
+The parsers below hand the list to json.loads and build the structured array
+from one tuple per object, so the fields of a record always come from the
+same object whatever their order in the string. They do not depend on the
+length of the prefix. class_name is a Python object field, so names of any
+length from the label file come through whole.
+"""
+
+import json
+
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([("bbox", np.float32, (4,)), ("score", np.float32), ("id", np.int32)])
+
+CLASSIFICATION_DTYPE = np.dtype([("label", np.int32), ("prob", np.float32), ("class_name", object)])
+
+
+def empty_detections():
+    """
+    :return: structured array of DETECTION_DTYPE with no records
+    """
+    return np.zeros(0, dtype=DETECTION_DTYPE)
+
+
+def _objects(result_str):
+    """
+    :param result_str: decoded result string, prefix included
+    :return: list of dicts of the JSON list after the prefix
+    """
+    start = result_str.find("[")
+    return json.loads(result_str[start:]) if start >= 0 else []
+
+
+def parse_detections(result_str):
+    """
+    Parse a libpostprocess FcosPostProcess result string
+
+    :param result_str: decoded result string, prefix included
+    :return: structured array of DETECTION_DTYPE
+    """
+    objects = _objects(result_str)
+    if not objects:
+        return empty_detections()
+    return np.array([(o["bbox"], o["score"], o["id"]) for o in objects], dtype=DETECTION_DTYPE)
+
+
+def parse_classifications(result_str):
+    """
+    Parse a libpostprocess ClassificationPostProcess result string
+
+    :param result_str: decoded result string, prefix included
+    :return: structured array of CLASSIFICATION_DTYPE
+    """
+    objects = _objects(result_str)
+    if not objects:
+        return np.zeros(0, dtype=CLASSIFICATION_DTYPE)
+    return np.array([(o["label"], o["prob"], o["class_name"]) for o in objects], dtype=CLASSIFICATION_DTYPE)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ring_buffer.py
+Bounded hand-over buffer between two threads with a choice of what to drop
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Pipeline's queues always block a producer that runs ahead, which is right
+for a file where every frame matters. A live source cannot wait: with
+"drop-oldest" a full buffer discards its oldest item so the consumer always
+gets the most recent frames, with "drop-newest" the arriving item is
+discarded instead. "block" keeps the Pipeline behaviour.
+"""
+
+import collections
+import threading
+import time
+
+POLICIES = ("block", "drop-oldest", "drop-newest")
+
+
+class RingBuffer:
+    """
+    put() / get() of a bounded FIFO; close() ends the stream after the buffered items
+    """
+
+    def __init__(self, capacity, policy="block"):
+        """
+        :param capacity: items held at most
+        :param policy: one of POLICIES, what happens when an item arrives at a full buffer
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown drop policy {policy}, expected one of {', '.join(POLICIES)}")
+        self.capacity = capacity
+        self.policy = policy
+        self.put_count = 0
+        self.dropped = 0
+        self.closed = False
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """
+        :param item: anything but None
+        :return: False when the item was dropped or the buffer is closed
+        """
+        with self._cond:
+            while self.policy == "block" and len(self._items) >= self.capacity and not self.closed:
+                self._cond.wait()
+            if self.closed:
+                return False
+            self.put_count += 1
+            if len(self._items) >= self.capacity:
+                self.dropped += 1
+                if self.policy == "drop-newest":
+                    return False
+                self._items.popleft()
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        :param timeout: seconds to wait, None waits until an item or close()
+        :return: oldest buffered item, or None when the buffer is closed and empty or the timeout expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if self.closed:
+                    return None
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return None
+                self._cond.wait(wait)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """No more items; get() returns the buffered ones, then None, and put() refuses new ones"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
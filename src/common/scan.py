@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scan.py
+Deterministic recursive image listing with resumable progress and process sharding
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+scan_images() reads every directory once with os.scandir, whose entries
+already know whether they are files or directories, and filters all
+extensions in that single pass; one glob per extension rereads the directory
+each time. Entries are visited in name order, depth first, so the same tree
+always gives the same list: the basis for resuming and for sharding.
+
+Checkpoint records how many paths of that order were finished and the last
+one, and rewrites its small JSON file atomically every so often; a killed
+run over 100k images restarts right after the last checkpoint. A finished
+run is marked complete, and running it again processes nothing unless the
+checkpoint is opened with restart=True. shard() splits
+the list round-robin so N processes can each take every N-th image.
+"""
+
+import itertools
+import json
+import os
+import time
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp")
+
+
+def scan_images(root, extensions=IMAGE_EXTENSIONS, recursive=True):
+    """
+    :param root: folder to scan
+    :param extensions: lower case file name endings accepted
+    :param recursive: descend into sub-folders (symbolic links to folders are not followed)
+    :return: generator of image paths, sorted by name within each folder, depth first
+    """
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from scan_images(entry.path, extensions, recursive)
+        elif entry.name.lower().endswith(extensions):
+            yield entry.path
+
+
+def parse_shard(text):
+    """
+    :param text: "index/count", e.g. "0/4"
+    :return: (index, count)
+    :raises ValueError: when the text is malformed or index is out of range
+    """
+    index, count = (int(v) for v in text.split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard {text}: expected index/count with 0 <= index < count")
+    return index, count
+
+
+def shard(paths, index, count):
+    """
+    :param paths: iterable of paths in a deterministic order
+    :param index: shard of this process, 0 based
+    :param count: number of shards
+    :return: iterator over every count-th path starting at index
+    """
+    return itertools.islice(paths, index, None, count)
+
+
+class Checkpoint:
+    """
+    Progress through a deterministic list of paths, kept in a JSON file
+    """
+
+    def __init__(self, path, every=100, seconds=30.0, restart=False):
+        """
+        :param path: checkpoint file, read when it exists
+        :param every: save after this many finished paths
+        :param seconds: save when this much time passed since the last save
+        :param restart: ignore the file and start from the first path
+        """
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.done = 0
+        self.last = None
+        self.complete = False
+        if os.path.exists(path) and not restart:
+            with open(path) as f:
+                state = json.load(f)
+            self.done = state.get("done", 0)
+            self.last = state.get("last")
+            self.complete = state.get("complete", False)
+        self._saved = time.monotonic()
+        self._unsaved = 0
+
+    def resume(self, paths):
+        """
+        Skip the paths finished by a previous run
+
+        :param paths: the same deterministic iterable as in the previous run
+        :return: iterator over the remaining paths, none when the previous run was complete
+        """
+        if self.complete:
+            print(f"{self.path}: already complete after {self.done} images, nothing to do; restart to run again")
+            return iter(())
+        if self.done == 0:
+            return iter(paths)
+        paths = list(paths)
+        if self.done <= len(paths) and paths[self.done - 1] == self.last:
+            print(f"{self.path}: resuming after {self.done} finished images")
+            return iter(paths[self.done:])
+        # the tree changed since: look for the last finished path instead of trusting the count
+        try:
+            start = paths.index(self.last) + 1
+        except ValueError:
+            print(f"{self.path}: {self.last} no longer listed, starting over")
+            self.done = 0
+            return iter(paths)
+        print(f"{self.path}: resuming after {self.last}")
+        self.done = start
+        return iter(paths[start:])
+
+    def mark(self, path):
+        """
+        :param path: path just finished, in list order
+        """
+        self.done += 1
+        self.last = path
+        self._unsaved += 1
+        if self._unsaved >= self.every or time.monotonic() - self._saved >= self.seconds:
+            self.save()
+
+    def save(self, complete=False):
+        """
+        :param complete: the whole list was processed
+        """
+        self.complete = complete
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": self.done, "last": self.last, "complete": complete}, f)
+        os.replace(tmp, self.path)
+        self._saved = time.monotonic()
+        self._unsaved = 0
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shard.py
+Image folders packed into one file of fixed-size NV12 records
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Evaluating a model over a folder on the X3's SD card means a directory
+listing and thousands of small random reads before any decoding starts. A
+shard holds the same images already resized and converted at one model
+resolution, back to back:
+
+    <name>.nv12   record i at offset i * record_bytes, record_bytes = nv12_size(height, width)
+    <name>.json   height, width, interpolation, record_bytes, count and per record the
+                  source path and original image shape
+
+ShardReader maps the records with np.memmap and hands out views, no copy,
+while asking the kernel to read the next few megabytes ahead
+(POSIX_FADV_WILLNEED), so the evaluation streams the file sequentially.
+"""
+
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from src.common.nv12 import nv12_size
+from src.common.prefetch import PrefetchedImage, PrefetchLoader
+
+SHARD_VERSION = 1
+
+
+def shard_paths(path):
+    """
+    :param path: shard name with or without the .nv12 / .json extension
+    :return: (data file, index file)
+    """
+    base, ext = os.path.splitext(path)
+    if ext not in (".nv12", ".json"):
+        base = path
+    return base + ".nv12", base + ".json"
+
+
+def is_shard(path):
+    """
+    :param path: folder or shard path
+    :return: True when path names an existing shard index
+    """
+    return os.path.isfile(shard_paths(path)[1])
+
+
+def pack_images(paths, shard, height, width, interpolation=cv2.INTER_AREA, workers=3, queue_depth=8):
+    """
+    Decode, resize and convert images into a shard
+
+    :param paths: image files in the order the records are written
+    :param shard: shard name, see shard_paths()
+    :param height: model input height
+    :param width: model input width
+    :param interpolation: OpenCV interpolation flag of the resize
+    :param workers: decode threads
+    :param queue_depth: images decoded ahead of the writer
+    :return: the PrefetchLoader, for its counts and timing
+    """
+    data_path, index_path = shard_paths(shard)
+    loader = PrefetchLoader(paths, height, width, workers=workers, queue_depth=queue_depth,
+                            interpolation=interpolation)
+    records = []
+    with open(data_path + ".tmp", "wb") as f:
+        for path, shape, nv12 in loader:
+            f.write(nv12)
+            records.append({"path": path, "shape": list(shape)})
+    index = {"version": SHARD_VERSION, "height": height, "width": width, "interpolation": int(interpolation),
+             "record_bytes": nv12_size(height, width), "count": len(records), "records": records}
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+    return loader
+
+
+class ShardReader:
+    """
+    Iterates over a shard like PrefetchLoader over a folder
+    """
+
+    def __init__(self, shard, readahead_bytes=8 << 20):
+        """
+        :param shard: shard name, see shard_paths()
+        :param readahead_bytes: size of the window requested ahead of the current record
+        """
+        self.data_path, self.index_path = shard_paths(shard)
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index.get("version") != SHARD_VERSION:
+            raise ValueError(f"{self.index_path}: unsupported shard version {index.get('version')}")
+        self.height = index["height"]
+        self.width = index["width"]
+        self.interpolation = index["interpolation"]
+        self.record_bytes = index["record_bytes"]
+        self.records = index["records"]
+        expected = self.record_bytes * len(self.records)
+        if os.path.getsize(self.data_path) != expected:
+            raise ValueError(f"{self.data_path}: expected {expected} bytes for {len(self.records)} records")
+        self.data = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=(len(self.records), self.record_bytes)) \
+            if self.records else np.zeros((0, self.record_bytes), dtype=np.uint8)
+        self.readahead_bytes = max(readahead_bytes, self.record_bytes)
+        self.count = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self.wait_time = 0.0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for batch in self.batches(1):
+            yield batch[0]
+
+    def batches(self, batch_size):
+        """
+        :param batch_size: records per group, the last group may be shorter
+        :return: lists of PrefetchedImage whose nv12 are read-only views into the shard
+        """
+        advise = getattr(os, "posix_fadvise", None)
+        fd = os.open(self.data_path, os.O_RDONLY)
+        t0 = time.perf_counter()
+        try:
+            if advise is not None:
+                advise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            requested = 0
+            for start in range(0, len(self.records), batch_size):
+                stop = min(start + batch_size, len(self.records))
+                while advise is not None and stop * self.record_bytes + self.readahead_bytes // 2 > requested:
+                    advise(fd, requested, self.readahead_bytes, os.POSIX_FADV_WILLNEED)
+                    requested += self.readahead_bytes
+                batch = [PrefetchedImage(self.records[i]["path"], tuple(self.records[i]["shape"]), self.data[i])
+                         for i in range(start, stop)]
+                self.count += len(batch)
+                yield batch
+        finally:
+            os.close(fd)
+            self.elapsed = time.perf_counter() - t0
+
+    def images_per_second(self):
+        """
+        :return: sustained throughput of the last (or current) iteration
+        """
+        elapsed = self.elapsed or 1e-9
+        return self.count / elapsed
@@ -29,24 +29,13 @@ Adapted from DF Robot RDK X3 documentation
 """
 
 import argparse
-from hobot_dnn import pyeasy_dnn
 import numpy as np
 import cv2
 from PIL import Image
 from matplotlib import pyplot as plt
 
-def bgr2nv12_opencv(image):
-    height, width = image.shape[0], image.shape[1]
-    area = height * width
-    yuv420p = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).reshape((area * 3 // 2,))
-    y = yuv420p[:area]
-    uv_planar = yuv420p[area:].reshape((2, area // 4))
-    uv_packed = uv_planar.transpose((1, 0)).reshape((area // 2,))
-
-    nv12 = np.zeros_like(yuv420p)
-    nv12[:height * width] = y
-    nv12[height * width:] = uv_packed
-    return nv12
+from src.common.backend import BACKENDS, load_models
+from src.common.nv12 import resize_bgr2nv12
 
 def get_hw(pro):
     if pro.layout == "NCHW":
@@ -150,17 +139,17 @@ if __name__ == '__main__':
                         default="/home/sunrise/PycharmProjects/d-robotics/src/segmentation/segmentation.png")
     parser.add_argument("model_file", type=str, help="Path to the model file, i.e. EfficientNet-m",
                         default="/app/pydev_demo/models/mobilenet_unet_1024x2048_nv12.bin")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="hobot for the BPU, standin for the NumPy stand-in used off-board")
     args = parser.parse_args()
     image_file = args.image_file
     model_file = args.model_file
     # test classification result
-    models = pyeasy_dnn.load(model_file)
+    models = load_models(model_file, args.backend)
     print("=" * 10, "Model load successfully.", "=" * 10)
     h, w = get_hw(models[0].inputs[0].properties)
     img_file = cv2.imread(image_file)
-    des_dim = (w, h)
-    resized_data = cv2.resize(img_file, des_dim, interpolation=cv2.INTER_AREA)
-    nv12_data = bgr2nv12_opencv(resized_data)
+    nv12_data = resize_bgr2nv12(img_file, h, w)
     outputs = models[0].forward(nv12_data)
     print("=" * 10, "Model forward finished.", "=" * 10)
     postprocess(outputs[0].buffer, img_file)
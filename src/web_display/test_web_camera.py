@@ -32,109 +32,29 @@ import argparse
 import sys, os
 import signal
 import numpy as np
-import cv2
 import google.protobuf
 import asyncio
 import websockets
 import x3_pb2
-import time
 import subprocess
 
 # Camera API libs
 from hobot_vio import libsrcampy as srcampy
 from hobot_dnn import pyeasy_dnn
 
-fps = 30
+from src.common.backend import fcos_postprocess, snapshot_outputs
+from src.common.broadcast import BroadcastHub
+from src.common.camera import FrameGrabber
+from src.common.framing import FrameSerializer
+from src.common.metrics import Metrics
+from src.common.motion import MotionGate
+from src.common.pipeline import Pipeline
 
-import ctypes
-import json
+fps = 30
+metrics = Metrics()
 
 image_counter = None
 
-output_tensors = None
-
-fcos_postprocess_info = None
-
-
-class hbSysMem_t(ctypes.Structure):
-    _fields_ = [
-        ("phyAddr", ctypes.c_double),
-        ("virAddr", ctypes.c_void_p),
-        ("memSize", ctypes.c_int)
-    ]
-
-
-class hbDNNQuantiShift_yt(ctypes.Structure):
-    _fields_ = [
-        ("shiftLen", ctypes.c_int),
-        ("shiftData", ctypes.c_char_p)
-    ]
-
-
-class hbDNNQuantiScale_t(ctypes.Structure):
-    _fields_ = [
-        ("scaleLen", ctypes.c_int),
-        ("scaleData", ctypes.POINTER(ctypes.c_float)),
-        ("zeroPointLen", ctypes.c_int),
-        ("zeroPointData", ctypes.c_char_p)
-    ]
-
-
-class hbDNNTensorShape_t(ctypes.Structure):
-    _fields_ = [
-        ("dimensionSize", ctypes.c_int * 8),
-        ("numDimensions", ctypes.c_int)
-    ]
-
-
-class hbDNNTensorProperties_t(ctypes.Structure):
-    _fields_ = [
-        ("validShape", hbDNNTensorShape_t),
-        ("alignedShape", hbDNNTensorShape_t),
-        ("tensorLayout", ctypes.c_int),
-        ("tensorType", ctypes.c_int),
-        ("shift", hbDNNQuantiShift_yt),
-        ("scale", hbDNNQuantiScale_t),
-        ("quantiType", ctypes.c_int),
-        ("quantizeAxis", ctypes.c_int),
-        ("alignedByteSize", ctypes.c_int),
-        ("stride", ctypes.c_int * 8)
-    ]
-
-
-class hbDNNTensor_t(ctypes.Structure):
-    _fields_ = [
-        ("sysMem", hbSysMem_t * 4),
-        ("properties", hbDNNTensorProperties_t)
-    ]
-
-
-class FcosPostProcessInfo_t(ctypes.Structure):
-    _fields_ = [
-        ("height", ctypes.c_int),
-        ("width", ctypes.c_int),
-        ("ori_height", ctypes.c_int),
-        ("ori_width", ctypes.c_int),
-        ("score_threshold", ctypes.c_float),
-        ("nms_threshold", ctypes.c_float),
-        ("nms_top_k", ctypes.c_int),
-        ("is_pad_resize", ctypes.c_int)
-    ]
-
-
-libpostprocess = ctypes.CDLL('/usr/lib/libpostprocess.so')
-
-get_Postprocess_result = libpostprocess.FcosPostProcess
-get_Postprocess_result.argtypes = [ctypes.POINTER(FcosPostProcessInfo_t)]
-get_Postprocess_result.restype = ctypes.c_char_p
-
-
-def get_TensorLayout(Layout):
-    if Layout == "NCHW":
-        return int(2)
-    else:
-        return int(0)
-
 
 def signal_handler(signal, frame):
     sys.exit(0)
@@ -171,27 +91,6 @@ def get_classes():
                      "hair drier", "toothbrush"])
 
 
-def bgr2nv12_opencv(image):
-    height, width = image.shape[0], image.shape[1]
-    area = height * width
-    yuv420p = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).reshape((area * 3 // 2,))
-    y = yuv420p[:area]
-    uv_planar = yuv420p[area:].reshape((2, area // 4))
-    uv_packed = uv_planar.transpose((1, 0)).reshape((area // 2,))
-
-    nv12 = np.zeros_like(yuv420p)
-    nv12[:height * width] = y
-    nv12[height * width:] = uv_packed
-    return nv12
-
-
-def get_hw(pro):
-    if pro.layout == "NCHW":
-        return pro.shape[2], pro.shape[3]
-    else:
-        return pro.shape[1], pro.shape[2]
-
-
 def print_properties(pro):
     print("tensor type:", pro.tensor_type)
     print("data type:", pro.dtype)
@@ -199,48 +98,12 @@ def print_properties(pro):
     print("shape:", pro.shape)
 
 
-def limit_display_cord(coor):
-    coor[0] = max(min(1920, coor[0]), 0)
-    # min coor is set to 2 not 0, leaving room for string display
-    coor[1] = max(min(1080, coor[1]), 2)
-    coor[2] = max(min(1920, coor[2]), 0)
-    coor[3] = max(min(1080, coor[3]), 0)
-    return coor
-
-
-def serialize(FrameMessage, data):
-    if data:
-        for result in data:
-            # get class name
-            Target = x3_pb2.Target()
-            bbox = result['bbox']  # 矩形框位置信息
-            score = result['score']  # 得分
-            id = int(result['id'])  # id
-            name = result['name']  # 类别名称
-
-            # print(f"bbox: {bbox}, score: {score}, id: {id}, name: {name}")
-            bbox = limit_display_cord(bbox)
-            Target.type_ = classes[id]
-            Box = x3_pb2.Box()
-            Box.type_ = classes[id]
-            Box.score_ = float(score)
-
-            Box.top_left_.x_ = int(bbox[0])
-            Box.top_left_.y_ = int(bbox[1])
-            Box.bottom_right_.x_ = int(bbox[2])
-            Box.bottom_right_.y_ = int(bbox[3])
-
-            Target.boxes_.append(Box)
-            FrameMessage.smart_msg_.targets_.append(Target)
-
-    prot_buf = FrameMessage.SerializeToString()
-    return prot_buf
-
-
 models = pyeasy_dnn.load('/app/pydev_demo//models/fcos_512x512_nv12.bin')
 input_shape = (512, 512)
 cam = srcampy.Camera()
+# the IPU scales the model input as a second output, the CPU does not resize frames
 cam.open_cam(0, -1, fps, [512, 1920], [512, 1080])
+grabber = FrameGrabber(cam, (512, 512), (1920, 1080))
 enc = srcampy.Encoder()
 enc.encode(0, 3, 1920, 1080)
 classes = get_classes()
@@ -251,94 +114,139 @@ print("--- model output properties ---")
 for output in models[0].outputs:
     print_properties(output.properties)
 
-# 获取结构体信息
-fcos_postprocess_info = FcosPostProcessInfo_t()
-fcos_postprocess_info.height = 512
-fcos_postprocess_info.width = 512
-fcos_postprocess_info.ori_height = 1080
-fcos_postprocess_info.ori_width = 1920
-fcos_postprocess_info.score_threshold = 0.5
-fcos_postprocess_info.nms_threshold = 0.6
-fcos_postprocess_info.nms_top_k = 500
-fcos_postprocess_info.is_pad_resize = 0
-
-output_tensors = (hbDNNTensor_t * len(models[0].outputs))()
-
-for i in range(len(models[0].outputs)):
-    output_tensors[i].properties.tensorLayout = get_TensorLayout(models[0].outputs[i].properties.layout)
-    # print(output_tensors[i].properties.tensorLayout)
-    if (len(models[0].outputs[i].properties.scale_data) == 0):
-        output_tensors[i].properties.quantiType = 0
-    else:
-        output_tensors[i].properties.quantiType = 2
-
-        scale_data_tmp = models[0].outputs[i].properties.scale_data.reshape(1, 1, 1,
-                                                                            models[0].outputs[i].properties.shape[3])
-        output_tensors[i].properties.scale.scaleData = scale_data_tmp.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-    for j in range(len(models[0].outputs[i].properties.shape)):
-        output_tensors[i].properties.validShape.dimensionSize[j] = models[0].outputs[i].properties.shape[j]
-        output_tensors[i].properties.alignedShape.dimensionSize[j] = models[0].outputs[i].properties.shape[j]
+# libpostprocess when available, the NumPy decoder otherwise
+postprocess = fcos_postprocess(models[0], 512, 512, 1080, 1920, score_threshold=0.5, nms_threshold=0.6,
+                               nms_top_k=500)
+# one reusable FrameMessage builder, the JPEG is sent without being copied into it
+serializer = FrameSerializer(x3_pb2, classes, 1920, 1080)
+# frames of a static scene skip the BPU and keep the last detections
+gate = MotionGate(512, 512)
+last_detections = None
+
+
+class FrameJob:
+    """One camera frame on its way through the pipeline"""
+
+    def __init__(self, frame):
+        self.frame_id = frame.frame_id
+        self.timestamp = frame.timestamp
+        self.nv12 = frame.nv12          # 512x512 model input
+        self.display = frame.display    # 1920x1080 frame sent to the browser
+        self.outputs = None
+        self.detections = None
+        self.reused = False             # the scene did not change, detections of an earlier frame
+
+
+def capture():
+    hub.pace()
+    with metrics.span("capture"):
+        frame = grabber.grab()
+        while frame is None:    # no frame ready yet
+            frame = grabber.grab()
+    return FrameJob(frame)
+
+
+def forward(job):
+    with metrics.span("motion"):
+        job.reused = not gate.check(job.nv12)
+    if not job.reused:
+        # the runtime reuses its output memory for the next frame
+        with metrics.span("forward"):
+            job.outputs = snapshot_outputs(models[0].forward(job.nv12))
+    grabber.release(job.nv12)
+    job.nv12 = None
+    return job
+
+
+def detect(job):
+    global last_detections
+    if not job.reused:
+        with metrics.span("postprocess"):
+            last_detections = postprocess.detect(job.outputs)
+    job.detections = last_detections
+    job.outputs = None
+    return job
+
+
+def encode(job):
+    with metrics.span("encode"):
+        enc.encode_file(job.display)
+        jpeg = enc.get_img()
+
+    # (message head, JPEG) chunks, sent as one fragmented WebSocket message
+    with metrics.span("serialize"):
+        return serializer.serialize(job.detections, jpeg, int(job.timestamp))
+
+
+# capture, BPU forward, post-process and JPEG encode each run on their own thread,
+# the asyncio loop only sends the serialized frames
+pipeline = Pipeline(capture, [("forward", forward), ("postprocess", detect), ("encode", encode)],
+                    queue_size=2, name="camera")
+pipeline.pause()    # until the first client connects
+
+
+# every frame is computed once and sent to all connected clients; the camera is paced
+# to the fastest client and slower clients only ever get the newest frame
+hub = BroadcastHub(pipeline.get, min_interval=1.0 / fps, max_in_flight=1)
+
+
+def hub_done(task):
+    """
+    Stop the server once the hub has ended, reporting why if a stage failed
+
+    :param task: asyncio task running hub.run()
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"camera stream failed: {task.exception()!r}", file=sys.stderr)
+    task.get_loop().stop()
 
 
 async def web_service(websocket, path):
-    while True:
-        FrameMessage = x3_pb2.FrameMessage()
-        FrameMessage.img_.height_ = 1080
-        FrameMessage.img_.width_ = 1920
-        FrameMessage.img_.type_ = "JPEG"
-
-        img = cam.get_img(2, 512, 512)
-        img = np.frombuffer(img, dtype=np.uint8)
-        t0 = time.time()
-        outputs = models[0].forward(img)
-        t1 = time.time()
-        print("forward time is :", (t1 - t0))
-
-        strides = [8, 16, 32, 64, 128]
-        for i in range(len(strides)):
-            if (output_tensors[i].properties.quantiType == 0):
-                output_tensors[i].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-                output_tensors[i + 5].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i + 5].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-                output_tensors[i + 10].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i + 10].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_float)), ctypes.c_void_p)
-            else:
-                output_tensors[i].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
-                output_tensors[i + 5].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i + 5].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
-                output_tensors[i + 10].sysMem[0].virAddr = ctypes.cast(
-                    outputs[i + 10].buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int32)), ctypes.c_void_p)
-
-            libpostprocess.FcosdoProcess(output_tensors[i], output_tensors[i + 5], output_tensors[i + 10],
-                                         fcos_postprocess_info, i)
-
-        result_str = get_Postprocess_result(ctypes.pointer(fcos_postprocess_info))
-        result_str = result_str.decode('utf-8')
-        t2 = time.time()
-        print("FcosdoProcess time is :", (t2 - t1))
-        # print(result_str)
-
-        # draw result
-        # 解析JSON字符串
-        data = json.loads(result_str[14:])
-
-        origin_image = cam.get_img(2, 1920, 1080)
-        enc.encode_file(origin_image)
-        FrameMessage.img_.buf_ = enc.get_img()
-        FrameMessage.smart_msg_.timestamp_ = int(time.time())
-
-        prot_buf = serialize(FrameMessage, data)
-
-        await websocket.send(prot_buf)
-
-    cam.close_cam()
+    async def send(prot_buf):
+        with metrics.span("send"):
+            await websocket.send(prot_buf)
+
+    subscriber = hub.subscribe()
+    if len(hub.subscribers) == 1:
+        pipeline.resume()   # frames queued before the pause are dropped, the client starts with a live one
+    try:
+        await subscriber.serve(send)
+    finally:
+        hub.unsubscribe(subscriber)
+        if not hub.subscribers:
+            pipeline.pause()
+        print(f"client {websocket.remote_address} left: {subscriber.delivered} frames sent, "
+              f"{subscriber.dropped} stale frames skipped, {subscriber.send_time * 1000:.1f} ms per send, "
+              f"camera now at {1.0 / hub.interval:.1f} fps")
 
 
 if __name__ == '__main__':
-    signal.signal(signal.SIGINT, signal_handler)
-    start_server = websockets.serve(web_service, "0.0.0.0", 8080)
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+    parser = argparse.ArgumentParser(description="Stream FCOS detections from the camera over WebSocket")
+    parser.add_argument("--metrics-port", type=int, default=9100,
+                        help="Port of the Prometheus /metrics endpoint, 0 to disable")
+    parser.add_argument("--metrics-csv", type=str, default=None, help="Write per-stage latencies to this CSV at exit")
+    parser.add_argument("--motion-threshold", type=float, default=0.005,
+                        help="Fraction of changed pixels that runs the detector, 0 runs it on every frame")
+    parser.add_argument("--refresh-seconds", type=float, default=2.0,
+                        help="Run the detector at least this often on a static scene")
+    args = parser.parse_args()
+    gate.threshold = args.motion_threshold
+    gate.refresh_seconds = args.refresh_seconds
 
+    signal.signal(signal.SIGINT, signal_handler)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    pipeline.start()
+    try:
+        start_server = websockets.serve(web_service, "0.0.0.0", 8080)
+        asyncio.get_event_loop().run_until_complete(start_server)
+        asyncio.get_event_loop().create_task(hub.run()).add_done_callback(hub_done)
+        asyncio.get_event_loop().run_forever()
+    finally:
+        pipeline.stop()
+        cam.close_cam()
+        print(metrics.report())
+        print(f"motion gate: {gate.passed} of {gate.frames} frames detected, {gate.skipped_ratio():.0%} skipped")
+        if args.metrics_csv:
+            metrics.write_csv(args.metrics_csv)
+        metrics.close()
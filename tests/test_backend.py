@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_backend.py
+The CPU stand-in of hobot_dnn behind load_models()
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from src.common.backend import StandInModel, classification_postprocess, load_models, snapshot_outputs
+from src.common.nv12 import nv12_size
+
+
+def test_geometry_comes_from_the_file_name():
+    model = load_models("/nowhere/efficientnet_lite4_300x300_nv12.bin", backend="standin")[0]
+    assert isinstance(model, StandInModel)
+    assert model.inputs[0].properties.shape == (1, 3, 300, 300)
+    assert model.inputs[0].properties.layout == "NCHW"
+    assert load_models("mystery.bin", backend="standin")[0].inputs[0].properties.shape == (1, 3, 224, 224)
+
+
+def test_output_layouts_follow_the_model_kind():
+    classifier = load_models("resnet18_224x224_nv12.bin", backend="standin")[0]
+    assert [o.properties.shape for o in classifier.outputs] == [(1, 1000, 1, 1)]
+    fcos = load_models("fcos_512x512_nv12.bin", backend="standin")[0]
+    assert len(fcos.outputs) == 15
+    assert fcos.outputs[0].properties.shape == (1, 64, 64, 80)
+    assert all(o.properties.layout == "NHWC" for o in fcos.outputs)
+
+
+def test_forward_is_deterministic_and_shares_buffers_like_the_bpu():
+    model = load_models("resnet18_224x224_nv12.bin", backend="standin")[0]
+    nv12 = np.random.default_rng(0).integers(0, 256, nv12_size(224, 224), dtype=np.uint8)
+    first, second = model.forward(nv12), model.forward(nv12)
+    assert first[0].buffer is second[0].buffer
+    copied = snapshot_outputs(first)
+    assert copied[0].buffer is not first[0].buffer
+    assert np.array_equal(copied[0].buffer, first[0].buffer)
+    assert copied[0].properties is first[0].properties
+
+
+def test_forward_rejects_an_input_of_the_wrong_size():
+    model = load_models("resnet18_224x224_nv12.bin", backend="standin")[0]
+    with pytest.raises(ValueError):
+        model.forward(np.zeros(nv12_size(300, 300), dtype=np.uint8))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        load_models("resnet18_224x224_nv12.bin", backend="tpu")
+
+
+def test_standin_classification_has_one_clear_winner():
+    model = load_models("resnet18_224x224_nv12.bin", backend="standin")[0]
+    postprocess = classification_postprocess(model, 224, 224, score_threshold=0.3, nms_top_k=5)
+    results = postprocess.classify(model.forward(np.zeros(nv12_size(224, 224), dtype=np.uint8)), 480, 640)
+    assert len(results) == 1
+    assert results[0]["prob"] > 0.3
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_batching.py
+Grouping images per forward() for batch 1 and batch N models
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+
+from src.common.backend import StandInTensor, StandInTensorProperties, load_models
+from src.common.batching import MicroBatcher
+from src.common.nv12 import nv12_size
+
+
+class PackedModel:
+    """A batch N model answering each image with the mean of its bytes"""
+
+    name = "packed"
+
+    def __init__(self, batch, height, width):
+        self.inputs = [StandInTensor("input", StandInTensorProperties((batch, 3, height, width)))]
+        self.output = StandInTensor("mean", StandInTensorProperties((batch, 1, 1, 1)),
+                                    np.zeros((batch, 1, 1, 1), dtype=np.float32))
+        self.image_bytes = nv12_size(height, width)
+        self.calls = 0
+
+    def forward(self, packed):
+        self.calls += 1
+        self.output.buffer[:, 0, 0, 0] = packed.reshape(-1, self.image_bytes).mean(axis=1)
+        return [self.output]
+
+
+def images(count, height, width):
+    return [np.full(nv12_size(height, width), 10 * (i + 1), dtype=np.uint8) for i in range(count)]
+
+
+def test_batch_one_groups_are_snapshotted():
+    model = load_models("resnet18_224x224_nv12.bin", backend="standin")[0]
+    group = [np.random.default_rng(i).integers(0, 256, nv12_size(224, 224), dtype=np.uint8) for i in range(3)]
+    outputs = MicroBatcher(model, batch_size=3).forward(group)
+    assert len(outputs) == 3
+    for image, output in zip(group, outputs):
+        assert np.array_equal(output[0].buffer, model.forward(image)[0].buffer)
+    assert outputs[0][0].buffer is not outputs[1][0].buffer
+
+
+def test_packed_model_gets_one_call_and_padding():
+    model = PackedModel(4, 8, 8)
+    batcher = MicroBatcher(model, batch_size=2)
+    assert batcher.batch_size == 4      # forced to the compiled batch
+    outputs = batcher.forward(images(3, 8, 8))
+    assert model.calls == 1
+    assert [float(output[0].buffer[0, 0, 0, 0]) for output in outputs] == [10.0, 20.0, 30.0]
+    assert model.output.buffer[3, 0, 0, 0] == 30.0      # the short group is padded with its last image
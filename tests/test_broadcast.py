@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_broadcast.py
+Latest-only fan-out of one producer to many WebSocket clients
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.common.broadcast import BroadcastHub, Subscriber
+
+
+def test_subscribers_are_ended_when_the_producer_fails():
+    def produce():
+        raise RuntimeError("camera stage failed")
+
+    async def scenario():
+        hub = BroadcastHub(produce)
+        subscriber = hub.subscribe()
+        with pytest.raises(RuntimeError):
+            await hub.run()
+        assert await asyncio.wait_for(subscriber.get(), 1) is None
+        assert await asyncio.wait_for(hub.subscribe().get(), 1) is None    # late clients end too
+
+    asyncio.run(scenario())
+
+
+def test_a_busy_subscriber_only_gets_the_newest_item():
+    async def scenario():
+        hub = BroadcastHub(None)
+        subscriber = hub.subscribe()
+        for item in ["a", "b", "c"]:
+            subscriber.publish(item)
+        assert await subscriber.get() == "c"
+        assert subscriber.dropped == 2
+        subscriber.close()
+        subscriber.publish("d")
+        assert await subscriber.get() is None
+
+    asyncio.run(scenario())
+
+
+def test_every_subscriber_gets_items_in_order_and_the_last_one():
+    async def scenario():
+        items = iter(range(5))
+        produced = asyncio.Queue()
+        hub = BroadcastHub(lambda: next(items, None))
+
+        async def client():
+            subscriber = hub.subscribe()
+            received = []
+
+            async def send(item):
+                received.append(item)
+                await asyncio.sleep(0)
+
+            await subscriber.serve(send)
+            await produced.put(received)
+
+        clients = [asyncio.ensure_future(client()) for _ in range(2)]
+        await asyncio.sleep(0)    # both subscribed before the hub starts producing
+        await asyncio.wait_for(hub.run(), 5)
+        await asyncio.wait_for(asyncio.gather(*clients), 5)
+        for _ in clients:
+            received = await produced.get()
+            assert received == sorted(received)
+            assert received[-1] == 4
+        assert hub.produced == 5
+
+    asyncio.run(scenario())
+
+
+def test_serve_raises_the_first_failed_send():
+    async def scenario():
+        hub = BroadcastHub(None)
+        subscriber = hub.subscribe()
+
+        async def send(item):
+            raise ConnectionError("client went away")
+
+        subscriber.publish("frame")
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(subscriber.serve(send), 1)
+        assert subscriber.delivered == 0
+
+    asyncio.run(scenario())
+
+
+def test_pace_follows_the_fastest_client_within_bounds():
+    hub = BroadcastHub(None, min_interval=0.01, max_interval=0.5, max_in_flight=2)
+    fast, slow = Subscriber(2), Subscriber(2)
+    fast.delivered, fast.send_time = 1, 0.04
+    slow.delivered, slow.send_time = 1, 0.4
+    hub.subscribers.update([fast, slow])
+    hub._update_interval()
+    assert hub.interval == pytest.approx(0.02)
+    hub.subscribers.discard(fast)
+    hub._update_interval()
+    assert hub.interval == pytest.approx(0.2)
+    slow.send_time = 10.0
+    hub._update_interval()
+    assert hub.interval == 0.5
+    hub.unsubscribe(slow)
+    assert hub.interval == 0.01
+
+
+def test_pace_spaces_calls_by_the_interval():
+    hub = BroadcastHub(None, min_interval=0.05)
+    hub.pace()
+    t0 = time.monotonic()
+    hub.pace()
+    hub.pace()
+    assert time.monotonic() - t0 >= 0.09
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_camera.py
+Model input and display image of one camera frame
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+from src.common.camera import FrameGrabber
+from src.common.nv12 import nv12_size, resize_nv12
+
+
+class ScriptedCamera:
+    """libsrcampy Camera with two scaler outputs, frame n filled with the value n"""
+
+    def __init__(self, sizes=None):
+        self.calls = []
+        self.sizes = sizes or {}
+
+    def get_img(self, module, width, height):
+        self.calls.append((module, width, height))
+        size = self.sizes.get((width, height), nv12_size(height, width))
+        return None if size is None else bytes([len(self.calls) % 256]) * size
+
+
+def test_model_input_is_the_second_camera_output():
+    cam = ScriptedCamera()
+    grabber = FrameGrabber(cam, (64, 32), (320, 240))
+    first, second = grabber.grab(), grabber.grab()
+    assert cam.calls == [(2, 64, 32), (2, 320, 240)] * 2
+    assert (first.frame_id, second.frame_id) == (1, 2)
+    assert first.nv12.shape == (nv12_size(32, 64),) and first.nv12.dtype == np.uint8
+    assert isinstance(first.display, bytes) and len(first.display) == nv12_size(240, 320)
+
+
+def test_a_missing_image_is_no_frame():
+    grabber = FrameGrabber(ScriptedCamera({(320, 240): None}), (64, 32), (320, 240))
+    assert grabber.grab() is None
+    assert grabber.frame_id == 0
+
+
+def test_a_wrong_size_is_an_error():
+    grabber = FrameGrabber(ScriptedCamera({(64, 32): 100}), (64, 32), (320, 240))
+    with pytest.raises(RuntimeError):
+        grabber.grab()
+
+
+def test_derived_input_reuses_released_buffers():
+    cam = ScriptedCamera()
+    grabber = FrameGrabber(cam, (64, 32), (320, 240), derive_input=True)
+    frame = grabber.grab()
+    assert cam.calls == [(2, 320, 240)]
+    assert np.array_equal(frame.nv12, resize_nv12(frame.display, 240, 320, 32, 64))
+    grabber.release(frame.nv12)
+    assert grabber.grab().nv12 is frame.nv12
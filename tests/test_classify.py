@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_classify.py
+Model registry and multi-model classification runs on the stand-in backend
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from src.basic.classify import ClassificationRun, classify_folder, read_labels
+from src.common.registry import CLASSIFICATION_MODELS, classification_spec
+
+
+def test_spec_by_name_and_by_path():
+    assert classification_spec("resnet18") is CLASSIFICATION_MODELS["resnet18"]
+    recompiled = classification_spec("/data/resnet18_224x224_nv12.bin")
+    assert recompiled.name == "resnet18"
+    assert recompiled.model_file == "/data/resnet18_224x224_nv12.bin"
+    assert recompiled.nms_top_k == CLASSIFICATION_MODELS["resnet18"].nms_top_k
+    custom = classification_spec("/data/mynet_160x128_nv12.bin")
+    assert (custom.name, custom.height, custom.width) == ("mynet_160x128_nv12", 160, 128)
+
+
+def test_unknown_name_is_rejected():
+    with pytest.raises(KeyError):
+        classification_spec("alexnet")
+
+
+def test_read_labels_skips_headers(tmp_path):
+    labels = tmp_path / "labels.csv"
+    labels.write_text("file,class\nimages/a.jpg,3\nb.jpg,17\n")
+    assert read_labels(str(labels)) == {"a.jpg": 3, "b.jpg": 17}
+
+
+def test_models_sharing_an_input_size_share_one_decode(tmp_path):
+    for i in range(5):
+        cv2.imwrite(str(tmp_path / f"{i}.png"), np.full((40, 60, 3), 40 * i, dtype=np.uint8))
+    runs = [ClassificationRun(classification_spec(name), backend="standin", batch_size=2)
+            for name in ["resnet18", "vargconvnet", "efficientnet_lite4"]]
+    metrics = classify_folder(str(tmp_path), runs, batch_size=2, verbose=False)
+    assert [run.count for run in runs] == [5, 5, 5]
+    summary = metrics.summary()
+    assert summary["preprocess"]["count"] == 5 + 5      # once at 224x224, once at 300x300
+    assert summary["resnet18.forward"]["count"] == 3    # groups of 2, 2 and 1
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_fcos.py
+Class-aware NMS and the NumPy FCOS decoder on the stand-in backend
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+
+from src.common.backend import fcos_postprocess, load_models
+from src.common.fcos import FcosDecoder, nms
+from src.common.nv12 import nv12_size
+
+
+def test_nms_drops_overlapping_box_of_same_class():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    classes = np.array([0, 0, 0])
+    assert nms(boxes, scores, classes, 0.5).tolist() == [0, 2]
+
+
+def test_nms_keeps_overlapping_boxes_of_different_classes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11]], dtype=np.float32)
+    scores = np.array([0.8, 0.9], dtype=np.float32)
+    classes = np.array([0, 1])
+    assert nms(boxes, scores, classes, 0.5).tolist() == [1, 0]
+
+
+def test_nms_threshold_is_inclusive_upper_bound():
+    boxes = np.array([[0, 0, 10, 10], [5, 0, 15, 10]], dtype=np.float32)    # IoU 1/3
+    scores = np.array([0.9, 0.8], dtype=np.float32)
+    classes = np.array([0, 0])
+    assert nms(boxes, scores, classes, 0.4).tolist() == [0, 1]
+    assert nms(boxes, scores, classes, 0.3).tolist() == [0]
+
+
+def test_nms_of_nothing():
+    assert nms(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, int), 0.5).size == 0
+
+
+def test_standin_detections_are_sorted_scaled_and_suppressed():
+    model = load_models("fcos_512x512_nv12.bin", backend="standin")[0]
+    decoder = fcos_postprocess(model, 512, 512, 1080, 1920, score_threshold=0.5, nms_threshold=0.6)
+    assert isinstance(decoder, FcosDecoder)
+    outputs = model.forward(np.zeros(nv12_size(512, 512), dtype=np.uint8))
+    detections = decoder.detect(outputs)
+    assert len(detections) > 0
+    assert np.all(np.diff(detections["score"]) <= 0)
+    assert np.all(detections["score"] >= 0.5)
+    boxes = detections["bbox"]
+    assert np.all(boxes[:, 0] <= boxes[:, 2]) and np.all(boxes[:, 1] <= boxes[:, 3])
+    unscaled = fcos_postprocess(model, 512, 512, 512, 512, score_threshold=0.5, nms_threshold=0.6).detect(outputs)
+    assert np.allclose(boxes, unscaled["bbox"] * np.array([1920 / 512, 1080 / 512] * 2), rtol=1e-5)
+    again = nms(boxes, detections["score"], detections["id"], 0.6)
+    assert sorted(again.tolist()) == list(range(len(detections)))    # nothing left to suppress
+
+
+def test_letterboxed_input_is_scaled_by_one_factor():
+    model = load_models("fcos_512x512_nv12.bin", backend="standin")[0]
+    outputs = model.forward(np.zeros(nv12_size(512, 512), dtype=np.uint8))
+    unscaled = fcos_postprocess(model, 512, 512, 512, 512).detect(outputs)
+    padded = fcos_postprocess(model, 512, 512, 1080, 1920, is_pad_resize=1).detect(outputs)
+    assert np.allclose(padded["bbox"], unscaled["bbox"] * 1920 / 512, rtol=1e-5)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_framing.py
+Hand-written protobuf varints and field headers of the frame serializer
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import pytest
+
+from src.common.framing import length_delimited_header, varint
+
+
+@pytest.mark.parametrize("value, encoded", [
+    (0, b"\x00"),
+    (1, b"\x01"),
+    (127, b"\x7f"),
+    (128, b"\x80\x01"),
+    (300, b"\xac\x02"),
+    (16383, b"\xff\x7f"),
+    (16384, b"\x80\x80\x01"),
+    (2 ** 32, b"\x80\x80\x80\x80\x10"),
+])
+def test_varint(value, encoded):
+    assert varint(value) == encoded
+
+
+def decode_varint(data):
+    value = shift = 0
+    for i, byte in enumerate(data):
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, data[i + 1:]
+    raise ValueError("truncated varint")
+
+
+def test_varint_round_trip():
+    for value in [5, 1 << 20, 123456789, 3_000_000]:
+        assert decode_varint(varint(value)) == (value, b"")
+
+
+def test_length_delimited_header():
+    # field 2, wire type 2: tag 0x12; a 1080p JPEG length needs three bytes
+    assert length_delimited_header(2, 3) == b"\x12\x03"
+    tag, rest = decode_varint(length_delimited_header(15, 250_000))
+    assert (tag >> 3, tag & 7) == (15, 2)
+    assert decode_varint(rest) == (250_000, b"")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_keyframe_tracking.py
+Box matching and accuracy of keyframe tracking against tracking every frame
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+import pytest
+
+keyframe_tracking = pytest.importorskip("yolo11.keyframe_tracking", exc_type=ImportError)
+TrackedFrame = keyframe_tracking.TrackedFrame
+
+
+def frame(index, boxes, ids):
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+    return TrackedFrame(index, False, boxes, np.array(ids), np.zeros(len(ids), dtype=int), np.ones(len(ids)))
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]], dtype=np.float32)
+    assert np.allclose(keyframe_tracking.iou_matrix(a, b), [[1.0, 1 / 3, 0.0], [0.0, 0.0, 0.0]])
+    assert keyframe_tracking.iou_matrix(a, b[:0]).shape == (2, 0)
+
+
+def test_identical_runs_are_perfect():
+    reference = [frame(i, [[i, 0, i + 10, 10], [50, 50, 60, 60]], [1, 2]) for i in range(4)]
+    assert keyframe_tracking.compare_tracks(reference, reference) == dict(recall=1.0, mean_iou=1.0, id_switches=0)
+
+
+def test_missed_boxes_and_id_switches():
+    reference = [frame(i, [[0, 0, 10, 10], [50, 50, 60, 60]], [1, 2]) for i in range(3)]
+    candidate = [frame(0, [[0, 0, 10, 10], [50, 50, 60, 60]], [7, 8]),
+                 frame(1, [[0, 0, 10, 10]], [7]),                       # second box missed
+                 frame(2, [[50, 50, 60, 60], [1, 0, 11, 10]], [8, 9])]  # first box under a new id
+    result = keyframe_tracking.compare_tracks(reference, candidate)
+    assert result["recall"] == pytest.approx(5 / 6)
+    assert result["id_switches"] == 1
+    assert result["mean_iou"] == pytest.approx((4 + 90 / 110) / 5)
+
+
+def test_boxes_below_the_threshold_do_not_match():
+    reference = [frame(0, [[0, 0, 10, 10]], [1])]
+    candidate = [frame(0, [[5, 0, 15, 10]], [1])]
+    assert keyframe_tracking.compare_tracks(reference, candidate, iou_threshold=0.5)["recall"] == 0.0
+    assert keyframe_tracking.compare_tracks(reference, candidate, iou_threshold=0.3)["recall"] == 1.0
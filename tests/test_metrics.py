@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_metrics.py
+Latency spans, percentiles and the Prometheus exposition
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import csv
+import time
+
+import pytest
+
+from src.common.metrics import Metrics
+
+
+def test_summary_percentiles_over_the_window():
+    metrics = Metrics(window=100)
+    for ms in range(1, 201):
+        metrics.record("forward", ms * 1_000_000)
+    summary = metrics.summary()["forward"]
+    assert summary["count"] == 200
+    assert summary["mean_ms"] == pytest.approx(100.5)           # over every sample
+    assert summary["p50_ms"] == pytest.approx(150.5)            # over the last 100 only
+    assert summary["p99_ms"] == pytest.approx(199.01)
+
+
+def test_span_records_the_time_inside_it():
+    metrics = Metrics()
+    with metrics.span("capture"):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with metrics.span("capture"):
+            raise ValueError
+    summary = metrics.summary()["capture"]
+    assert summary["count"] == 2
+    assert summary["mean_ms"] >= 5
+
+
+def test_prometheus_exposition():
+    metrics = Metrics(prefix="x3")
+    metrics.record("encode", 2_000_000)
+    metrics.record("encode", 4_000_000)
+    lines = metrics.prometheus().splitlines()
+    assert "# TYPE x3_stage_latency_seconds summary" in lines
+    assert 'x3_stage_latency_seconds{stage="encode",quantile="0.5"} 0.003000000' in lines
+    assert 'x3_stage_latency_seconds_sum{stage="encode"} 0.006000000' in lines
+    assert 'x3_stage_latency_seconds_count{stage="encode"} 2' in lines
+
+
+def test_report_and_csv(tmp_path):
+    metrics = Metrics()
+    metrics.record("send", 1_500_000)
+    assert metrics.report().splitlines()[1].split() == ["send", "1", "1.50", "1.50", "1.50", "1.50"]
+    metrics.write_csv(tmp_path / "summary.csv")
+    metrics.write_csv(tmp_path / "samples.csv", samples=True)
+    with open(tmp_path / "summary.csv") as f:
+        assert list(csv.reader(f))[1] == ["send", "1", "1.5000", "1.5000", "1.5000", "1.5000"]
+    with open(tmp_path / "samples.csv") as f:
+        assert list(csv.reader(f)) == [["stage", "nanoseconds"], ["send", "1500000"]]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_motion.py
+Skipping inference on frames that did not change
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import numpy as np
+
+from src.common import motion
+from src.common.motion import MotionGate
+from src.common.nv12 import nv12_size
+
+
+def scene(square=None, noise_seed=None):
+    nv12 = np.full(nv12_size(128, 128), 100, dtype=np.uint8)
+    luma = nv12[:128 * 128].reshape(128, 128)
+    if noise_seed is not None:
+        luma += np.random.default_rng(noise_seed).integers(0, 4, luma.shape, dtype=np.uint8)
+    if square is not None:
+        luma[square:square + 32, square:square + 32] = 250
+    return nv12
+
+
+def test_first_frame_passes_and_static_frames_are_skipped():
+    gate = MotionGate(128, 128, refresh_seconds=None)
+    assert gate.check(scene())
+    assert not any(gate.check(scene(noise_seed=i)) for i in range(5))     # sensor noise is no motion
+    assert gate.check(scene(square=10))
+    assert not gate.check(scene(square=10))
+    assert (gate.frames, gate.passed) == (8, 2)
+    assert gate.skipped_ratio() == 0.75
+
+
+def test_the_y_plane_alone_is_enough():
+    gate = MotionGate(128, 128, refresh_seconds=None)
+    assert gate.check(scene()[:128 * 128])
+    assert not gate.check(scene()[:128 * 128])
+
+
+def test_slow_changes_add_up_against_the_last_inferred_frame():
+    gate = MotionGate(128, 128, threshold=0.05, pixel_delta=12, refresh_seconds=None)
+    gate.check(scene())
+    steps = []
+    for step in range(1, 4):
+        nv12 = scene()
+        nv12[:128 * 16] += 5 * step     # a strip brightens by 5 per frame, below pixel_delta frame to frame
+        steps.append(gate.check(nv12))
+    assert steps == [False, False, True]
+
+
+def test_refresh_forces_a_frame_through(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(motion.time, "monotonic", lambda: now[0])
+    gate = MotionGate(128, 128, refresh_seconds=2.0)
+    assert gate.check(scene())
+    now[0] += 1.0
+    assert not gate.check(scene())
+    now[0] += 1.5
+    assert gate.check(scene())
+    now[0] += 0.5
+    assert not gate.check(scene())
+
+
+def test_zero_threshold_passes_everything():
+    gate = MotionGate(128, 128, threshold=0)
+    assert all(gate.check(scene()) for _ in range(3))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_nv12.py
+NV12 conversion and resizing against the straightforward implementation
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import cv2
+import numpy as np
+
+from src.common.nv12 import NV12BufferPool, bgr2nv12_opencv, nv12_size, resize_bgr2nv12, resize_nv12
+
+
+def reference_nv12(image):
+    """the original per-script conversion: I420, then U and V interleaved"""
+    height, width = image.shape[:2]
+    area = height * width
+    yuv420p = cv2.cvtColor(image, cv2.COLOR_BGR2YUV_I420).reshape((area * 3 // 2,))
+    uv_packed = yuv420p[area:].reshape((2, area // 4)).transpose((1, 0)).reshape((area // 2,))
+    return np.concatenate([yuv420p[:area], uv_packed])
+
+
+def image(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def test_bgr2nv12_matches_reference():
+    for height, width in [(224, 224), (480, 640), (1080, 1920)]:
+        bgr = image(height, width)
+        assert np.array_equal(bgr2nv12_opencv(bgr), reference_nv12(bgr))
+
+
+def test_bgr2nv12_writes_into_out():
+    bgr = image(300, 300)
+    out = np.empty(nv12_size(300, 300), dtype=np.uint8)
+    assert bgr2nv12_opencv(bgr, out) is out
+    assert np.array_equal(out, reference_nv12(bgr))
+
+
+def test_resize_bgr2nv12_matches_resize_then_convert():
+    bgr = image(480, 640, seed=1)
+    resized = cv2.resize(bgr, (224, 224), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(resize_bgr2nv12(bgr, 224, 224), reference_nv12(resized))
+
+
+
+def test_buffer_pool_recycles_by_size():
+    pool = NV12BufferPool(max_free=1)
+    first = pool.acquire(224, 224)
+    assert first.shape == (nv12_size(224, 224),)
+    pool.release(first)
+    assert pool.acquire(224, 224) is first
+    assert pool.acquire(224, 224) is not first
+    pool.release(first)
+    pool.release(np.empty(nv12_size(224, 224), dtype=np.uint8))    # over max_free, dropped
+    assert pool.acquire(224, 224) is first
+
+
+def test_resize_nv12_close_to_resizing_the_bgr_image():
+    bgr = cv2.resize(image(27, 48, seed=2), (1920, 1080), interpolation=cv2.INTER_CUBIC)    # smooth picture
+    nv12 = resize_nv12(bgr2nv12_opencv(bgr).tobytes(), 1080, 1920, 512, 512)
+    expected = reference_nv12(cv2.resize(bgr, (512, 512), interpolation=cv2.INTER_LINEAR))
+    assert nv12.shape == (nv12_size(512, 512),)
+    assert np.abs(nv12.astype(int) - expected).mean() < 2.0
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_nv12_cache.py
+Hits, misses and least recently used eviction of the NV12Cache
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import os
+
+import numpy as np
+
+from src.common.nv12_cache import NV12Cache
+
+ENTRY = np.arange(1000, dtype=np.uint8)
+
+
+def entry_bytes(tmp_path):
+    probe = NV12Cache(str(tmp_path / "probe"))
+    probe.put("probe", (1, 1, 3), ENTRY)
+    return probe.size()[1]
+
+
+def test_put_and_get(tmp_path):
+    cache = NV12Cache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", (480, 640, 3), ENTRY)
+    shape, nv12 = cache.get("a")
+    assert shape == (480, 640, 3)
+    assert np.array_equal(nv12, ENTRY)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    size = entry_bytes(tmp_path)
+    cache = NV12Cache(str(tmp_path / "cache"), max_bytes=2 * size)
+    cache.put("a", (1, 1, 3), ENTRY)
+    cache.put("b", (1, 1, 3), ENTRY)
+    assert cache.get("a") is not None     # b is now the least recently used
+    cache.put("c", (1, 1, 3), ENTRY)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size() == (2, 2 * size)
+    assert len(os.listdir(tmp_path / "cache")) == 2
+
+
+def test_reopening_with_a_lower_bound_evicts(tmp_path):
+    size = entry_bytes(tmp_path)
+    directory = str(tmp_path / "cache")
+    cache = NV12Cache(directory)
+    for key in "abc":
+        cache.put(key, (1, 1, 3), ENTRY)
+    assert NV12Cache(directory, max_bytes=size).size() == (1, size)
+
+
+def test_key_changes_with_the_preprocessing(tmp_path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(b"not really a jpeg")
+    cache = NV12Cache(str(tmp_path / "cache"))
+    assert cache.key(str(path), 224, 224, 3) != cache.key(str(path), 300, 300, 3)
+    assert cache.key(str(path), 224, 224, 3) == cache.key(str(path), 224, 224, 3)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_pipeline.py
+Ordering, dropping and failure of the threaded stage pipeline
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import itertools
+import queue
+import time
+
+import pytest
+
+from src.common.pipeline import Pipeline
+
+
+def counter(limit):
+    numbers = iter(range(limit))
+    return lambda: next(numbers, None)
+
+
+def drain(pipeline):
+    items = []
+    while True:
+        item = pipeline.get(timeout=5)
+        if item is None:
+            return items
+        items.append(item)
+
+
+def test_stages_apply_in_order_and_keep_item_order():
+    pipeline = Pipeline(counter(20), [("double", lambda x: 2 * x), ("label", lambda x: f"#{x}")]).start()
+    try:
+        assert drain(pipeline) == [f"#{2 * i}" for i in range(20)]
+        assert pipeline.get(timeout=5) is None     # the end is sticky
+    finally:
+        pipeline.stop()
+    assert pipeline.stats()["double"][0] == 20
+
+
+def test_a_stage_returning_none_drops_the_item():
+    pipeline = Pipeline(counter(10), [("even", lambda x: x if x % 2 == 0 else None)]).start()
+    try:
+        assert drain(pipeline) == [0, 2, 4, 6, 8]
+    finally:
+        pipeline.stop()
+
+
+def test_a_failing_stage_ends_the_stream_with_its_error():
+    def explode(x):
+        if x == 3:
+            raise ValueError("boom")
+        return x
+
+    pipeline = Pipeline(counter(100), [("explode", explode)]).start()
+    try:
+        items = []
+        with pytest.raises(RuntimeError, match="explode"):
+            while True:
+                items.append(pipeline.get(timeout=5))
+        assert items == [0, 1, 2]
+    finally:
+        pipeline.stop()
+
+
+def test_stop_ends_an_endless_source():
+    pipeline = Pipeline(itertools.count().__next__, [("identity", lambda x: x)]).start()
+    assert pipeline.get(timeout=5) == 0
+    pipeline.stop()
+    assert len(drain(pipeline)) <= 2 * 2    # what the two bounded queues held, then the end
+
+
+def test_items_from_before_resume_are_dropped():
+    produced = []
+    numbers = itertools.count()
+
+    def source():
+        produced.append(next(numbers))
+        return produced[-1]
+
+    pipeline = Pipeline(source, [("identity", lambda x: x)], queue_size=2).start()
+    try:
+        first = pipeline.get(timeout=5)
+        pipeline.pause()
+        time.sleep(0.3)    # the queues fill up with items of the first generation
+        stale = produced[-1]
+        pipeline.resume()
+        assert pipeline.get(timeout=5) > stale > first
+    finally:
+        pipeline.stop()
+
+
+def test_a_paused_pipeline_produces_nothing():
+    pipeline = Pipeline(itertools.count().__next__, [("identity", lambda x: x)])
+    pipeline.pause()
+    pipeline.start()
+    try:
+        with pytest.raises(queue.Empty):
+            pipeline.get(timeout=0.3)
+        pipeline.resume()
+        assert pipeline.get(timeout=5) is not None
+    finally:
+        pipeline.stop()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_prefetch.py
+Order, skipping and grouping of the pipelined image loader
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import cv2
+import numpy as np
+
+from src.common.nv12 import resize_bgr2nv12
+from src.common.prefetch import PrefetchLoader
+
+
+def write_images(folder, count):
+    paths = []
+    for i in range(count):
+        image = np.random.default_rng(i).integers(0, 256, (48 + i, 64, 3), dtype=np.uint8)
+        path = str(folder / f"{i:02d}.png")
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def test_images_come_out_in_input_order(tmp_path):
+    paths = write_images(tmp_path, 12)
+    loader = PrefetchLoader(paths, 32, 32, workers=3, queue_depth=4)
+    seen = []
+    for path, shape, nv12 in loader:
+        assert shape == (48 + len(seen), 64, 3)
+        assert np.array_equal(nv12, resize_bgr2nv12(cv2.imread(path), 32, 32))
+        seen.append(path)
+    assert seen == paths
+    assert loader.count == 12
+
+
+def test_undecodable_files_are_skipped(tmp_path):
+    paths = write_images(tmp_path, 3)
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    paths.insert(1, str(broken))
+    loader = PrefetchLoader(paths, 32, 32)
+    assert [item.path for item in loader] == [paths[0], paths[2], paths[3]]
+    assert loader.skipped == 1
+
+
+def test_batches_keep_order_and_end_short(tmp_path):
+    paths = write_images(tmp_path, 7)
+    groups = [[item.path for item in batch] for batch in PrefetchLoader(paths, 32, 32).batches(3)]
+    assert groups == [paths[:3], paths[3:6], paths[6:]]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_results.py
+Parsing of the libpostprocess result strings into structured arrays
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import json
+
+import numpy as np
+
+from src.common.results import CLASSIFICATION_DTYPE, DETECTION_DTYPE, parse_classifications, parse_detections
+
+
+def test_detections_follow_their_object_whatever_the_key_order():
+    data = [{"bbox": [1.5, 2, 3, 4], "score": 0.9, "name": "person", "id": 0},
+            {"id": 7, "name": "car", "score": 0.25, "bbox": [10, 20, 30, 40]}]
+    detections = parse_detections('"detection" : ' + json.dumps(data))
+    assert detections.dtype == DETECTION_DTYPE
+    assert detections["bbox"].tolist() == [[1.5, 2, 3, 4], [10, 20, 30, 40]]
+    assert np.allclose(detections["score"], [0.9, 0.25])
+    assert detections["id"].tolist() == [0, 7]
+
+
+def test_prefix_length_does_not_matter():
+    data = json.dumps([{"bbox": [1, 2, 3, 4], "score": 0.5, "id": 3}])
+    assert parse_detections(data)["id"].tolist() == parse_detections('"detections":  ' + data)["id"].tolist()
+
+
+def test_no_detections():
+    assert len(parse_detections('"detection" : []')) == 0
+    assert len(parse_detections("")) == 0
+
+
+def test_classifications_keep_long_class_names():
+    name = "Chesapeake Bay retriever, a long class name from the ImageNet label file"
+    data = [{"prob": 0.75, "label": 209, "class_name": name}, {"label": 1, "class_name": "goldfish", "prob": 0.1}]
+    results = parse_classifications('"classification": ' + json.dumps(data))
+    assert results.dtype == CLASSIFICATION_DTYPE
+    assert results["label"].tolist() == [209, 1]
+    assert results["class_name"].tolist() == [name, "goldfish"]
+    assert np.allclose(results["prob"], [0.75, 0.1])
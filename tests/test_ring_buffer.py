@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_ring_buffer.py
+Drop policies and closing of the RingBuffer between pipeline threads
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.common.ring_buffer import RingBuffer
+
+
+def test_drop_oldest_keeps_the_newest_items():
+    buffer = RingBuffer(2, "drop-oldest")
+    assert all(buffer.put(i) for i in range(5))
+    assert [buffer.get(timeout=0), buffer.get(timeout=0)] == [3, 4]
+    assert (buffer.put_count, buffer.dropped) == (5, 3)
+
+
+def test_drop_newest_refuses_items_when_full():
+    buffer = RingBuffer(2, "drop-newest")
+    assert [buffer.put(i) for i in range(4)] == [True, True, False, False]
+    assert [buffer.get(timeout=0), buffer.get(timeout=0)] == [0, 1]
+    assert buffer.dropped == 2
+
+
+def test_block_waits_for_a_free_slot():
+    buffer = RingBuffer(1, "block")
+    buffer.put(0)
+    done = threading.Event()
+    producer = threading.Thread(target=lambda: (buffer.put(1), done.set()))
+    producer.start()
+    assert not done.wait(0.1)
+    assert buffer.get() == 0
+    assert done.wait(1.0)
+    producer.join()
+    assert buffer.get() == 1 and buffer.dropped == 0
+
+
+def test_close_releases_a_blocked_producer_and_drains_the_items():
+    buffer = RingBuffer(1, "block")
+    buffer.put(0)
+    results = []
+    producer = threading.Thread(target=lambda: results.append(buffer.put(1)))
+    producer.start()
+    time.sleep(0.05)
+    buffer.close()
+    producer.join(1.0)
+    assert results == [False]
+    assert buffer.get() == 0
+    assert buffer.get() is None
+
+
+def test_get_timeout():
+    buffer = RingBuffer(1)
+    t0 = time.monotonic()
+    assert buffer.get(timeout=0.05) is None
+    assert time.monotonic() - t0 >= 0.04
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RingBuffer(1, "drop-all")
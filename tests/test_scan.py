@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_scan.py
+Deterministic image listing, sharding and checkpoint resume
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import pytest
+
+from src.common.scan import Checkpoint, parse_shard, scan_images, shard
+
+PATHS = [f"/images/{i:03d}.jpg" for i in range(10)]
+
+
+def finish(checkpoint, paths):
+    for path in paths:
+        checkpoint.mark(path)
+    checkpoint.save()
+
+
+def test_scan_is_sorted_depth_first(tmp_path):
+    for name in ["b.jpg", "a.PNG", "notes.txt", "sub/c.jpg", "sub/deeper/d.bmp"]:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+    found = [p[len(str(tmp_path)) + 1:] for p in scan_images(str(tmp_path))]
+    assert found == ["a.PNG", "b.jpg", "sub/c.jpg", "sub/deeper/d.bmp"]
+    assert [p[len(str(tmp_path)) + 1:] for p in scan_images(str(tmp_path), recursive=False)] == ["a.PNG", "b.jpg"]
+
+
+def test_shards_cover_the_list_once():
+    shards = [list(shard(PATHS, i, 3)) for i in range(3)]
+    assert sorted(sum(shards, [])) == PATHS
+    assert parse_shard("1/3") == (1, 3)
+
+
+def test_resume_after_the_finished_paths(tmp_path):
+    path = str(tmp_path / "progress.json")
+    finish(Checkpoint(path), PATHS[:4])
+    assert list(Checkpoint(path).resume(PATHS)) == PATHS[4:]
+
+
+def test_resume_finds_the_last_path_when_the_tree_changed(tmp_path):
+    path = str(tmp_path / "progress.json")
+    finish(Checkpoint(path), PATHS[:4])
+    changed = ["/images/000a.jpg"] + PATHS
+    checkpoint = Checkpoint(path)
+    assert list(checkpoint.resume(changed)) == PATHS[4:]
+    assert checkpoint.done == 5
+
+
+def test_resume_starts_over_when_the_last_path_is_gone(tmp_path):
+    path = str(tmp_path / "progress.json")
+    finish(Checkpoint(path), PATHS[:4])
+    assert list(Checkpoint(path).resume(PATHS[4:])) == PATHS[4:]
+
+
+def test_complete_run_is_not_repeated_unless_restarted(tmp_path):
+    path = str(tmp_path / "progress.json")
+    checkpoint = Checkpoint(path)
+    for item in PATHS:
+        checkpoint.mark(item)
+    checkpoint.save(complete=True)
+    assert list(Checkpoint(path).resume(PATHS)) == []
+    assert list(Checkpoint(path, restart=True).resume(PATHS)) == PATHS
+
+
+@pytest.mark.parametrize("every", [1, 3])
+def test_mark_saves_every_so_often(tmp_path, every):
+    path = str(tmp_path / "progress.json")
+    checkpoint = Checkpoint(path, every=every, seconds=3600)
+    for item in PATHS[:3]:
+        checkpoint.mark(item)
+    assert Checkpoint(path).done == 3
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_shard.py
+Packing image folders into NV12 shards and reading them back
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from src.common.prefetch import PrefetchLoader
+from src.common.shard import ShardReader, is_shard, pack_images, shard_paths
+
+
+def write_images(folder, count):
+    paths = []
+    for i in range(count):
+        path = str(folder / f"{i}.png")
+        cv2.imwrite(path, np.random.default_rng(i).integers(0, 256, (30 + i, 50, 3), dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def test_shard_paths():
+    assert shard_paths("/data/val") == ("/data/val.nv12", "/data/val.json")
+    assert shard_paths("/data/val.nv12") == ("/data/val.nv12", "/data/val.json")
+    assert shard_paths("/data/val.json") == ("/data/val.nv12", "/data/val.json")
+    assert shard_paths("/data/v1.2") == ("/data/v1.2.nv12", "/data/v1.2.json")
+
+
+def test_round_trip_matches_the_loader(tmp_path):
+    paths = write_images(tmp_path, 5)
+    shard = str(tmp_path / "val")
+    assert not is_shard(shard)
+    pack_images(paths, shard, 32, 48)
+    assert is_shard(shard)
+    reader = ShardReader(shard + ".nv12")
+    assert (len(reader), reader.height, reader.width) == (5, 32, 48)
+    expected = [(item.path, item.shape, item.nv12.copy()) for item in PrefetchLoader(paths, 32, 48)]
+    for (path, shape, nv12), item in zip(expected, reader):
+        assert (item.path, item.shape) == (path, shape)
+        assert np.array_equal(item.nv12, nv12)
+        assert not item.nv12.flags.writeable
+    assert [len(batch) for batch in reader.batches(2)] == [2, 2, 1]
+
+
+def test_truncated_data_is_rejected(tmp_path):
+    shard = str(tmp_path / "val")
+    pack_images(write_images(tmp_path, 2), shard, 16, 16)
+    with open(shard + ".nv12", "r+b") as f:
+        f.truncate(100)
+    with pytest.raises(ValueError):
+        ShardReader(shard)
+
+
+def test_empty_shard(tmp_path):
+    shard = str(tmp_path / "empty")
+    pack_images([], shard, 16, 16)
+    assert list(ShardReader(shard)) == []
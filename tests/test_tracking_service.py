@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_tracking_service.py
+Source naming of the multi-video tracking service
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import types
+
+import pytest
+
+tracking_service = pytest.importorskip("yolo11.tracking_service", exc_type=ImportError)
+
+
+def test_sources_with_the_same_file_name_get_distinct_names():
+    sources = [types.SimpleNamespace(name=name) for name in ["cam", "yard", "cam", "cam"]]
+    service = tracking_service.TrackingService(types.SimpleNamespace(processes=False), sources)
+    assert [source.name for source in service.sources] == ["cam-0", "yard", "cam-2", "cam-3"]
+
+
+def test_a_process_pool_is_rejected():
+    with pytest.raises(ValueError):
+        tracking_service.TrackingService(types.SimpleNamespace(processes=True), [])
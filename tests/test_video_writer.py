@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_video_writer.py
+Segmented annotated video output
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+video_writer = pytest.importorskip("yolo11.video_writer", exc_type=ImportError)
+
+
+def frame_count(path):
+    cap = cv2.VideoCapture(path)
+    count = 0
+    while cap.read()[0]:
+        count += 1
+    cap.release()
+    return count
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def test_segments_follow_the_source_frame_number(tmp_path):
+    writer = video_writer.AnnotatedVideoWriter(str(tmp_path / "out.avi"), fps=10.0, fourcc="MJPG",
+                                               segment_seconds=0.4)
+    for index in [0, 1, 2, 3, 7, 8, 9, 13]:     # 4, 5, 6 and 10 to 12 were dropped before the writer
+        assert writer.write(frame(index * 10), index)
+    writer.close()
+    assert [path[-7:] for path in writer.files] == ["000.avi", "001.avi", "002.avi", "003.avi"]
+    assert [frame_count(path) for path in writer.files] == [4, 1, 2, 1]
+
+
+def test_without_an_index_every_write_call_is_a_frame(tmp_path):
+    writer = video_writer.AnnotatedVideoWriter(str(tmp_path / "out.avi"), fps=10.0, fourcc="MJPG",
+                                               segment_seconds=0.5)
+    for value in range(12):
+        writer.write(frame(value))
+    writer.close()
+    assert [frame_count(path) for path in writer.files] == [5, 5, 2]
+    assert writer.frames == 12
+
+
+def test_one_file_without_segments(tmp_path):
+    path = str(tmp_path / "out.avi")
+    writer = video_writer.AnnotatedVideoWriter(path, fps=10.0, fourcc="MJPG")
+    for index in range(6):
+        writer.write(frame(index), index * 100)
+    writer.close()
+    assert writer.files == [path]
+    assert frame_count(path) == 6
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_worker_pool.py
+Futures, ordering and failures of the YOLO worker pool, with a scripted model
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+$ python3 -m pytest -q
+"""
+
+import threading
+import time
+
+import pytest
+
+worker_pool = pytest.importorskip("yolo11.worker_pool", exc_type=ImportError)
+
+
+class ScriptedYOLO:
+    """Answers each source with (source, kwargs, thread name); a later source may finish first"""
+
+    loaded = []
+
+    def __init__(self, model):
+        if model == "missing.pt":
+            raise FileNotFoundError(model)
+        ScriptedYOLO.loaded.append(model)
+
+    def predict(self, source, verbose=False, **kwargs):
+        if isinstance(source, str):
+            if source == "broken.jpg":
+                raise ValueError(source)
+            time.sleep(0.01 * (5 - int(source)))
+        return [(source, kwargs, threading.current_thread().name)]
+
+
+@pytest.fixture(autouse=True)
+def scripted_yolo(monkeypatch):
+    ScriptedYOLO.loaded = []
+    monkeypatch.setattr(worker_pool, "YOLO", ScriptedYOLO)
+
+
+def test_each_future_gets_the_results_of_its_own_request():
+    with worker_pool.WorkerPool("yolo11n.pt", workers=3, warmup=1) as pool:
+        assert ScriptedYOLO.loaded == ["yolo11n.pt"] * 3    # one model per worker, loaded once
+        futures = [pool.submit(str(i), conf=0.1 * i) for i in range(5)]
+        results = [future.result(timeout=5) for future in futures]
+        assert [r[0][:2] for r in results] == [(str(i), {"conf": 0.1 * i}) for i in range(5)]
+        assert len({r[0][2] for r in results}) > 1      # served by several workers
+        assert pool.predict("4")[0][0] == "4"
+    assert pool.served == 6
+    assert len(pool.load_seconds) == len(pool.warmup_seconds) == 3
+
+
+def test_a_failed_prediction_fails_only_its_future():
+    with worker_pool.WorkerPool("yolo11n.pt", workers=2, warmup=0) as pool:
+        broken, good = pool.submit("broken.jpg"), pool.submit("1")
+        with pytest.raises(ValueError):
+            broken.result(timeout=5)
+        assert good.result(timeout=5)[0][0] == "1"
+
+
+def test_a_model_that_does_not_load_fails_start():
+    with pytest.raises(RuntimeError, match="missing.pt"):
+        worker_pool.WorkerPool("missing.pt", workers=2).start(timeout=5)
+
+
+def test_submit_needs_a_running_pool():
+    pool = worker_pool.WorkerPool("yolo11n.pt", workers=1, warmup=0)
+    with pytest.raises(RuntimeError):
+        pool.submit("1")
+    pool.start()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.submit("1")
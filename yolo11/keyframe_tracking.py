@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+keyframe_tracking.py
+Object tracking that runs the detector on keyframes only and follows the tracks with optical flow in between
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+model.track() runs the full detector on every frame. In a 30 fps yard video
+the wagons move a few pixels per frame, so KeyframeTracker calls
+model.predict() only every `interval` frames, or earlier when the scene
+changes (mean absolute difference of a 64x36 grey thumbnail against the last
+keyframe above `scene_threshold`), and feeds the detections to a
+ByteTrack/BoT-SORT instance of its own. model.track() would keep the tracker
+inside the model and rebuild it whenever persist is False; here the tracker
+lives as long as the KeyframeTracker, is created for the keyframe rate, and
+keeps its IDs from one keyframe to the next.
+
+Between keyframes each box is moved by the median Lucas-Kanade optical flow
+of corner features picked inside it on the keyframe, computed on a half size
+grey image. A box that lost its features keeps its last velocity.
+
+compare_tracks() scores a run against the every-frame reference: recall of
+the reference boxes at IoU 0.5, mean IoU of the matches and the number of ID
+switches; accuracy_report() prints it with the throughput for several
+intervals.
+"""
+
+import collections
+import inspect
+import time
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+TRACKERS = {"bytetrack": BYTETracker, "botsort": BOTSORT}
+
+TrackedFrame = collections.namedtuple("TrackedFrame", ["index", "keyframe", "boxes", "ids", "classes", "scores"])
+
+THUMBNAIL = (64, 36)
+
+
+def create_tracker(config, frame_rate=30):
+    """
+    :param config: tracker configuration, e.g. bytetrack.yaml or botsort.yaml
+    :param frame_rate: frame rate of the source, sets how long lost tracks are kept
+    :return: a new, independent tracker instance
+    """
+    with open(check_yaml(config)) as f:
+        args = IterableSimpleNamespace(**yaml.safe_load(f))
+    if args.tracker_type not in TRACKERS:
+        raise ValueError(f"{config}: unsupported tracker_type {args.tracker_type}")
+    tracker_class = TRACKERS[args.tracker_type]
+    if "frame_rate" in inspect.signature(tracker_class).parameters:
+        return tracker_class(args=args, frame_rate=int(round(frame_rate)))
+    # newer ultralytics releases dropped frame_rate: scale the lost-track buffer, counted in frames, instead
+    args.track_buffer = max(1, int(round(args.track_buffer * frame_rate / 30.0)))
+    return tracker_class(args=args)
+
+
+def update_tracker(tracker, result, frame):
+    """
+    Update a tracker with the detections of the next frame, as model.track() does
+
+    :param tracker: tracker of create_tracker()
+    :param result: ultralytics Results of model.predict() on the frame
+    :param frame: BGR frame, used by BoT-SORT's camera motion compensation
+    :return: n x 8 array of x1, y1, x2, y2, id, score, class, detection index
+    """
+    if result.boxes is None or not len(result.boxes):   # as model.track(): no update without detections
+        return np.zeros((0, 8), np.float32)
+    found = np.asarray(tracker.update(result.boxes.cpu().numpy(), frame), dtype=np.float32)
+    return found if len(found) else np.zeros((0, 8), np.float32)
+
+
+def _tracks(tracks):
+    """
+    :param tracks: n x 8 array of update_tracker()
+    :return: (boxes n x 4 xyxy, ids, classes, scores)
+    """
+    return tracks[:, :4], tracks[:, 4].astype(int), tracks[:, 6].astype(int), tracks[:, 5]
+
+
+class KeyframeTracker:
+    """
+    update(frame) for every frame of one video, detector on keyframes and optical flow in between
+    """
+
+    def __init__(self, model, interval=5, scene_threshold=12.0, tracker="bytetrack.yaml", flow_scale=0.5,
+                 features_per_box=20, frame_rate=30.0):
+        """
+        :param model: YOLO model, only used for model.predict()
+        :param interval: frames from one keyframe to the next, 1 detects every frame
+        :param scene_threshold: thumbnail mean absolute difference (0-255) forcing a keyframe, None to disable
+        :param tracker: tracker configuration, a new tracker is created from it for this video
+        :param flow_scale: scale of the grey image the optical flow is computed on
+        :param features_per_box: corner features followed per box
+        :param frame_rate: frame rate of the video; the tracker is created for the keyframe rate
+        """
+        self.model = model
+        self.interval = interval
+        self.scene_threshold = scene_threshold
+        self.tracker = create_tracker(tracker, max(1.0, frame_rate / interval))
+        self.flow_scale = flow_scale
+        self.features_per_box = features_per_box
+        self.index = 0
+        self.keyframes = 0
+        self.detect_time = 0.0
+        self.flow_time = 0.0
+        self._since_keyframe = 0
+        self._keyframe_thumbnail = None
+        self._grey = None
+        self._points = np.zeros((0, 2), np.float32)
+        self._owners = np.zeros(0, int)
+        self._tracks = None
+        self._velocity = None
+
+    def _scene_changed(self, thumbnail):
+        if self.scene_threshold is None or self._keyframe_thumbnail is None:
+            return False
+        return float(cv2.absdiff(thumbnail, self._keyframe_thumbnail).mean()) > self.scene_threshold
+
+    def _pick_features(self, grey, boxes):
+        points, owners = [], []
+        height, width = grey.shape
+        for i, box in enumerate(boxes * self.flow_scale):
+            x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+            x2, y2 = min(width, int(box[2]) + 1), min(height, int(box[3]) + 1)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                continue
+            found = cv2.goodFeaturesToTrack(grey[y1:y2, x1:x2], self.features_per_box, 0.01, 3)
+            if found is not None:
+                points.append(found.reshape(-1, 2) + (x1, y1))
+                owners.extend([i] * len(found))
+        self._points = np.concatenate(points).astype(np.float32) if points else np.zeros((0, 2), np.float32)
+        self._owners = np.array(owners, dtype=int)
+
+    def _propagate(self, grey):
+        boxes = self._tracks[0].copy()
+        if len(self._points):
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._grey, grey, self._points.reshape(-1, 1, 2), None,
+                                                        winSize=(15, 15), maxLevel=2)
+            moved = moved.reshape(-1, 2)
+            good = status.ravel() == 1
+            for i in range(len(boxes)):
+                selected = good & (self._owners == i)
+                if np.count_nonzero(selected) >= 3:
+                    self._velocity[i] = np.median(moved[selected] - self._points[selected], axis=0) / self.flow_scale
+            self._points, self._owners = moved[good], self._owners[good]
+        boxes += np.tile(self._velocity, 2)
+        self._tracks = (boxes,) + self._tracks[1:]
+
+    def update(self, frame):
+        """
+        :param frame: next BGR frame of the video
+        :return: TrackedFrame
+        """
+        follow = self.interval > 1     # with interval 1 every frame is a keyframe, no flow needed
+        thumbnail = small = None
+        if follow:
+            grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            thumbnail = cv2.resize(grey, THUMBNAIL, interpolation=cv2.INTER_AREA)
+            small = cv2.resize(grey, None, fx=self.flow_scale, fy=self.flow_scale, interpolation=cv2.INTER_AREA) \
+                if self.flow_scale != 1.0 else grey
+        keyframe = (not follow or self._tracks is None or self._since_keyframe + 1 >= self.interval
+                    or self._scene_changed(thumbnail))
+        t0 = time.perf_counter()
+        if keyframe:
+            result = self.model.predict(frame, verbose=False)[0]
+            self._tracks = _tracks(update_tracker(self.tracker, result, frame))
+            self._velocity = np.zeros((len(self._tracks[0]), 2), np.float32)
+            if follow:
+                self._pick_features(small, self._tracks[0])
+            self._keyframe_thumbnail = thumbnail
+            self._since_keyframe = 0
+            self.keyframes += 1
+            self.detect_time += time.perf_counter() - t0
+        else:
+            self._propagate(small)
+            self._since_keyframe += 1
+            self.flow_time += time.perf_counter() - t0
+        self._grey = small
+        boxes, ids, classes, scores = self._tracks
+        tracked = TrackedFrame(self.index, keyframe, boxes.copy(), ids, classes, scores)
+        self.index += 1
+        return tracked
+
+
+def draw_tracks(frame, tracked, names):
+    """
+    :param frame: BGR frame, drawn on in place
+    :param tracked: TrackedFrame of the frame
+    :param names: dict of class id -> class name
+    :return: the frame
+    """
+    for box, track_id, cls in zip(tracked.boxes.astype(int), tracked.ids, tracked.classes):
+        color = (0, 255, 0) if tracked.keyframe else (0, 200, 255)
+        cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
+        label = f"{track_id} {names.get(int(cls), cls)}" if track_id >= 0 else f"{names.get(int(cls), cls)}"
+        cv2.putText(frame, label, (box[0], max(12, box[1] - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    return frame
+
+
+def tracked_record(tracked, names):
+    """
+    :param tracked: TrackedFrame
+    :param names: dict of class id -> class name
+    :return: JSON serializable dict of the frame's tracks
+    """
+    return {"frame": tracked.index, "keyframe": tracked.keyframe,
+            "boxes": [[round(float(v), 1) for v in box] + [round(float(score), 4), names.get(int(cls), int(cls))]
+                      for box, score, cls in zip(tracked.boxes, tracked.scores, tracked.classes)],
+            "ids": [int(v) for v in tracked.ids]}
+
+
+def iou_matrix(a, b):
+    """
+    :param a: n x 4 xyxy boxes
+    :param b: m x 4 xyxy boxes
+    :return: n x m intersection over union
+    """
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def compare_tracks(reference, candidate, iou_threshold=0.5):
+    """
+    :param reference: list of TrackedFrame of the every-frame run
+    :param candidate: list of TrackedFrame of the same frames from a keyframe run
+    :param iou_threshold: IoU from which a candidate box matches a reference box
+    :return: dict of recall, mean_iou and id_switches
+    """
+    total = matched = switches = 0
+    iou_sum = 0.0
+    assigned = {}   # reference id -> candidate id it was last matched to
+    for ref, cand in zip(reference, candidate):
+        total += len(ref.boxes)
+        if len(ref.boxes) == 0 or len(cand.boxes) == 0:
+            continue
+        ious = iou_matrix(ref.boxes, cand.boxes)
+        used_ref, used_cand = set(), set()
+        for r, c in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+            if ious[r, c] < iou_threshold:
+                break
+            if r in used_ref or c in used_cand:
+                continue
+            used_ref.add(r)
+            used_cand.add(c)
+            matched += 1
+            iou_sum += ious[r, c]
+            ref_id, cand_id = ref.ids[r], cand.ids[c]
+            if ref_id >= 0 and cand_id >= 0:
+                if assigned.get(ref_id, cand_id) != cand_id:
+                    switches += 1
+                assigned[ref_id] = cand_id
+    return dict(recall=matched / total if total else 1.0, mean_iou=iou_sum / matched if matched else 0.0,
+                id_switches=switches)
+
+
+def run_video(model, source, interval, scene_threshold=12.0, tracker="bytetrack.yaml", max_frames=None):
+    """
+    :param model: YOLO model
+    :param source: video file
+    :param interval: keyframe interval
+    :param scene_threshold: scene change forcing a keyframe, None to disable
+    :param tracker: tracker configuration
+    :param max_frames: stop after this many frames, None for the whole video
+    :return: (list of TrackedFrame, KeyframeTracker, seconds spent tracking)
+    """
+    cap = cv2.VideoCapture(source)
+    keyframe_tracker = KeyframeTracker(model, interval=interval, scene_threshold=scene_threshold, tracker=tracker,
+                                       frame_rate=cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    frames = []
+    elapsed = 0.0
+    try:
+        while max_frames is None or len(frames) < max_frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            t0 = time.perf_counter()
+            frames.append(keyframe_tracker.update(frame))
+            elapsed += time.perf_counter() - t0
+    finally:
+        cap.release()
+    return frames, keyframe_tracker, elapsed
+
+
+def accuracy_report(model, source, intervals, scene_threshold=12.0, tracker="bytetrack.yaml", max_frames=None):
+    """
+    Print throughput and accuracy against detection on every frame for each keyframe interval
+
+    :param model: YOLO model
+    :param source: video file
+    :param intervals: keyframe intervals to compare
+    :param scene_threshold: scene change forcing a keyframe, None to disable
+    :param tracker: tracker configuration
+    :param max_frames: frames of the video used, None for all
+    :return: list of dicts, one per interval
+    """
+    reference, _, reference_time = run_video(model, source, 1, None, tracker, max_frames)
+    reference_fps = len(reference) / max(reference_time, 1e-9)
+    print(f"{source}: {len(reference)} frames, reference (detection on every frame) {reference_fps:.1f} fps")
+    print(f"{'K':>4} {'keyframes':>9} {'fps':>8} {'speedup':>8} {'recall':>7} {'mean IoU':>9} {'ID switches':>12}")
+    rows = []
+    for interval in intervals:
+        frames, keyframe_tracker, elapsed = run_video(model, source, interval, scene_threshold, tracker, max_frames)
+        row = dict(interval=interval, keyframes=keyframe_tracker.keyframes, fps=len(frames) / max(elapsed, 1e-9))
+        row["speedup"] = row["fps"] / reference_fps
+        row.update(compare_tracks(reference, frames))
+        rows.append(row)
+        print(f"{interval:>4} {row['keyframes']:>9} {row['fps']:>8.1f} {row['speedup']:>7.2f}x "
+              f"{row['recall']:>7.3f} {row['mean_iou']:>9.3f} {row['id_switches']:>12}")
+    return rows
@@ -19,54 +19,222 @@ see <https://www.gnu.org/licenses/>.
 
 Adapted from DF Robot RDK X3 documentation
 @sa https://colab.research.google.com/github/d2l-ai/d2l-pytorch-colab/blob/master/chapter_convolutional-modern/googlenet.ipynb
+
+One YOLO model in one process keeps about one core busy. With --workers N
+the image list is cut into chunks of --chunk-size images and N spawned
+processes, each loading the model once with its own share of the torch
+threads, predict them. Results come back in any order and are put back into
+list order before they are printed, written to --output as JSON lines and
+checkpointed. A worker whose peak RSS passes --max-rss-mb finishes its chunk
+and is replaced by a fresh process. --sweep 1,2,4 times the same images with
+each worker count and prints the speedup over the first.
 """
 from ultralytics import YOLO
-import argparse, glob, os
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import time
+
+from src.common.scan import Checkpoint, parse_shard, scan_images, shard
+from yolo11.worker_pool import summarize
+
+
+def _predict_worker(yolo_model, threads, max_rss_mb, tasks, results):
+    """
+    Body of a worker process: load the model once, then predict chunks until a None task
+
+    :param yolo_model: pretrained YOLO model filename
+    :param threads: torch threads of this process
+    :param max_rss_mb: retire after the chunk during which the peak RSS passed this, None for no limit
+    :param tasks: queue of (chunk index, list of image paths)
+    :param results: queue of (chunk index, records, peak RSS in MB, retiring)
+    """
+    import torch
+    torch.set_num_threads(threads)
+    model = YOLO(yolo_model)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, paths = task
+        records = []
+        for path in paths:
+            try:
+                records.append(summarize(model(path, verbose=False)[0]))
+            except Exception as e:  # an unreadable image must not take the chunk down
+                records.append({"path": path, "error": f"{type(e).__name__}: {e}"})
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0    # KiB on Linux
+        retiring = max_rss_mb is not None and rss_mb > max_rss_mb
+        results.put((index, records, rss_mb, retiring))
+        if retiring:
+            return
 
-def list_image_files(folder):
+
+class ShardedPredictor:
+    """
+    Worker processes that each hold one YOLO model, results returned in input order
     """
-    Lists all image files within a given folder.
 
-    Args:
-      folder: The path to the directory containing the images.
+    def __init__(self, yolo_model, workers, chunk_size=8, threads=None, max_rss_mb=None):
+        """
+        :param yolo_model: pretrained YOLO model filename
+        :param workers: number of processes
+        :param chunk_size: images per task handed to a worker
+        :param threads: torch threads per worker, default the cores divided among the workers
+        :param max_rss_mb: peak RSS after which a worker is replaced, None for no limit
+        """
+        self.yolo_model = yolo_model
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.max_rss_mb = max_rss_mb
+        self.peak_rss_mb = 0.0
+        self.recycled = 0
+
+    def predict(self, paths):
+        """
+        :param paths: list of image paths
+        :return: generator of summarize() records, or dicts with an "error", in the order of paths
+        """
+        context = multiprocessing.get_context("spawn")
+        tasks, results = context.Queue(), context.Queue()
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        for task in enumerate(chunks):
+            tasks.put(task)
+
+        def start():
+            process = context.Process(target=_predict_worker, daemon=True,
+                                      args=(self.yolo_model, self.threads, self.max_rss_mb, tasks, results))
+            process.start()
+            return process
 
-    Returns:
-      A list of strings, where each string is the full path to an image file.
+        processes = [start() for _ in range(min(self.workers, len(chunks)))]
+        pending = {}
+        try:
+            for index in range(len(chunks)):
+                while index not in pending:
+                    try:
+                        done, records, rss_mb, retiring = results.get(timeout=1.0)
+                    except queue.Empty:
+                        failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+                        if failed:
+                            raise RuntimeError(f"worker process exited with status {failed[0]}")
+                        continue
+                    pending[done] = records
+                    self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+                    if retiring:
+                        self.recycled += 1
+                        processes.append(start())
+                yield from pending.pop(index)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    tasks.put(None)
+            for process in processes:
+                process.join(timeout=5.0)
+                if process.is_alive():
+                    process.terminate()
+
+
+def sweep(paths, yolo_model, worker_counts, chunk_size=8, max_rss_mb=None):
     """
-    image_extensions = [".jpg", ".jpeg", ".png", ".gif", ".bmp"]  # what extensions have I missed?
-    image_files = []
+    Time the same images with each number of workers
 
-    for ext in image_extensions:
-        image_files.extend(glob.glob(os.path.join(folder, f"*{ext}")))
+    :param paths: list of image paths
+    :param yolo_model: pretrained YOLO model filename
+    :param worker_counts: list of worker counts, the speedup is relative to the first
+    :param chunk_size: images per task
+    :param max_rss_mb: peak RSS after which a worker is replaced
+    """
+    print(f"{'workers':>7} {'threads':>7} {'seconds':>8} {'images/s':>9} {'speedup':>8} {'peak rss MB':>12}")
+    baseline = None
+    for workers in worker_counts:
+        predictor = ShardedPredictor(yolo_model, workers, chunk_size=chunk_size, max_rss_mb=max_rss_mb)
+        t0 = time.perf_counter()
+        count = sum(1 for _ in predictor.predict(paths))
+        elapsed = time.perf_counter() - t0
+        rate = count / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>7} {predictor.threads:>7} {elapsed:>8.2f} {rate:>9.2f} {rate / baseline:>7.2f}x "
+              f"{predictor.peak_rss_mb:>12.0f}")
 
-    return image_files
 
-def predict_folder(folder, yolo_model):
+def predict_folder(folder, yolo_model, recursive=True, shard_of=None, checkpoint=None, workers=0, chunk_size=8,
+                   threads=None, max_rss_mb=None, output=None, restart=False):
     """
     Use YOLO Predict mode to detect objects in images in a specified folder using a specified YOLO pretrained model
 
     :param folder: all images in this folder will be used for the detection task
     :param yolo_model:  pretrained YOLO model filename
+    :param recursive: include the images of sub-folders
+    :param shard_of: (index, count) to process only every count-th image, e.g. one of several processes
+    :param checkpoint: progress file; a rerun resumes after the images already finished
+    :param workers: number of worker processes, 0 to predict in this process and show every result
+    :param chunk_size: images per task handed to a worker
+    :param threads: torch threads per worker
+    :param max_rss_mb: peak RSS after which a worker is replaced
+    :param output: optional JSON lines file of the per-image records, in folder order
+    :param restart: start over even when the checkpoint says the images were done
     :return:
     """
+    all_images = scan_images(folder, recursive=recursive)
+    if shard_of is not None:
+        all_images = shard(all_images, *shard_of)
+    progress = Checkpoint(checkpoint, restart=restart) if checkpoint else None
+    if progress is not None:
+        all_images = progress.resume(all_images)
+    all_images = list(all_images)
+    print(f"Collected {len(all_images)} images in {folder}")
+    if not all_images:
+        return
+    out = open(output, "a" if progress is not None and progress.done else "w") if output else None
+    try:
+        if workers > 0:
+            predictor = ShardedPredictor(yolo_model, workers, chunk_size=chunk_size, threads=threads,
+                                         max_rss_mb=max_rss_mb)
+            print(f"Using model file {yolo_model} in {workers} processes of {predictor.threads} threads")
+            t0 = time.perf_counter()
+            for record in predictor.predict(all_images):
+                if "error" in record:
+                    print(f"{record['path']}: {record['error']}")
+                else:
+                    print(f"{record['path']}: {len(record.get('boxes', []))} objects")
+                if out is not None:
+                    out.write(json.dumps(record) + "\n")
+                if progress is not None:
+                    progress.mark(record["path"])
+            elapsed = time.perf_counter() - t0
+            print(f"{len(all_images)} images in {elapsed:.2f} s, {len(all_images) / elapsed:.2f} images/s, "
+                  f"peak worker RSS {predictor.peak_rss_mb:.0f} MB, {predictor.recycled} workers replaced")
+        else:
                                             # Load a model
-    print(f"Using model file {yolo_model}")
-    model = YOLO(yolo_model)                # pretrained YOLO11n model
+            print(f"Using model file {yolo_model}")
+            model = YOLO(yolo_model)                # pretrained YOLO11n model
 
                                             # Run batched inference on a list of images
-    all_images = list_image_files(folder)
-    print(f"Collected all images in {folder}")
-    results = model(all_images, stream=True)    # return a list of Results objects
+            results = model(all_images, stream=True)    # return a list of Results objects
 
                                             # Process results list
-    for result in results:
-        boxes = result.boxes                # Boxes object for bounding box outputs
-        masks = result.masks                # Masks object for segmentation masks outputs
-        keypoints = result.keypoints        # Keypoints object for pose outputs
-        probs = result.probs                # Probs object for classification outputs
-        obb = result.obb                    # Oriented boxes object for OBB outputs
-        result.show()                       # display to screen
-        result.save(filename="result.jpg")  # save to disk
+            for result in results:
+                boxes = result.boxes                # Boxes object for bounding box outputs
+                masks = result.masks                # Masks object for segmentation masks outputs
+                keypoints = result.keypoints        # Keypoints object for pose outputs
+                probs = result.probs                # Probs object for classification outputs
+                obb = result.obb                    # Oriented boxes object for OBB outputs
+                result.show()                       # display to screen
+                result.save(filename="result.jpg")  # save to disk
+                if out is not None:
+                    out.write(json.dumps(summarize(result)) + "\n")
+                if progress is not None:
+                    progress.mark(result.path)
+    finally:
+        if out is not None:
+            out.close()
+    if progress is not None:
+        progress.save(complete=True)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Test YOLO11 Predict mode with all image files in a folder")
@@ -74,7 +242,32 @@ if __name__ == '__main__':
                         default="/home/sunrise/PycharmProjects/d-robotics/images")
     parser.add_argument("model_file", type=str, nargs="?", help="Model filename",
                         default="yolo11n.pt")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false",
+                        help="Only use the images directly in the folder")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="index/count: use only every count-th image, e.g. 0/4 .. 3/4 in four processes")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="Progress file; an interrupted run started again resumes where it stopped")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the checkpoint and predict every image again")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes each holding a model; 0 predicts here and shows the results")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Images per task handed to a worker")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads per worker, default the cores divided among the workers")
+    parser.add_argument("--max-rss-mb", type=float, default=None,
+                        help="Replace a worker once its peak resident memory passes this")
+    parser.add_argument("--output", type=str, default=None, help="JSON lines file of the per-image results")
+    parser.add_argument("--sweep", type=str, default=None,
+                        help="Comma separated worker counts to time on the images, e.g. 1,2,4")
     args = parser.parse_args()
     image_folder = args.image_folder
     model_file = args.model_file
-    predict_folder(image_folder, model_file)
+    if args.sweep:
+        images = list(scan_images(image_folder, recursive=args.recursive))
+        sweep(images, model_file, [int(v) for v in args.sweep.split(",")], chunk_size=args.chunk_size,
+              max_rss_mb=args.max_rss_mb)
+    else:
+        predict_folder(image_folder, model_file, recursive=args.recursive, shard_of=args.shard,
+                       checkpoint=args.checkpoint, workers=args.workers, chunk_size=args.chunk_size,
+                       threads=args.threads, max_rss_mb=args.max_rss_mb, output=args.output, restart=args.restart)
@@ -19,40 +19,242 @@ see <https://www.gnu.org/licenses/>.
 
 Adapted from DF Robot RDK X3 documentation
 @sa https://colab.research.google.com/github/d2l-ai/d2l-pytorch-colab/blob/master/chapter_convolutional-modern/googlenet.ipynb
+
+Decoding, inference and drawing/display each run on their own thread: a
+decode thread fills a small ring buffer, the main thread runs the model and
+hands the results to a render thread through a second buffer. The frame rate
+is then set by the slowest of the three instead of their sum. OpenCV windows
+belong to the main thread, so the render thread only draws: it leaves the
+newest annotated frame in a one-frame buffer that the main thread shows
+between two inferences. A failing render thread stops the run and its error
+is raised again in the main thread. --drop chooses what a full buffer does:
+"block" processes every frame of a file, "drop-oldest" keeps a live source
+current. The closing report gives the achieved FPS, the drops and the time
+per stage, naming the limiting one.
+
+On a headless unit --no-show with --output writes the annotated video on an
+encoder thread, and --metadata writes the detections as JSON lines; with
+--no-draw only the metadata is written and no frame is drawn or encoded.
 """
+import argparse
+import threading
+import time
+
 import cv2
 
 from ultralytics import YOLO
 
-# Load the YOLO model
-model = YOLO("yolo11n.pt")
+from src.common.metrics import Metrics
+from src.common.ring_buffer import POLICIES, RingBuffer
+from yolo11.video_writer import AnnotatedVideoWriter, MetadataWriter
+
+# stages on their own thread, the slowest one bounds the frame rate
+THREAD_STAGES = {"decode": ["decode"], "inference": ["inference", "display"], "render": ["render"],
+                 "encode": ["encode"]}
+
+
+def decode(cap, frames, metrics, stop):
+    """
+    Decode thread: read frames into the ring buffer until the end of the video or a stop
+
+    :param cap: opened cv2.VideoCapture
+    :param frames: RingBuffer receiving (frame index, BGR frame)
+    :param metrics: Metrics recording the "decode" stage
+    :param stop: threading.Event ending the decoding early
+    """
+    index = 0
+    try:
+        while not stop.is_set():
+            with metrics.span("decode"):
+                success, frame = cap.read()
+            if not success:     # end of the video
+                break
+            frames.put((index, frame))
+            index += 1
+    finally:
+        frames.close()
+
 
-# Open the video file
-video_path = "../videos/train_sh78_01.mp4"
-cap = cv2.VideoCapture(video_path)
+def render(frames, annotated, metrics, stop, writer=None, metadata=None, fps=30.0, display=None, errors=None):
+    """
+    Render thread: draw the results onto their frame and hand it to the outputs
 
-# Loop through the video frames
-while cap.isOpened():
-    # Read a frame from the video
-    success, frame = cap.read()
+    Whatever ends it, the thread sets stop and closes both buffers, so neither
+    the decoder nor the main thread waits on it forever.
 
-    if success:
-        # Run YOLO inference on the frame
-        results = model(frame)
+    :param frames: RingBuffer between decoding and inference, closed on exit
+    :param annotated: RingBuffer of (frame index, results)
+    :param metrics: Metrics recording the "render" stage and its "plot" and "metadata" parts
+    :param stop: threading.Event ending the run, set on exit
+    :param writer: optional AnnotatedVideoWriter of the annotated frames
+    :param metadata: optional MetadataWriter of the detections
+    :param fps: frame rate of the video, for the metadata timestamps
+    :param display: optional RingBuffer receiving the annotated frames the main thread shows
+    :param errors: list receiving the exception that ended the thread
+    """
+    draw = display is not None or writer is not None
+    try:
+        while True:
+            item = annotated.get()
+            if item is None:
+                return
+            index, results = item
+            with metrics.span("render"):
+                if metadata is not None:
+                    with metrics.span("metadata"):
+                        metadata.write(index, results[0], timestamp=index / fps)
+                if not draw:
+                    continue
+                # Visualize the results on the frame
+                with metrics.span("plot"):
+                    annotated_frame = results[0].plot()
+                if writer is not None:
+                    writer.write(annotated_frame, index)
+                if display is not None:
+                    display.put(annotated_frame)
+    except Exception as e:
+        if errors is not None:
+            errors.append(e)
+        raise
+    finally:
+        stop.set()
+        frames.close()
+        annotated.close()
+        if display is not None:
+            display.close()
 
-        # Visualize the results on the frame
-        annotated_frame = results[0].plot()
 
-        # Display the annotated frame
-        cv2.imshow("YOLO Inference", annotated_frame)
+def show_frame(display, metrics, stop):
+    """
+    Show the newest annotated frame, if any, on the main thread
 
-        # Break the loop if 'q' is pressed
+    :param display: RingBuffer of annotated frames filled by render()
+    :param metrics: Metrics recording the "display" stage
+    :param stop: threading.Event set when 'q' is pressed
+    """
+    frame = display.get(timeout=0)
+    if frame is None:
+        return
+    # Display the annotated frame, break the loop if 'q' is pressed
+    with metrics.span("display"):
+        cv2.imshow("YOLO Inference", frame)
         if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-    else:
-        # Break the loop if the end of the video is reached
-        break
-
-# Release the video capture object and close the display window
-cap.release()
-cv2.destroyAllWindows()
+            stop.set()
+
+
+def report(metrics, elapsed, frames, annotated, writer=None):
+    """
+    Print the achieved frame rate, the drops and the time per stage
+
+    :param metrics: Metrics of the run
+    :param elapsed: seconds from the first decoded frame to the last rendered one
+    :param frames: RingBuffer between decoding and inference
+    :param annotated: RingBuffer between inference and rendering
+    :param writer: AnnotatedVideoWriter of the run, if any
+    """
+    counts = metrics.counts
+    rendered = counts["render"]
+    print(f"{rendered} frames rendered in {elapsed:.1f} s: {rendered / elapsed:.1f} fps "
+          f"(decoded {frames.put_count}, inferred {counts['inference']}, dropped {frames.dropped} before "
+          f"inference and {annotated.dropped} before rendering)")
+    if writer is not None:
+        print(f"{writer.frames} frames encoded to {', '.join(writer.files)}, {writer.dropped} dropped")
+    print(metrics.report())
+    summary = metrics.summary()
+    per_thread = {thread: sum(summary[stage]["mean_ms"] for stage in stages if stage in summary)
+                  for thread, stages in THREAD_STAGES.items()}
+    limiting = max(per_thread, key=per_thread.get)
+    print("per frame: " + ", ".join(f"{thread} {ms:.1f} ms" for thread, ms in per_thread.items())
+          + f"; limited by {limiting} (at most {1000.0 / max(per_thread[limiting], 1e-6):.1f} fps)")
+
+
+def stream(video_path, yolo_model, buffer_size=4, policy="block", show=True, output=None, fourcc="mp4v",
+           segment_seconds=None, metadata_path=None, draw=True):
+    """
+    Run YOLO on a video with decoding, inference and rendering on separate threads
+
+    :param video_path: video file, or anything else cv2.VideoCapture opens
+    :param yolo_model: pretrained YOLO model filename
+    :param buffer_size: frames held between two threads
+    :param policy: drop policy of the buffers, one of ring_buffer.POLICIES
+    :param show: display the annotated frames in a window
+    :param output: optional annotated video file
+    :param fourcc: codec of the annotated video
+    :param segment_seconds: start a new output file every this many seconds
+    :param metadata_path: optional JSON lines file of the detections
+    :param draw: draw the frames; False writes only the metadata
+    :return: the Metrics of the run
+    """
+    # Load the YOLO model
+    model = YOLO(yolo_model)
+    # Open the video file
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    metrics = Metrics()
+    writer = AnnotatedVideoWriter(output, fps=fps, fourcc=fourcc, buffers=buffer_size, policy=policy,
+                                  segment_seconds=segment_seconds, metrics=metrics) if output and draw else None
+    metadata = MetadataWriter(metadata_path, source=video_path) if metadata_path else None
+    stop = threading.Event()
+    frames = RingBuffer(buffer_size, policy)
+    annotated = RingBuffer(buffer_size, policy)
+    display = RingBuffer(1, "drop-oldest") if show and draw else None    # the window shows the newest frame
+    errors = []
+    decoder = threading.Thread(target=decode, args=(cap, frames, metrics, stop), name="decode", daemon=True)
+    renderer = threading.Thread(target=render, args=(frames, annotated, metrics, stop, writer, metadata, fps,
+                                                     display, errors), name="render", daemon=True)
+    t0 = time.perf_counter()
+    decoder.start()
+    renderer.start()
+    try:
+        # Loop through the video frames
+        while not stop.is_set():
+            with metrics.span("inference.wait"):    # long waits: decoding is the bottleneck
+                item = frames.get()
+            if item is None:
+                break
+            index, frame = item
+            # Run YOLO inference on the frame
+            with metrics.span("inference"):
+                results = model(frame, verbose=False)
+            annotated.put((index, results))
+            if display is not None:
+                show_frame(display, metrics, stop)
+    finally:
+        stop.set()
+        frames.close()
+        annotated.close()
+        renderer.join()
+        decoder.join()
+        if writer is not None:
+            writer.close()
+        if metadata is not None:
+            metadata.close()
+        elapsed = time.perf_counter() - t0
+        # Release the video capture object and close the display window
+        cap.release()
+        if display is not None:
+            cv2.destroyAllWindows()
+    if errors:
+        raise errors[0]
+    report(metrics, elapsed, frames, annotated, writer)
+    return metrics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="YOLO11 on a video with threaded decoding and rendering")
+    parser.add_argument("video", type=str, nargs="?", help="Video file", default="../videos/train_sh78_01.mp4")
+    parser.add_argument("--model", type=str, default="yolo11n.pt", help="Model filename")
+    parser.add_argument("--buffer", type=int, default=4, help="Frames held between two threads")
+    parser.add_argument("--drop", choices=POLICIES, default="block",
+                        help="What a full buffer does: block the producer, or drop the oldest or newest frame")
+    parser.add_argument("--no-show", dest="show", action="store_false", help="Do not open a display window")
+    parser.add_argument("--output", type=str, default=None, help="Annotated video file written")
+    parser.add_argument("--fourcc", type=str, default="mp4v", help="Codec of the output, e.g. mp4v or MJPG")
+    parser.add_argument("--segment-seconds", type=float, default=None,
+                        help="Start a new numbered output file every this many seconds of video")
+    parser.add_argument("--metadata", type=str, default=None, help="JSON lines file of the detections per frame")
+    parser.add_argument("--no-draw", dest="draw", action="store_false",
+                        help="Write only the metadata, without drawing or encoding frames")
+    args = parser.parse_args()
+    stream(args.video, args.model, buffer_size=args.buffer, policy=args.drop, show=args.show, output=args.output,
+           fourcc=args.fourcc, segment_seconds=args.segment_seconds, metadata_path=args.metadata, draw=args.draw)
@@ -19,19 +19,38 @@ see <https://www.gnu.org/licenses/>.
 
 Adapted from DF Robot RDK X3 documentation
 @sa https://colab.research.google.com/github/d2l-ai/d2l-pytorch-colab/blob/master/chapter_convolutional-modern/googlenet.ipynb
+
+Each worker of the pool holds its own YOLO instance, loaded and warmed up
+once, so requests from any thread are answered in steady-state time.
 """
+import argparse
+import time
 from threading import Thread
 
-from ultralytics import YOLO
+from yolo11.worker_pool import WorkerPool
 
 
-def thread_safe_predict(model, image_path):
-    """Performs thread-safe prediction on an image using a locally instantiated YOLO model."""
-    model = YOLO(model)
-    results = model.predict(image_path)
+def thread_safe_predict(pool, image_path):
+    """Performs thread-safe prediction on an image using a model instance owned by a pool worker."""
+    t0 = time.perf_counter()
+    results = pool.predict(image_path)
     # Process results
-
-
-# Starting threads that each have their own model instance
-Thread(target=thread_safe_predict, args=("yolo11n.pt", "../images/tram_dallas.jpg")).start()
-Thread(target=thread_safe_predict, args=("yolo11n.pt", "../images/tram_houston.jpg")).start()
\ No newline at end of file
+    print(f"{image_path}: {len(results[0].boxes)} objects in {(time.perf_counter() - t0) * 1000.0:.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Predict images from several threads with a pool of YOLO workers")
+    parser.add_argument("images", type=str, nargs="*", help="Image files",
+                        default=["../images/tram_dallas.jpg", "../images/tram_houston.jpg"])
+    parser.add_argument("--model", type=str, default="yolo11n.pt", help="Model filename")
+    parser.add_argument("--workers", type=int, default=2, help="Workers, each with its own model instance")
+    args = parser.parse_args()
+
+    with WorkerPool(args.model, workers=args.workers) as pool:
+        print(f"workers ready: load {max(pool.load_seconds):.2f} s, warm-up {max(pool.warmup_seconds):.2f} s")
+        # Starting threads that share the pool's model instances
+        threads = [Thread(target=thread_safe_predict, args=(pool, image)) for image in args.images]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -19,15 +19,200 @@ see <https://www.gnu.org/licenses/>.
 
 Adapted from DF Robot RDK X3 documentation
 @sa https://colab.research.google.com/github/d2l-ai/d2l-pytorch-colab/blob/master/chapter_convolutional-modern/googlenet.ipynb
+
+show=True needs a display. Headless, --output writes each annotated video
+through an encoder thread and --metadata the tracks per frame as JSON lines;
+with --no-draw only the metadata is written.
+
+--keyframe-interval K runs the detector on every K-th frame (and on scene
+changes) and follows the tracks with optical flow in between, see
+keyframe_tracking.py; --accuracy-report 2,5,10 measures what that costs in
+accuracy against detection on every frame.
+
+--concurrent tracks all the videos at once over --workers shared models,
+each video with its own tracker, see tracking_service.py.
 """
+import argparse
+import os
+import time
+
+import cv2
 from ultralytics import YOLO
 
-# Load an official or custom model
-model = YOLO("yolo11n.pt")  # Load an official Detect model
-model = YOLO("yolo11n-seg.pt")  # Load an official Segment model
-model = YOLO("yolo11n-pose.pt")  # Load an official Pose model
-# model = YOLO("path/to/best.pt")  # Load a custom trained model
+from yolo11.keyframe_tracking import KeyframeTracker, accuracy_report, draw_tracks, tracked_record
+from yolo11.tracking_service import TrackedSource, TrackingService
+from yolo11.video_writer import AnnotatedVideoWriter, MetadataWriter
+from yolo11.worker_pool import WorkerPool
+
+
+def output_path(pattern, source):
+    """
+    :param pattern: output file name where {name} stands for the video name without extension, or None
+    :param source: video file
+    :return: file name for this video, or None
+    """
+    if pattern is None:
+        return None
+    return pattern.format(name=os.path.splitext(os.path.basename(str(source)))[0])
+
+
+def track(model, source, tracker="botsort.yaml", show=False, output=None, fourcc="mp4v", segment_seconds=None,
+          metadata_path=None, draw=True):
+    """
+    Track the objects of one video
+
+    :param model: YOLO model
+    :param source: video file or stream
+    :param tracker: tracker configuration, e.g. botsort.yaml or bytetrack.yaml
+    :param show: display the annotated frames
+    :param output: optional annotated video file
+    :param fourcc: codec of the annotated video
+    :param segment_seconds: start a new output file every this many seconds
+    :param metadata_path: optional JSON lines file of the tracks per frame
+    :param draw: draw the frames; False writes only the metadata
+    :return: number of frames tracked
+    """
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    writer = AnnotatedVideoWriter(output, fps=fps, fourcc=fourcc, segment_seconds=segment_seconds) \
+        if output and draw else None
+    metadata = MetadataWriter(metadata_path, source=str(source)) if metadata_path else None
+    frames = 0
+    t0 = time.perf_counter()
+    try:
+        # Perform tracking with the model, one frame at a time
+        for index, result in enumerate(model.track(source, show=show and draw, tracker=tracker, stream=True,
+                                                    verbose=False)):
+            if metadata is not None:
+                metadata.write(index, result, timestamp=index / fps)
+            if writer is not None:
+                writer.write(result.plot(), index)
+            frames += 1
+    finally:
+        if writer is not None:
+            writer.close()
+        if metadata is not None:
+            metadata.close()
+    elapsed = time.perf_counter() - t0
+    print(f"{source}: {frames} frames in {elapsed:.1f} s, {frames / max(elapsed, 1e-9):.1f} fps")
+    return frames
+
+
+def track_keyframes(model, source, interval, scene_threshold=12.0, tracker="bytetrack.yaml", output=None,
+                    fourcc="mp4v", segment_seconds=None, metadata_path=None, draw=True):
+    """
+    Track the objects of one video with the detector on keyframes only
+
+    :param model: YOLO model
+    :param source: video file or stream
+    :param interval: frames from one keyframe to the next
+    :param scene_threshold: thumbnail difference forcing a keyframe, None to disable
+    :param tracker: tracker configuration, e.g. botsort.yaml or bytetrack.yaml
+    :param output: optional annotated video file, keyframe boxes green and followed ones orange
+    :param fourcc: codec of the annotated video
+    :param segment_seconds: start a new output file every this many seconds
+    :param metadata_path: optional JSON lines file of the tracks per frame
+    :param draw: draw the frames; False writes only the metadata
+    :return: number of frames tracked
+    """
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    writer = AnnotatedVideoWriter(output, fps=fps, fourcc=fourcc, segment_seconds=segment_seconds) \
+        if output and draw else None
+    metadata = MetadataWriter(metadata_path, source=str(source)) if metadata_path else None
+    keyframe_tracker = KeyframeTracker(model, interval=interval, scene_threshold=scene_threshold, tracker=tracker,
+                                       frame_rate=fps)
+    t0 = time.perf_counter()
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            tracked = keyframe_tracker.update(frame)
+            if metadata is not None:
+                metadata.write_record(tracked_record(tracked, model.names), timestamp=tracked.index / fps)
+            if writer is not None:
+                writer.write(draw_tracks(frame, tracked, model.names), tracked.index)
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.close()
+        if metadata is not None:
+            metadata.close()
+    elapsed = time.perf_counter() - t0
+    frames = keyframe_tracker.index
+    print(f"{source}: {frames} frames, {keyframe_tracker.keyframes} keyframes in {elapsed:.1f} s, "
+          f"{frames / max(elapsed, 1e-9):.1f} fps (detection {keyframe_tracker.detect_time:.1f} s, "
+          f"optical flow {keyframe_tracker.flow_time:.1f} s)")
+    return frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="YOLO11 object tracking in videos")
+    parser.add_argument("videos", type=str, nargs="*", help="Video files",
+                        default=["../videos/train_sh78_01.mp4", "../videos/train_sh78_02.mp4"])
+    # an official Detect model, yolo11n-seg.pt (Segment), yolo11n-pose.pt (Pose) or a custom trained model
+    parser.add_argument("--model", type=str, default="yolo11n.pt", help="Model filename")
+    parser.add_argument("--tracker", type=str, default="botsort.yaml",
+                        help="Tracker configuration, botsort.yaml (default tracker) or bytetrack.yaml")
+    parser.add_argument("--show", action="store_true", help="Display the annotated frames")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Annotated video file per video, {name} is replaced by the video name, "
+                             "e.g. {name}_tracks.mp4")
+    parser.add_argument("--fourcc", type=str, default="mp4v", help="Codec of the output, e.g. mp4v or MJPG")
+    parser.add_argument("--segment-seconds", type=float, default=None,
+                        help="Start a new numbered output file every this many seconds of video")
+    parser.add_argument("--metadata", type=str, default=None,
+                        help="JSON lines file of the tracks per video, {name} is replaced by the video name")
+    parser.add_argument("--no-draw", dest="draw", action="store_false",
+                        help="Write only the metadata, without drawing or encoding frames")
+    parser.add_argument("--keyframe-interval", type=int, default=1,
+                        help="Run the detector every this many frames and follow the tracks in between")
+    parser.add_argument("--scene-threshold", type=float, default=12.0,
+                        help="Mean grey level change (0-255) that forces a keyframe, 0 to disable")
+    parser.add_argument("--accuracy-report", type=str, default=None,
+                        help="Comma separated keyframe intervals to compare with detection on every frame")
+    parser.add_argument("--max-frames", type=int, default=None, help="Frames per video used by the report")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Track all videos at the same time over a shared pool of model workers")
+    parser.add_argument("--workers", type=int, default=2, help="Model workers shared by the concurrent videos")
+    parser.add_argument("--in-flight", type=int, default=1, help="Frames of one video at most in the workers")
+    parser.add_argument("--live", action="store_true",
+                        help="Drop the oldest frames of a video that is faster than its share of the workers")
+    args = parser.parse_args()
+    scene_threshold = args.scene_threshold or None
+    for option, pattern in [("--output", args.output), ("--metadata", args.metadata)]:
+        if pattern is not None and len({output_path(pattern, video) for video in args.videos}) < len(args.videos):
+            parser.error(f"{option} {pattern} gives several videos the same file, "
+                         f"put {{name}} in it and use videos with distinct file names")
+
+    if args.concurrent:
+        if args.show:
+            parser.error("--show is not supported with --concurrent, write the videos with --output")
+        if args.keyframe_interval > 1 or args.accuracy_report:
+            parser.error("--keyframe-interval and --accuracy-report are not supported with --concurrent")
+        sources = [TrackedSource(video, tracker=args.tracker, policy="drop-oldest" if args.live else "block",
+                                 metadata_path=output_path(args.metadata, video),
+                                 output=output_path(args.output, video) if args.draw else None, fourcc=args.fourcc,
+                                 segment_seconds=args.segment_seconds)
+                   for video in args.videos]
+        with WorkerPool(args.model, workers=args.workers) as pool:
+            TrackingService(pool, sources, in_flight=args.in_flight).run()
+        raise SystemExit(0)
 
-# Perform tracking with the model
-results = model.track("../videos/train_sh78_01.mp4", show=True, stream=True)  # Tracking with default tracker
-results = model.track("../videos/train_sh78_02.mp4", show=True, tracker="bytetrack.yaml", stream=True)  # with ByteTrack
\ No newline at end of file
+    # Load an official or custom model
+    model = YOLO(args.model)
+    for video in args.videos:
+        if args.accuracy_report:
+            accuracy_report(model, video, [int(v) for v in args.accuracy_report.split(",")],
+                            scene_threshold=scene_threshold, tracker=args.tracker, max_frames=args.max_frames)
+        elif args.keyframe_interval > 1:
+            track_keyframes(model, video, args.keyframe_interval, scene_threshold=scene_threshold,
+                            tracker=args.tracker, output=output_path(args.output, video), fourcc=args.fourcc,
+                            segment_seconds=args.segment_seconds, metadata_path=output_path(args.metadata, video),
+                            draw=args.draw)
+        else:
+            track(model, video, tracker=args.tracker, show=args.show, output=output_path(args.output, video),
+                  fourcc=args.fourcc, segment_seconds=args.segment_seconds,
+                  metadata_path=output_path(args.metadata, video), draw=args.draw)
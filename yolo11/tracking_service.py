@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+tracking_service.py
+Concurrent object tracking of several videos over one shared pool of YOLO workers
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+model.track() keeps the tracker inside the model, so one model can follow
+one video at a time. Here detection and tracking are split: the YOLO models
+live in a WorkerPool shared by all sources, and every source has its own
+ByteTrack/BoT-SORT instance, updated in frame order with the detections of
+its frames.
+
+Every source decodes on its own thread into a small RingBuffer. The
+scheduler hands frames to the pool round robin, one frame per source per
+turn and at most `in_flight` outstanding frames per source, starting each
+turn with the next source. A 60 fps camera therefore gets the same share of
+the workers as a 10 fps one instead of filling the queue; with the
+"drop-oldest" policy its surplus frames are dropped at its own buffer.
+
+Each source writes its own track stream (JSON lines, optionally an annotated
+video); the report gives per-source and aggregate throughput and latency.
+"""
+
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+from src.common.metrics import Metrics
+from src.common.ring_buffer import RingBuffer
+from yolo11.keyframe_tracking import TrackedFrame, create_tracker, draw_tracks, tracked_record, update_tracker
+from yolo11.streaming import decode
+from yolo11.video_writer import AnnotatedVideoWriter, MetadataWriter
+
+
+class TrackedSource:
+    """
+    One video or camera with its decoder thread, tracker and outputs
+    """
+
+    def __init__(self, path, tracker="bytetrack.yaml", buffer_size=4, policy="block", metadata_path=None,
+                 output=None, fourcc="mp4v", segment_seconds=None, name=None):
+        """
+        :param path: video file or anything else cv2.VideoCapture opens
+        :param tracker: tracker configuration
+        :param buffer_size: decoded frames held for the scheduler
+        :param policy: drop policy of the buffer, "drop-oldest" for live sources
+        :param metadata_path: optional JSON lines file of the tracks per frame
+        :param output: optional annotated video file
+        :param fourcc: codec of the annotated video
+        :param segment_seconds: start a new output file every this many seconds
+        :param name: short name in the report, default the file name without extension
+        """
+        self.path = path
+        self.name = name or os.path.splitext(os.path.basename(str(path)))[0]
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.tracker = create_tracker(tracker, self.fps)
+        self.frames = RingBuffer(buffer_size, policy)
+        self.metadata = MetadataWriter(metadata_path, source=str(path)) if metadata_path else None
+        self.writer = AnnotatedVideoWriter(output, fps=self.fps, fourcc=fourcc, policy=policy,
+                                           segment_seconds=segment_seconds) if output else None
+        self.pending = collections.deque()      # (frame index, frame, submit time, future) in frame order
+        self.tracked = 0
+        self.finished = False
+        self.started = None
+        self.elapsed = 0.0
+        self._decoder = None
+
+    def start(self, metrics, stop):
+        """
+        :param metrics: Metrics recording the "decode" stage
+        :param stop: threading.Event ending the decoding
+        """
+        self.started = time.perf_counter()
+        self._decoder = threading.Thread(target=decode, args=(self.cap, self.frames, metrics, stop),
+                                         name=f"decode-{self.name}", daemon=True)
+        self._decoder.start()
+
+    def exhausted(self):
+        """
+        :return: True when the decoder has ended and every frame was tracked
+        """
+        return self.frames.closed and len(self.frames) == 0 and not self.pending
+
+    def track(self, index, frame, result):
+        """
+        Update the tracker with the detections of the next frame and write the outputs
+
+        :param index: frame number
+        :param frame: BGR frame
+        :param result: ultralytics Results of the frame
+        :return: TrackedFrame
+        """
+        tracks = update_tracker(self.tracker, result, frame)
+        tracked = TrackedFrame(index, True, tracks[:, :4], tracks[:, 4].astype(int), tracks[:, 6].astype(int),
+                               tracks[:, 5])
+        if self.metadata is not None:
+            self.metadata.write_record(tracked_record(tracked, result.names), timestamp=index / self.fps)
+        if self.writer is not None:
+            self.writer.write(draw_tracks(frame, tracked, result.names), index)
+        self.tracked += 1
+        return tracked
+
+    def close(self):
+        self.elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        self.frames.close()
+        if self._decoder is not None:
+            self._decoder.join()
+        self.cap.release()
+        if self.writer is not None:
+            self.writer.close()
+        if self.metadata is not None:
+            self.metadata.close()
+
+
+class TrackingService:
+    """
+    Fair scheduling of the frames of several TrackedSource over one WorkerPool
+    """
+
+    def __init__(self, pool, sources, in_flight=1, predict_args=None):
+        """
+        :param pool: started WorkerPool in thread mode, its results must be Results objects
+        :param sources: list of TrackedSource, sources sharing a name are renamed <name>-<index in the list>
+        :param in_flight: frames of one source at most in the pool at a time
+        :param predict_args: keyword arguments of every predict request, e.g. dict(conf=0.3)
+        """
+        if pool.processes:
+            raise ValueError("TrackingService needs the Results objects of a thread WorkerPool")
+        self.pool = pool
+        self.sources = sources
+        names = collections.Counter(source.name for source in sources)
+        for i, source in enumerate(sources):
+            if names[source.name] > 1:     # a/cam.mp4 and b/cam.mp4 would share their latency series
+                source.name = f"{source.name}-{i}"
+        self.in_flight = in_flight
+        self.predict_args = predict_args or {}
+        self.metrics = Metrics()
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def _complete(self, source):
+        done = False
+        while source.pending and source.pending[0][3].done():
+            index, frame, submitted, future = source.pending.popleft()
+            result = future.result()[0]
+            self.metrics.record(f"{source.name}.latency", int((time.perf_counter() - submitted) * 1e9))
+            with self.metrics.span("track"):
+                source.track(index, frame, result)
+            done = True
+        return done
+
+    def _dispatch(self, source):
+        if len(source.pending) >= self.in_flight:
+            return False
+        item = source.frames.get(timeout=0)
+        if item is None:
+            return False
+        index, frame = item
+        future = self.pool.submit(frame, **self.predict_args)
+        future.add_done_callback(lambda _: self._wake.set())
+        source.pending.append((index, frame, time.perf_counter(), future))
+        return True
+
+    def run(self):
+        """
+        Track every source to its end
+
+        :return: list of per-source report dicts, see report()
+        """
+        t0 = time.perf_counter()
+        for source in self.sources:
+            source.start(self.metrics, self._stop)
+        turn = 0
+        try:
+            active = list(self.sources)
+            while active:
+                self._wake.clear()
+                progressed = False
+                order = active[turn % len(active):] + active[:turn % len(active)]
+                for source in order:
+                    progressed |= self._complete(source)
+                for source in order:    # one frame per source per turn
+                    progressed |= self._dispatch(source)
+                for source in [s for s in active if s.exhausted()]:
+                    source.finished = True
+                    source.close()
+                    active.remove(source)
+                turn += 1
+                if not progressed:
+                    self._wake.wait(0.005)
+        finally:
+            self._stop.set()
+            for source in self.sources:
+                if not source.finished:
+                    source.close()
+            self.elapsed = time.perf_counter() - t0
+        return self.report()
+
+    def report(self):
+        """
+        Print per-source and aggregate throughput
+
+        :return: list of dicts of name, frames, dropped, fps and latency percentiles in ms
+        """
+        summary = self.metrics.summary()
+        rows = []
+        print(f"{'source':<20} {'frames':>7} {'dropped':>8} {'fps':>7} {'latency ms':>11} {'p95 ms':>8}")
+        for source in self.sources:
+            latency = summary.get(f"{source.name}.latency", {})
+            row = dict(name=source.name, frames=source.tracked, dropped=source.frames.dropped,
+                       fps=source.tracked / max(source.elapsed, 1e-9), latency_ms=latency.get("mean_ms", 0.0),
+                       latency_p95_ms=latency.get("p95_ms", 0.0))
+            rows.append(row)
+            print(f"{row['name']:<20} {row['frames']:>7} {row['dropped']:>8} {row['fps']:>7.1f} "
+                  f"{row['latency_ms']:>11.1f} {row['latency_p95_ms']:>8.1f}")
+        total = sum(row["frames"] for row in rows)
+        print(f"{'all':<20} {total:>7} {sum(row['dropped'] for row in rows):>8} "
+              f"{total / max(self.elapsed, 1e-9):>7.1f}  in {self.elapsed:.1f} s with {self.pool.workers} workers")
+        return rows
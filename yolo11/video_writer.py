@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+video_writer.py
+Headless output of YOLO video runs: annotated video on an encoder thread, or detections only
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+The X3 units run without a display, so show=True / cv2.imshow only costs a
+GUI round trip per frame. AnnotatedVideoWriter encodes with cv2.VideoWriter
+on its own thread. Frames are copied into a fixed set of buffers allocated
+with the first frame; a buffer goes back to the free list once encoded, so
+memory stays bounded and nothing is allocated per frame. When all buffers
+are in use the caller waits ("block") or the frame is skipped (any other
+policy). The fourcc picks the codec, e.g. mp4v for .mp4 or MJPG for .avi, and
+segment_seconds rolls over to numbered files (out_000.mp4, out_001.mp4, ...).
+Segments are cut on the frame number in the source video, so frames dropped
+on the way shorten a file instead of pushing later frames into it: out_001
+always starts at second segment_seconds of the video.
+
+MetadataWriter writes one JSON line per frame with the detections and track
+ids; used alone it skips drawing and encoding altogether.
+"""
+
+import json
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from yolo11.worker_pool import summarize
+
+
+class AnnotatedVideoWriter:
+    """
+    Video file written by a background encoder thread from preallocated frame buffers
+    """
+
+    def __init__(self, path, fps=30.0, fourcc="mp4v", buffers=4, policy="block", segment_seconds=None,
+                 metrics=None):
+        """
+        :param path: output file; with segment_seconds the segment number is added before the extension
+        :param fps: frame rate stored in the file
+        :param fourcc: four character codec code understood by cv2.VideoWriter
+        :param buffers: frames allocated for the hand-over to the encoder
+        :param policy: "block" waits for a free buffer, anything else drops the frame
+        :param segment_seconds: start a new file every this many seconds of video, None for one file
+        :param metrics: optional Metrics recording the "encode" stage
+        """
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffers = buffers
+        self.policy = policy
+        self.segment_frames = int(round(segment_seconds * fps)) if segment_seconds else None
+        self.metrics = metrics
+        self.frames = 0
+        self.dropped = 0
+        self.offered = 0        # write() calls, the frame number of frames written without one
+        self.files = []
+        self.error = None
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._shape = None
+        self._writer = None
+        self._segment = None
+        self._thread = None
+
+    def _allocate(self, shape):
+        self._shape = shape
+        for _ in range(self.buffers):
+            self._free.put(np.empty(shape, dtype=np.uint8))
+        self._thread = threading.Thread(target=self._encode, name="encoder", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, index=None):
+        """
+        :param frame: BGR frame, copied into a free buffer
+        :param index: frame number in the source video, default the number of earlier write() calls
+        :return: False when the frame was dropped
+        :raises RuntimeError: when the encoder failed
+        """
+        if self.error is not None:
+            raise RuntimeError(f"{self.path}: encoder failed: {self.error}")
+        if self._shape is None:
+            self._allocate(frame.shape)
+        elif frame.shape != self._shape:
+            raise ValueError(f"{self.path}: frame shape {frame.shape} differs from {self._shape}")
+        if index is None:
+            index = self.offered
+        self.offered += 1
+        try:
+            buffer = self._free.get(block=self.policy == "block")
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        np.copyto(buffer, frame)
+        self._pending.put((buffer, index))
+        return True
+
+    def _open(self, segment):
+        path = self.path
+        if self.segment_frames:
+            base, ext = os.path.splitext(self.path)
+            path = f"{base}_{segment:03d}{ext}"
+        height, width = self._shape[:2]
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        if not self._writer.isOpened():
+            raise RuntimeError(f"cannot open {path} with codec {self.fourcc}")
+        self.files.append(path)
+
+    def _encode(self):
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    return
+                buffer, index = item
+                segment = index // self.segment_frames if self.segment_frames else 0
+                if self._writer is None or segment != self._segment:
+                    if self._writer is not None:
+                        self._writer.release()
+                    self._open(segment)
+                    self._segment = segment
+                if self.metrics is not None:
+                    with self.metrics.span("encode"):
+                        self._writer.write(buffer)
+                else:
+                    self._writer.write(buffer)
+                self.frames += 1
+                self._free.put(buffer)
+        except Exception as e:
+            self.error = e
+            while self._free.qsize() < self.buffers:    # keep write() from waiting on a dead encoder
+                self._free.put(np.empty(self._shape, dtype=np.uint8))
+        finally:
+            if self._writer is not None:
+                self._writer.release()
+
+    def close(self):
+        """Encode the frames still queued and close the file"""
+        if self._thread is not None:
+            self._pending.put(None)
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            raise RuntimeError(f"{self.path}: encoder failed: {self.error}")
+
+
+class MetadataWriter:
+    """
+    JSON lines file of per-frame detections
+    """
+
+    def __init__(self, path, source=None):
+        """
+        :param path: output file
+        :param source: name of the video, stored in every line when given
+        """
+        self.path = path
+        self.source = source
+        self.frames = 0
+        self._file = open(path, "w")
+
+    def write(self, index, result, timestamp=None):
+        """
+        :param index: frame number in the video
+        :param result: ultralytics Results of the frame
+        :param timestamp: optional position in the video in seconds
+        """
+        record = summarize(result)
+        del record["path"]
+        record["frame"] = index
+        self.write_record(record, timestamp)
+
+    def write_record(self, record, timestamp=None):
+        """
+        :param record: JSON serializable dict of one frame
+        :param timestamp: optional position in the video in seconds
+        """
+        line = {}
+        if self.source is not None:
+            line["source"] = self.source
+        if timestamp is not None:
+            line["t"] = round(timestamp, 3)
+        line.update(record)
+        self._file.write(json.dumps(line) + "\n")
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+worker_pool.py
+YOLO inference service of persistent, warmed-up workers returning futures
+
+This file is part of d-robotics repository at https://github.com/baqwas/d-robotics
+It is free software: you can redistribute it and/or modify it under the terms of
+the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version.
+This file is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with Foobar. If not,
+see <https://www.gnu.org/licenses/>.
+
+(C) 2024 ParkCircus Productions; All Rights Reserved
+
+Ultralytics models are not safe to share between threads, hence one YOLO
+instance per thread. Creating it for every image pays the model load and the
+slow first inference each time. Here every worker creates its model once,
+runs a few warm-up predictions on a blank image, and then serves requests
+from a shared queue; submit() returns a concurrent.futures.Future, so callers
+block only as long as a steady-state inference takes.
+
+Workers are threads by default. With processes=True they are spawned
+processes, each with its share of the torch threads; results then cross the
+process boundary as plain dicts (see summarize()) instead of Results objects.
+
+>>> with WorkerPool("yolo11n.pt", workers=2) as pool:
+...     results = pool.submit("../images/tram_dallas.jpg").result()
+"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from ultralytics import YOLO
+
+
+def summarize(result):
+    """
+    :param result: ultralytics Results of one image
+    :return: JSON serializable dict of the image path, shape, timing and detections
+    """
+    record = {"path": result.path, "shape": list(result.orig_shape), "speed": result.speed}
+    if result.boxes is not None:
+        record["boxes"] = [[round(v, 1) for v in xyxy] + [round(conf, 4), result.names[int(cls)]]
+                           for xyxy, conf, cls in zip(result.boxes.xyxy.tolist(), result.boxes.conf.tolist(),
+                                                      result.boxes.cls.tolist())]
+        if result.boxes.id is not None:
+            record["ids"] = [int(v) for v in result.boxes.id.tolist()]
+    if result.probs is not None:
+        record["top5"] = [[result.names[i], round(float(result.probs.data[i]), 4)] for i in result.probs.top5]
+    return record
+
+
+def _serve(worker_id, yolo_model, warmup, imgsz, threads, requests, responses):
+    """
+    Body of a worker: load and warm up the model, then answer requests until a None request
+
+    :param worker_id: index of the worker, reported with its timing
+    :param yolo_model: pretrained YOLO model filename
+    :param warmup: predictions on a blank image before serving
+    :param imgsz: side of the blank warm-up image
+    :param threads: torch threads of a worker process, None for threads sharing this process
+    :param requests: queue of (request id, source, predict keyword arguments)
+    :param responses: queue of (request id, ok, results or exception); request id None reports readiness
+    """
+    if threads is not None:
+        import torch
+        torch.set_num_threads(threads)
+    t0 = time.perf_counter()
+    try:
+        model = YOLO(yolo_model)
+        load_s = time.perf_counter() - t0
+        blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        for _ in range(warmup):
+            model.predict(blank, imgsz=imgsz, verbose=False)
+    except Exception as e:
+        responses.put((None, False, e))
+        return
+    responses.put((None, True, (worker_id, load_s, time.perf_counter() - t0 - load_s)))
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        request_id, source, kwargs = request
+        try:
+            results = model.predict(source, verbose=False, **kwargs)
+            if threads is not None:
+                results = [summarize(result) for result in results]
+            responses.put((request_id, True, results))
+        except Exception as e:
+            responses.put((request_id, False, e))
+
+
+class WorkerPool:
+    """
+    Fixed set of YOLO workers serving predict requests through futures
+    """
+
+    def __init__(self, yolo_model, workers=2, processes=False, warmup=2, imgsz=640, threads=None):
+        """
+        :param yolo_model: pretrained YOLO model filename
+        :param workers: number of workers, each with its own model
+        :param processes: run the workers in spawned processes instead of threads
+        :param warmup: predictions on a blank image each worker runs before serving
+        :param imgsz: inference size of the warm-up
+        :param threads: torch threads per worker process, default the cores divided among the workers
+        """
+        self.yolo_model = yolo_model
+        self.workers = workers
+        self.processes = processes
+        self.warmup = warmup
+        self.imgsz = imgsz
+        self.threads = (threads or max(1, (os.cpu_count() or 1) // workers)) if processes else None
+        self.load_seconds = []
+        self.warmup_seconds = []
+        self.served = 0
+        self._context = multiprocessing.get_context("spawn") if processes else None
+        self._requests = self._context.Queue() if processes else queue.Queue()
+        self._responses = self._context.Queue() if processes else queue.Queue()
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._collector = None
+        self._stopping = False
+        self._closed = False
+
+    def start(self, timeout=None):
+        """
+        Start the workers and wait until every one has loaded and warmed up its model
+
+        :param timeout: seconds to wait, None for no limit
+        :return: self
+        :raises RuntimeError: when a worker failed to load its model or did not get ready in time
+        """
+        for worker_id in range(self.workers):
+            args = (worker_id, self.yolo_model, self.warmup, self.imgsz, self.threads, self._requests,
+                    self._responses)
+            if self.processes:
+                worker = self._context.Process(target=_serve, args=args, daemon=True)
+            else:
+                worker = threading.Thread(target=_serve, args=args, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self.load_seconds) < self.workers:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                _, ok, value = self._responses.get(timeout=wait)
+            except queue.Empty:
+                self.close()
+                raise RuntimeError(f"{self.workers - len(self.load_seconds)} workers not ready after {timeout} s")
+            if not ok:
+                self.close()
+                raise RuntimeError(f"worker failed to load {self.yolo_model}: {value}")
+            _, load_s, warmup_s = value
+            self.load_seconds.append(load_s)
+            self.warmup_seconds.append(warmup_s)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        return self
+
+    def submit(self, source, **kwargs):
+        """
+        :param source: image path, BGR numpy array or anything else YOLO.predict() accepts
+        :param kwargs: further YOLO.predict() arguments, e.g. conf=0.5
+        :return: Future of the list of Results, or of summarize() dicts with processes=True
+        """
+        if self._collector is None:
+            raise RuntimeError("WorkerPool.start() was not called")
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WorkerPool is closed")
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+        self._requests.put((request_id, source, kwargs))
+        return future
+
+    def predict(self, source, **kwargs):
+        """
+        :return: the results of submit(), waiting for them
+        """
+        return self.submit(source, **kwargs).result()
+
+    def _collect(self):
+        while True:
+            try:
+                request_id, ok, value = self._responses.get(timeout=1.0)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                dead = [w.exitcode for w in self._workers if self.processes and w.exitcode is not None]
+                if dead:
+                    self._fail(RuntimeError(f"worker process exited with status {dead[0]}"))
+                    return
+                continue
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+                self.served += 1
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _fail(self, error):
+        with self._lock:
+            self._closed = True
+            futures, self._futures = list(self._futures.values()), {}
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self, timeout=5.0):
+        """
+        Finish the queued requests and stop the workers
+
+        :param timeout: seconds to wait for each worker
+        """
+        with self._lock:
+            self._closed = True     # no new requests
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+            if self.processes and worker.is_alive():
+                worker.terminate()
+        self._stopping = True       # the collector drains the last responses, then returns
+        if self._collector is not None:
+            self._collector.join()
+        self._fail(RuntimeError("WorkerPool closed"))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()